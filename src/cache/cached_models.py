@@ -0,0 +1,151 @@
+# src/cache/cached_models.py
+"""
+Cache-through wrappers for the detectors and embedders.
+
+Keys combine the model identity (model_id), the pixel content the model actually sees
+(full frame for vehicle detection, vehicle crop for face search, crop for embeddings)
+and the call arguments, so re-running on the same footage skips all model inference.
+Vehicle embeddings are stored under the id of the backend that actually produced them,
+so a histogram fallback is never served as ReID output.
+Every other attribute is forwarded to the wrapped object.
+"""
+from typing import List, TYPE_CHECKING
+import numpy as np
+
+from utils.backends import require
+from .disk_cache import DiskCache, content_key
+
+if TYPE_CHECKING:
+    import supervision as sv
+
+
+class _CachedModel:
+
+    def __init__(self, inner, cache: DiskCache):
+        self._inner = inner
+        self.cache = cache
+
+    def __getattr__(self, name):
+        return getattr(self._inner, name)
+
+
+class CachedVehicleDetector(_CachedModel):
+
+    def detect(self, frame) -> "sv.Detections":
+        key = content_key("detections", self._inner.model_id, frame)
+        hit = self.cache.get(key)
+        if hit is not None:
+            sv = require("supervision")
+            # class_id is stored empty when the detector gave none
+            xyxy, confidence, class_id = hit
+            if len(xyxy) == 0:
+                return sv.Detections.empty()
+            return sv.Detections(xyxy=np.array(xyxy), confidence=np.array(confidence),
+                                 class_id=np.array(class_id) if len(class_id) == len(xyxy) else None)
+
+        detections = self._inner.detect(frame)
+        confidence = detections.confidence if detections.confidence is not None else np.ones(len(detections), dtype=np.float32)
+        class_id = detections.class_id if detections.class_id is not None else np.zeros(0, dtype=np.int64)
+        self.cache.put(key, [np.asarray(detections.xyxy), np.asarray(confidence), np.asarray(class_id)])
+        return detections
+
+
+class CachedFaceDetector(_CachedModel):
+
+    def detect_driver_faces(self, frame: np.ndarray, vehicle_bbox, **kwargs) -> List[np.ndarray]:
+        x1, y1, x2, y2 = vehicle_bbox
+        key = content_key("faces", self._inner.model_id, frame[y1:y2, x1:x2], tuple(vehicle_bbox), sorted(kwargs.items()))
+        hit = self.cache.get(key)
+        if hit is not None:
+            return [np.array(f) for f in hit]
+
+        faces = self._inner.detect_driver_faces(frame, vehicle_bbox, **kwargs)
+        self.cache.put(key, faces)
+        return faces
+
+    def detect_driver_faces_frame(self, frame: np.ndarray, vehicle_bboxes, **kwargs) -> List[List[np.ndarray]]:
+        key = content_key("frame_faces", self._inner.model_id, frame, [tuple(b) for b in vehicle_bboxes], sorted(kwargs.items()))
+        hit = self.cache.get(key)
+        if hit is not None:
+            # face crops of all vehicles followed by the number of faces per vehicle
+            *crops, counts = hit
+            out, k = [], 0
+            for n in counts:
+                out.append([np.array(f) for f in crops[k:k + n]])
+                k += n
+            return out
+
+        face_lists = self._inner.detect_driver_faces_frame(frame, vehicle_bboxes, **kwargs)
+        counts = np.array([len(faces) for faces in face_lists], dtype=np.int64)
+        self.cache.put(key, [f for faces in face_lists for f in faces] + [counts])
+        return face_lists
+
+
+class CachedVehicleEmbedder(_CachedModel):
+
+    @staticmethod
+    def _key(model_id: str, crop) -> str:
+        return content_key("vehicle_embedding", model_id, crop)
+
+    def embed(self, vehicle_crop):
+        if vehicle_crop is None or vehicle_crop.size == 0:
+            return self._inner.embed(vehicle_crop)
+        return self.embed_batch([vehicle_crop])[0]
+
+    def embed_batch(self, crops):
+        """Looks every crop up in the cache and embeds only the misses, in one batch."""
+        if not crops:
+            return self._inner.embed_batch(crops)
+
+        model_id = self._inner.model_id
+        keys = [self._key(model_id, c) if c is not None and c.size > 0 else None for c in crops]
+        rows = [None] * len(crops)
+        misses = []
+        for i, key in enumerate(keys):
+            hit = self.cache.get(key) if key is not None else None
+            if hit is not None:
+                rows[i] = np.array(hit[0])
+            else:
+                misses.append(i)
+
+        if misses:
+            computed, produced_by = self._inner.embed_batch_with_id([crops[i] for i in misses])
+            for i, emb in zip(misses, computed):
+                rows[i] = emb
+                if keys[i] is not None:
+                    key = keys[i] if produced_by == model_id else self._key(produced_by, crops[i])
+                    self.cache.put(key, [emb])
+
+        dim = max(r.shape[0] for r in rows)
+        out = np.zeros((len(crops), dim), dtype=np.float32)
+        for i, r in enumerate(rows):
+            out[i, :r.shape[0]] = r
+        return out
+
+
+class CachedDriverEmbedder(_CachedModel):
+
+    def _key(self, face_crops) -> str:
+        return content_key("driver_embedding", self._inner.model_id, *face_crops)
+
+    def embed(self, face_crops):
+        return self.embed_batch([face_crops])[0]
+
+    def embed_batch(self, face_crop_lists):
+        """Looks every track's face crops up in the cache and embeds only the misses, in one batch."""
+        keys = [self._key(f) if f else None for f in face_crop_lists]
+        out = np.zeros((len(face_crop_lists), 512), dtype=np.float32)
+        misses = []
+        for i, key in enumerate(keys):
+            hit = self.cache.get(key) if key is not None else None
+            if hit is not None:
+                out[i] = hit[0]
+            elif key is not None:
+                misses.append(i)
+
+        if misses:
+            computed = self._inner.embed_batch([face_crop_lists[i] for i in misses])
+            for i, emb in zip(misses, computed):
+                out[i] = emb
+                self.cache.put(keys[i], [emb])
+        return out
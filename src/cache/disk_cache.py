@@ -0,0 +1,140 @@
+# src/cache/disk_cache.py
+"""
+Persistent array cache: a SQLite index plus one memory-mapped .npy file per array.
+
+Each key maps to a list of arrays (possibly empty). Entries are evicted least-recently-
+used first once the stored bytes exceed max_bytes. Access times of hits are written in
+batches (every touch_batch hits, on put() and on flush() / close()), not one commit per hit.
+"""
+import os
+import time
+import sqlite3
+import hashlib
+import logging
+import threading
+from typing import Dict, List, Optional
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+
+def content_key(*parts) -> str:
+    """
+    Stable hex digest of the given parts. Arrays are hashed by dtype, shape and raw bytes;
+    everything else by its repr.
+    """
+    h = hashlib.blake2b(digest_size=20)
+    for p in parts:
+        if isinstance(p, np.ndarray):
+            h.update(str((p.dtype.str, p.shape)).encode())
+            h.update(np.ascontiguousarray(p).tobytes())
+        else:
+            h.update(repr(p).encode())
+        h.update(b"|")
+    return h.hexdigest()
+
+
+class DiskCache:
+
+    def __init__(self, root: str, max_bytes: int = 2 * 1024 ** 3, touch_batch: int = 256):
+        self.root = root
+        self.max_bytes = max_bytes
+        self.touch_batch = max(1, touch_batch)
+        # key -> last access time of hits not written to the index yet
+        self._touched: Dict[str, float] = {}
+        self._arrays_dir = os.path.join(root, "arrays")
+        os.makedirs(self._arrays_dir, exist_ok=True)
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(os.path.join(root, "index.sqlite"), check_same_thread=False)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS entries ("
+            "key TEXT PRIMARY KEY, n_arrays INTEGER NOT NULL, nbytes INTEGER NOT NULL, last_access REAL NOT NULL)"
+        )
+        self._db.execute("CREATE INDEX IF NOT EXISTS entries_lru ON entries(last_access)")
+        self._db.commit()
+        self.total_bytes = self._db.execute("SELECT COALESCE(SUM(nbytes), 0) FROM entries").fetchone()[0]
+        self.hits = 0
+        self.misses = 0
+
+    def _path(self, key: str, i: int) -> str:
+        return os.path.join(self._arrays_dir, f"{key}_{i}.npy")
+
+    def get(self, key: str) -> Optional[List[np.ndarray]]:
+        """Cached arrays for key (memory-mapped, read-only), or None on a miss."""
+        with self._lock:
+            row = self._db.execute("SELECT n_arrays FROM entries WHERE key = ?", (key,)).fetchone()
+            if row is None:
+                self.misses += 1
+                return None
+            try:
+                arrays = [np.load(self._path(key, i), mmap_mode="r") for i in range(row[0])]
+            except (OSError, ValueError):
+                # files went missing or are corrupt: drop the entry
+                self._delete(key, row[0])
+                self._db.commit()
+                self.misses += 1
+                return None
+            self._touched[key] = time.time()
+            if len(self._touched) >= self.touch_batch:
+                self._write_touched()
+                self._db.commit()
+            self.hits += 1
+            return arrays
+
+    def _write_touched(self):
+        if self._touched:
+            self._db.executemany("UPDATE entries SET last_access = ? WHERE key = ?",
+                                 [(t, key) for key, t in self._touched.items()])
+            self._touched.clear()
+
+    def flush(self):
+        """Write pending access times to the index."""
+        with self._lock:
+            self._write_touched()
+            self._db.commit()
+
+    def put(self, key: str, arrays: List[np.ndarray]):
+        arrays = [np.ascontiguousarray(a) for a in arrays]
+        nbytes = int(sum(a.nbytes for a in arrays))
+        with self._lock:
+            old = self._db.execute("SELECT n_arrays FROM entries WHERE key = ?", (key,)).fetchone()
+            if old is not None:
+                self._delete(key, old[0])
+            for i, a in enumerate(arrays):
+                np.save(self._path(key, i), a, allow_pickle=False)
+            self._db.execute("INSERT INTO entries (key, n_arrays, nbytes, last_access) VALUES (?, ?, ?, ?)",
+                             (key, len(arrays), nbytes, time.time()))
+            self.total_bytes += nbytes
+            # eviction order needs the current access times
+            self._write_touched()
+            if self.total_bytes > self.max_bytes:
+                self._evict(int(0.9 * self.max_bytes))
+            self._db.commit()
+
+    def _delete(self, key: str, n_arrays: int):
+        row = self._db.execute("SELECT nbytes FROM entries WHERE key = ?", (key,)).fetchone()
+        if row is not None:
+            self.total_bytes -= row[0]
+        self._touched.pop(key, None)
+        self._db.execute("DELETE FROM entries WHERE key = ?", (key,))
+        for i in range(n_arrays):
+            try:
+                os.remove(self._path(key, i))
+            except FileNotFoundError:
+                pass
+
+    def _evict(self, target_bytes: int):
+        evicted = 0
+        for key, n_arrays in self._db.execute("SELECT key, n_arrays FROM entries ORDER BY last_access").fetchall():
+            if self.total_bytes <= target_bytes:
+                break
+            self._delete(key, n_arrays)
+            evicted += 1
+        logger.info("Embedding cache evicted %d entries (%.1f MB used)", evicted, self.total_bytes / 1e6)
+
+    def close(self):
+        with self._lock:
+            self._write_touched()
+            self._db.commit()
+            self._db.close()
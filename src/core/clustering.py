@@ -7,41 +7,112 @@ from typing import List, Dict
 import numpy as np
 from data_models.snapshot import VehicleSnapshot
 from data_models.cluster import VehicleCluster
-from utils.similarity import cosine_similarity
 
-def cluster_snapshots(snapshots: List[VehicleSnapshot], threshold: float = 0.7) -> List[VehicleCluster]:
-    if not snapshots:
-        return []
 
-    clusters: List[VehicleCluster] = []
-    centroids: List[np.ndarray] = []
+class CentroidClusterer:
+    """
+    Incremental centroid clustering backed by NumPy.
 
-    for snap in snapshots:
+    Centroids live in one preallocated (K, D) matrix (grown by doubling), so each
+    snapshot is scored with a single matrix-vector product. Centroids are read from
+    the clusters' running sums (VehicleCluster.finalize() is O(D)) instead of
+    re-averaging all members.
+    """
+
+    def __init__(self, threshold: float = 0.7, dim: int = 512, capacity: int = 64, quality_weighted: bool = False):
+        self.threshold = threshold
+        self.quality_weighted = quality_weighted
+        self.dim = dim
+        self.clusters: List[VehicleCluster] = []
+        self._pos: Dict[int, int] = {}
+        self._capacity = max(1, capacity)
+        self._centroids = np.zeros((self._capacity, dim), dtype=np.float32)
+
+    def __len__(self):
+        return len(self.clusters)
+
+    def _grow(self):
+        self._capacity *= 2
+        centroids = np.zeros((self._capacity, self.dim), dtype=np.float32)
+        k = len(self.clusters)
+        centroids[:k] = self._centroids[:k]
+        self._centroids = centroids
+
+    def _new_cluster(self, snap: VehicleSnapshot) -> VehicleCluster:
+        if len(self.clusters) == self._capacity:
+            self._grow()
+        k = len(self.clusters)
+        c = VehicleCluster(cluster_id=str(snap.track_id), is_entry=snap.is_entry, snapshots=[snap],
+                           quality_weighted=self.quality_weighted)
+        self.clusters.append(c)
+        self._pos[id(c)] = k
+        self._update_centroid(k)
+        return c
+
+    def _update_centroid(self, k: int):
+        c = self.clusters[k]
+        c.finalize()
+        self._centroids[k] = c.vehicle_embedding if c.vehicle_embedding is not None else 0.0
+
+    def add(self, snap: VehicleSnapshot) -> VehicleCluster:
+        """
+        Assign a snapshot to its most similar cluster (or start a new one) and return it.
+        The returned cluster is already finalized with its updated centroid.
+        """
         emb = snap.vehicle_embedding
         if emb is None or emb.size == 0:
             # treat as its own cluster
-            c = VehicleCluster.from_snapshots(cluster_id=str(snap.track_id), snapshots=[snap], is_entry=snap.is_entry)
-            clusters.append(c)
-            centroids.append(c.vehicle_embedding if c.vehicle_embedding is not None else np.zeros(512))
-            continue
-
-        if not centroids:
-            c = VehicleCluster.from_snapshots(cluster_id=str(snap.track_id), snapshots=[snap], is_entry=snap.is_entry)
-            clusters.append(c)
-            centroids.append(c.vehicle_embedding)
-            continue
-
-        # compute similarities
-        sims = [cosine_similarity(emb, cent) for cent in centroids]
+            return self._new_cluster(snap)
+
+        if emb.shape[0] != self.dim:
+            if self.clusters:
+                raise ValueError(f"CentroidClusterer: embedding dim {emb.shape[0]} != {self.dim}")
+            self.dim = emb.shape[0]
+            self._centroids = np.zeros((self._capacity, self.dim), dtype=np.float32)
+
+        k = len(self.clusters)
+        if k == 0:
+            return self._new_cluster(snap)
+
+        # one matrix-vector product scores every centroid
+        sims = self._centroids[:k] @ emb.astype(np.float32, copy=False)
         best_idx = int(np.argmax(sims))
-        best_score = sims[best_idx]
-        if best_score >= threshold:
-            clusters[best_idx].add_snapshot(snap)
-            clusters[best_idx].finalize()
-            centroids[best_idx] = clusters[best_idx].vehicle_embedding
-        else:
-            c = VehicleCluster.from_snapshots(cluster_id=str(snap.track_id), snapshots=[snap], is_entry=snap.is_entry)
-            clusters.append(c)
-            centroids.append(c.vehicle_embedding)
-
-    return clusters
\ No newline at end of file
+        if sims[best_idx] >= self.threshold:
+            c = self.clusters[best_idx]
+            c.add_snapshot(snap)
+            self._update_centroid(best_idx)
+            return c
+
+        return self._new_cluster(snap)
+
+    def remove(self, cluster: VehicleCluster):
+        """
+        Drop a cluster so later snapshots can no longer join it. The last cluster is
+        moved into the freed row, so cluster order is not preserved after a removal.
+        """
+        k = self._pos.pop(id(cluster), None)
+        if k is None:
+            return
+        last = len(self.clusters) - 1
+        if k != last:
+            moved = self.clusters[last]
+            self.clusters[k] = moved
+            self._centroids[k] = self._centroids[last]
+            self._pos[id(moved)] = k
+        self.clusters.pop()
+        self._centroids[last] = 0.0
+
+    def finalize(self) -> List[VehicleCluster]:
+        for c in self.clusters:
+            c.finalize()
+        return self.clusters
+
+
+def cluster_snapshots(snapshots: List[VehicleSnapshot], threshold: float = 0.7, quality_weighted: bool = False) -> List[VehicleCluster]:
+    if not snapshots:
+        return []
+
+    clusterer = CentroidClusterer(threshold=threshold, quality_weighted=quality_weighted)
+    for snap in snapshots:
+        clusterer.add(snap)
+    return clusterer.finalize()
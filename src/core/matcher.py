@@ -1,18 +1,113 @@
 # src/core/matcher.py
-from typing import List, Dict, Any
+import logging
+from typing import List, Dict, Any, Tuple, Union
+import numpy as np
 from data_models.cluster import VehicleCluster
 from utils.similarity import cosine_similarity
+from index.base import EmbeddingIndex
+from index.factory import create_index
+from utils.backends import available, require
+
+logger = logging.getLogger(__name__)
+
+# scipy.optimize is imported on the first Hungarian assignment
+_HAS_SCIPY = available("scipy")
+
+MATCH_MODES = ("loop", "matrix", "index")
+ASSIGNMENT_MODES = ("independent", "greedy", "hungarian")
+
+# combined score weights
+DRIVER_WEIGHT = 0.4
+VEHICLE_WEIGHT = 0.6
+
+
+def stack_embeddings(clusters: List[VehicleCluster], attr: str) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Stack one embedding attribute of the clusters into an (N, D) float32 matrix.
+    Returns (matrix, valid) where valid marks clusters that had the embedding; missing rows are zero.
+    """
+    embs = [getattr(c, attr) for c in clusters]
+    valid = np.array([e is not None for e in embs], dtype=bool)
+    dim = next((e.shape[0] for e in embs if e is not None), 0)
+    mat = np.zeros((len(clusters), dim), dtype=np.float32)
+    for i, e in enumerate(embs):
+        if e is not None:
+            mat[i] = e
+    return mat, valid
+
 
 class VehicleDriverMatcher:
     """
     Matches exit clusters to entry clusters using driver and vehicle embeddings.
+
+    mode="matrix" stacks embeddings and scores all (exit x entry) pairs with one GEMM per
+    modality; mode="loop" is the original pairwise loop. Both return the same result dicts.
+    mode="index" puts entry driver embeddings in an embedding index (see index/) and only
+    scores the index_top_k entries returned for each exit; with the exact "flat" backend
+    it gives the same best entries as "matrix".
+
+    assignment="independent" lets every exit pick its best driver match, so two exits may
+    claim the same entry. "greedy" and "hungarian" solve a one-to-one assignment over the
+    combined 0.4*driver + 0.6*vehicle score, after pruning pairs below driver_threshold.
+    Exits left without an entry are reported as "no_entry_driver_found".
     """
 
-    def __init__(self, driver_threshold: float = 0.6, overall_threshold: float = 0.5):
+    def __init__(self, driver_threshold: float = 0.6, overall_threshold: float = 0.5, mode: str = "matrix",
+                 assignment: str = "independent", index_backend: str = "flat", index_params: Dict[str, Any] = None,
+                 index_top_k: int = 5):
+        if mode not in MATCH_MODES:
+            raise ValueError(f"Unknown match mode: {mode}, choose from: {list(MATCH_MODES)}")
+        if assignment not in ASSIGNMENT_MODES:
+            raise ValueError(f"Unknown assignment mode: {assignment}, choose from: {list(ASSIGNMENT_MODES)}")
+        if assignment != "independent" and mode == "loop":
+            raise ValueError("One-to-one assignment requires mode='matrix' or mode='index'")
+        if assignment == "hungarian" and not _HAS_SCIPY:
+            logger.warning("scipy not available; falling back to greedy assignment")
+            assignment = "greedy"
         self.driver_threshold = driver_threshold
         self.overall_threshold = overall_threshold
+        self.mode = mode
+        self.assignment = assignment
+        self.index_backend = index_backend
+        self.index_params = index_params or {}
+        self.index_top_k = max(1, index_top_k)
 
     def match(self, entry_clusters: List[VehicleCluster], exit_clusters: List[VehicleCluster]) -> List[Dict[str, Any]]:
+        if self.mode == "index":
+            return self.match_indexed(self.build_index(entry_clusters), entry_clusters, exit_clusters)
+        if self.assignment != "independent":
+            return self._match_assigned(entry_clusters, exit_clusters)
+        if self.mode == "matrix":
+            return self._match_matrix(entry_clusters, exit_clusters)
+        return self._match_loop(entry_clusters, exit_clusters)
+
+    def _result(self, exit_c, entry_c, driver_score, vehicle_score) -> Dict[str, Any]:
+        if entry_c is None or driver_score < self.driver_threshold:
+            return {
+                "exit_cluster": exit_c,
+                "entry_cluster": None,
+                "driver_score": driver_score,
+                "vehicle_score": 0.0,
+                "overall_score": 0.0,
+                "is_match": False,
+                "reason": "no_entry_driver_found"
+            }
+
+        overall_score = DRIVER_WEIGHT * driver_score + VEHICLE_WEIGHT * vehicle_score
+
+        is_match = (driver_score >= self.driver_threshold) and (overall_score >= self.overall_threshold)
+
+        return {
+            "exit_cluster": exit_c,
+            "entry_cluster": entry_c,
+            "driver_score": driver_score,
+            "vehicle_score": vehicle_score,
+            "overall_score": overall_score,
+            "is_match": is_match,
+            "reason": "match" if is_match else "driver_mismatch"
+        }
+
+    def _match_loop(self, entry_clusters: List[VehicleCluster], exit_clusters: List[VehicleCluster]) -> List[Dict[str, Any]]:
         results = []
 
         for exit_c in exit_clusters:
@@ -28,34 +123,200 @@ class VehicleDriverMatcher:
                     best_driver_score = score
                     best_entry = entry_c
 
-            if best_entry is None or best_driver_score < self.driver_threshold:
-                results.append({
-                    "exit_cluster": exit_c,
-                    "entry_cluster": None,
-                    "driver_score": best_driver_score,
-                    "vehicle_score": 0.0,
-                    "overall_score": 0.0,
-                    "is_match": False,
-                    "reason": "no_entry_driver_found"
-                })
-                continue
-
             vehicle_score = 0.0
-            if exit_c.vehicle_embedding is not None and best_entry.vehicle_embedding is not None:
+            if best_entry is not None and exit_c.vehicle_embedding is not None and best_entry.vehicle_embedding is not None:
                 vehicle_score = cosine_similarity(exit_c.vehicle_embedding, best_entry.vehicle_embedding)
 
-            overall_score = 0.4 * best_driver_score + 0.6 * vehicle_score
+            results.append(self._result(exit_c, best_entry, best_driver_score, vehicle_score))
 
-            is_match = (best_driver_score >= self.driver_threshold) and (overall_score >= self.overall_threshold)
+        return results
 
-            results.append({
-                "exit_cluster": exit_c,
-                "entry_cluster": best_entry,
-                "driver_score": best_driver_score,
-                "vehicle_score": vehicle_score,
-                "overall_score": overall_score,
-                "is_match": is_match,
-                "reason": "match" if is_match else "driver_mismatch"
-            })
-
-        return results
\ No newline at end of file
+    def _match_matrix(self, entry_clusters: List[VehicleCluster], exit_clusters: List[VehicleCluster]) -> List[Dict[str, Any]]:
+        if not exit_clusters:
+            return []
+
+        best_idx, best_driver, vehicle_scores = self._best_entries(entry_clusters, exit_clusters)
+
+        results = []
+        for i, exit_c in enumerate(exit_clusters):
+            j = int(best_idx[i])
+            entry_c = entry_clusters[j] if j >= 0 else None
+            results.append(self._result(exit_c, entry_c, float(best_driver[i]), float(vehicle_scores[i])))
+        return results
+
+    def _score_matrices(self, entry_clusters: List[VehicleCluster], exit_clusters: List[VehicleCluster]):
+        """
+        Full (exit x entry) driver and vehicle similarity matrices, one GEMM each.
+        Driver pairs with a missing embedding are -inf; vehicle pairs with a missing embedding are 0.
+        Returns (None, None) when no pair can be scored.
+        """
+        exit_drv, exit_drv_ok = stack_embeddings(exit_clusters, "driver_embedding")
+        entry_drv, entry_drv_ok = stack_embeddings(entry_clusters, "driver_embedding")
+        if not exit_drv_ok.any() or not entry_drv_ok.any():
+            return None, None
+
+        driver_sims = exit_drv @ entry_drv.T
+        # pairs with a missing embedding are never candidates
+        driver_sims[~exit_drv_ok, :] = -np.inf
+        driver_sims[:, ~entry_drv_ok] = -np.inf
+
+        exit_veh, exit_veh_ok = stack_embeddings(exit_clusters, "vehicle_embedding")
+        entry_veh, entry_veh_ok = stack_embeddings(entry_clusters, "vehicle_embedding")
+        if exit_veh_ok.any() and entry_veh_ok.any():
+            vehicle_sims = exit_veh @ entry_veh.T
+            vehicle_sims[~exit_veh_ok, :] = 0.0
+            vehicle_sims[:, ~entry_veh_ok] = 0.0
+        else:
+            vehicle_sims = np.zeros(driver_sims.shape, dtype=np.float32)
+
+        return driver_sims, vehicle_sims
+
+    def _best_entries(self, entry_clusters: List[VehicleCluster], exit_clusters: List[VehicleCluster]):
+        """
+        Per exit cluster: index of the best entry by driver similarity (-1 if none scores above 0),
+        that driver score, and the vehicle score against that entry.
+        """
+        n_exit = len(exit_clusters)
+        best_idx = np.full(n_exit, -1, dtype=np.int64)
+        best_driver = np.zeros(n_exit, dtype=np.float32)
+        vehicle_scores = np.zeros(n_exit, dtype=np.float32)
+        if not entry_clusters:
+            return best_idx, best_driver, vehicle_scores
+
+        driver_sims, vehicle_sims = self._score_matrices(entry_clusters, exit_clusters)
+        if driver_sims is None:
+            return best_idx, best_driver, vehicle_scores
+
+        # argmax keeps the first maximum, like the strict '>' in the loop
+        cand = np.argmax(driver_sims, axis=1)
+        cand_score = driver_sims[np.arange(n_exit), cand]
+        found = cand_score > 0.0
+        best_idx[found] = cand[found]
+        best_driver[found] = cand_score[found]
+        vehicle_scores[found] = vehicle_sims[found, cand[found]]
+
+        return best_idx, best_driver, vehicle_scores
+
+    def _match_assigned(self, entry_clusters: List[VehicleCluster], exit_clusters: List[VehicleCluster]) -> List[Dict[str, Any]]:
+        if not exit_clusters:
+            return []
+
+        best_driver = np.zeros(len(exit_clusters), dtype=np.float32)
+        rows = cols = np.zeros(0, dtype=np.int64)
+        driver_scores = vehicle_scores = np.zeros(0, dtype=np.float32)
+        if entry_clusters:
+            driver_sims, vehicle_sims = self._score_matrices(entry_clusters, exit_clusters)
+            if driver_sims is not None:
+                best_driver = np.maximum(driver_sims.max(axis=1), 0.0)
+
+                # prune before solving: only pairs that pass the driver threshold can be assigned
+                keep = (driver_sims >= self.driver_threshold) & (driver_sims > 0.0)
+                rows, cols = np.nonzero(keep)
+                driver_scores = driver_sims[rows, cols]
+                vehicle_scores = vehicle_sims[rows, cols]
+
+        return self._assign(entry_clusters, exit_clusters, rows, cols, driver_scores, vehicle_scores, best_driver)
+
+    def _assign(self, entries, exit_clusters, rows, cols, driver_scores, vehicle_scores, best_driver) -> List[Dict[str, Any]]:
+        """
+        Solve the one-to-one assignment over candidate pairs (rows index exit_clusters,
+        cols are keys into entries) and build the result dicts.
+        """
+        assigned = {}
+        if rows.size:
+            combined = DRIVER_WEIGHT * driver_scores + VEHICLE_WEIGHT * vehicle_scores
+            if self.assignment == "hungarian":
+                pairs = self._solve_hungarian(rows, cols, combined)
+            else:
+                pairs = self._solve_greedy(rows, cols, combined)
+            pair_pos = {(int(i), int(j)): k for k, (i, j) in enumerate(zip(rows, cols))}
+            for i, j in pairs:
+                assigned[i] = (j, pair_pos[(i, j)])
+
+        results = []
+        for i, exit_c in enumerate(exit_clusters):
+            if i not in assigned:
+                results.append(self._result(exit_c, None, float(best_driver[i]), 0.0))
+                continue
+            j, k = assigned[i]
+            results.append(self._result(exit_c, entries[j], float(driver_scores[k]), float(vehicle_scores[k])))
+        return results
+
+    def build_index(self, entry_clusters: List[VehicleCluster]) -> EmbeddingIndex:
+        """Index entry driver embeddings, keyed by position in entry_clusters."""
+        entry_drv, entry_drv_ok = stack_embeddings(entry_clusters, "driver_embedding")
+        index = create_index(self.index_backend, dim=max(entry_drv.shape[1], 1), **self.index_params)
+        ids = np.nonzero(entry_drv_ok)[0]
+        if ids.size:
+            index.add(ids, entry_drv[ids])
+        return index
+
+    def match_indexed(self, index: EmbeddingIndex, entries: Union[List[VehicleCluster], Dict[int, VehicleCluster]],
+                      exit_clusters: List[VehicleCluster]) -> List[Dict[str, Any]]:
+        """
+        Match exit clusters against an index of entry driver embeddings.
+        entries maps index ids to entry clusters (a list when ids are positions).
+        """
+        if not exit_clusters:
+            return []
+
+        n_exit = len(exit_clusters)
+        k = self.index_top_k
+        scores = np.full((n_exit, k), -np.inf, dtype=np.float32)
+        ids = np.full((n_exit, k), -1, dtype=np.int64)
+        exit_drv, exit_drv_ok = stack_embeddings(exit_clusters, "driver_embedding")
+        if exit_drv_ok.any() and len(index):
+            scores[exit_drv_ok], ids[exit_drv_ok] = index.search(exit_drv[exit_drv_ok], k)
+
+        found = (ids[:, 0] >= 0) & (scores[:, 0] > 0.0)
+        best_driver = np.where(found, scores[:, 0], 0.0)
+
+        if self.assignment == "independent":
+            results = []
+            for i, exit_c in enumerate(exit_clusters):
+                entry_c = entries[int(ids[i, 0])] if found[i] else None
+                vehicle_score = self._vehicle_score(exit_c, entry_c) if entry_c is not None else 0.0
+                results.append(self._result(exit_c, entry_c, float(best_driver[i]), vehicle_score))
+            return results
+
+        keep = (ids >= 0) & (scores >= self.driver_threshold) & (scores > 0.0)
+        rows, slots = np.nonzero(keep)
+        cols = ids[rows, slots]
+        driver_scores = scores[rows, slots]
+        vehicle_scores = np.array([self._vehicle_score(exit_clusters[i], entries[int(j)]) for i, j in zip(rows, cols)],
+                                  dtype=np.float32)
+        return self._assign(entries, exit_clusters, rows, cols, driver_scores, vehicle_scores, best_driver)
+
+    @staticmethod
+    def _vehicle_score(exit_c: VehicleCluster, entry_c: VehicleCluster) -> float:
+        if exit_c.vehicle_embedding is None or entry_c.vehicle_embedding is None:
+            return 0.0
+        return float(cosine_similarity(exit_c.vehicle_embedding, entry_c.vehicle_embedding))
+
+    @staticmethod
+    def _solve_greedy(rows: np.ndarray, cols: np.ndarray, combined: np.ndarray) -> List[Tuple[int, int]]:
+        pairs = []
+        used_rows, used_cols = set(), set()
+        for k in np.argsort(-combined, kind="stable"):
+            i, j = int(rows[k]), int(cols[k])
+            if i in used_rows or j in used_cols:
+                continue
+            used_rows.add(i)
+            used_cols.add(j)
+            pairs.append((i, j))
+        return pairs
+
+    @staticmethod
+    def _solve_hungarian(rows: np.ndarray, cols: np.ndarray, combined: np.ndarray) -> List[Tuple[int, int]]:
+        # solve only over exits/entries that survived pruning
+        row_ids, r = np.unique(rows, return_inverse=True)
+        col_ids, c = np.unique(cols, return_inverse=True)
+        # pruned pairs get a large penalty, so the solver first maximizes the number of
+        # valid pairs and then their total score; penalized picks are dropped afterwards
+        penalty = -1e6
+        weights = np.full((row_ids.size, col_ids.size), penalty, dtype=np.float64)
+        weights[r, c] = combined
+        valid = np.zeros(weights.shape, dtype=bool)
+        valid[r, c] = True
+        sol_r, sol_c = require("scipy.optimize").linear_sum_assignment(weights, maximize=True)
+        return [(int(row_ids[a]), int(col_ids[b])) for a, b in zip(sol_r, sol_c) if valid[a, b]]
@@ -0,0 +1,59 @@
+# src/core/parallel.py
+"""
+Run the entry and exit camera pipelines in separate worker processes.
+
+Each worker builds its own VehicleDriverPipeline (detector, tracker, embedders) from the
+parent's constructor arguments and sends its snapshots back packed (embeddings and
+metadata only, see pack_snapshots), so no frames or crops cross the process boundary.
+The worker's metrics registry is sent back too and merged into the parent's.
+"""
+import logging
+import multiprocessing as mp
+from concurrent.futures import ProcessPoolExecutor
+from typing import Any, Callable, Dict, List, Tuple
+
+from data_models.snapshot import VehicleSnapshot, pack_snapshots, unpack_snapshots
+from utils.logging import MetricsRegistry
+
+logger = logging.getLogger(__name__)
+
+
+def _camera_worker(config: Dict[str, Any], frames_path: str, is_entry: bool,
+                   make_pipeline: Callable[..., Any] = None) -> Tuple[Dict[str, Any], int, MetricsRegistry]:
+    # imported here so the worker process builds its own models
+    from core.pipeline import VehicleDriverPipeline
+
+    config = dict(config, parallel_streams=False)
+    pipeline = (make_pipeline or VehicleDriverPipeline)(**config)
+    try:
+        snapshots = pipeline._process_frames(frames_path, is_entry=is_entry)
+    finally:
+        # pool workers are reused; don't keep the models alive between tasks
+        pipeline.close()
+    frames_key = 'entry_frames_processed' if is_entry else 'exit_frames_processed'
+    return pack_snapshots(snapshots), pipeline.stats[frames_key], pipeline.metrics
+
+
+def process_streams_parallel(config: Dict[str, Any], entry_path: str, exit_path: str, metrics: MetricsRegistry = None,
+                             max_workers: int = 2, make_pipeline: Callable[..., Any] = None
+                             ) -> Tuple[List[VehicleSnapshot], List[VehicleSnapshot], Dict[str, int]]:
+    """
+    Process entry and exit frames concurrently in spawned worker processes.
+    Returns (entry_snapshots, exit_snapshots, frame counts); snapshots carry no crops.
+    The workers' metrics are merged into metrics if given. make_pipeline builds each
+    worker's pipeline from config (VehicleDriverPipeline by default); it must be picklable.
+    """
+    # spawn: fresh interpreters, safe with torch / OpenCV thread pools in the parent
+    ctx = mp.get_context("spawn")
+    with ProcessPoolExecutor(max_workers=max_workers, mp_context=ctx) as pool:
+        entry_future = pool.submit(_camera_worker, config, entry_path, True, make_pipeline)
+        exit_future = pool.submit(_camera_worker, config, exit_path, False, make_pipeline)
+        entry_packed, entry_frames, entry_metrics = entry_future.result()
+        exit_packed, exit_frames, exit_metrics = exit_future.result()
+
+    if metrics is not None:
+        metrics.merge(entry_metrics)
+        metrics.merge(exit_metrics)
+
+    counts = {'entry_frames_processed': entry_frames, 'exit_frames_processed': exit_frames}
+    return unpack_snapshots(entry_packed), unpack_snapshots(exit_packed), counts
@@ -2,20 +2,47 @@
 import os
 import logging
 import time
-from typing import List, Dict, Any
+import queue
+import threading
+import itertools
+import functools
+from typing import List, Dict, Any, Callable, Tuple
 
 from detection.vehicle_detector import VehicleDetector
-from detection.face_detector import FaceDetector
+from detection.face_detector import FaceDetector, FACE_STRATEGIES
 from tracking.bytetrack_manager import ByteTrackManager
+from tracking.track_state import VehicleTrackState
 from embeddings.driver_embedder import DriverEmbedder
 from embeddings.vehicle_embedder import VehicleEmbedder
 from io.frame_loader import FrameLoader
+from io.video_loader import VideoLoader
 from data_models.snapshot import VehicleSnapshot
+from data_models.snapshot_store import SnapshotStore
+from utils.image_quality import snapshot_quality_score
+from utils.logging import METRICS, MetricsRegistry, timed, use_metrics
 from core.clustering import cluster_snapshots
 from core.matcher import VehicleDriverMatcher
+from core.streaming import StreamingMatcher
+from core.stage_executor import Stage, StagedExecutor
+from core.parallel import process_streams_parallel
+from core.replay import export_dump
+from cache.disk_cache import DiskCache
+from cache.cached_models import CachedVehicleDetector, CachedFaceDetector, CachedVehicleEmbedder, CachedDriverEmbedder
 
 logger = logging.getLogger(__name__)
 
+def _recording_metrics(method):
+    """Run a pipeline method with the pipeline's own registry as the active metrics registry."""
+    @functools.wraps(method)
+    def wrapper(self, *args, **kwargs):
+        with use_metrics(self.metrics):
+            return method(self, *args, **kwargs)
+    return wrapper
+
+
+# marks the end of one frame source (streaming queue, pipelined stages)
+_END_OF_STREAM = object()
+
 class VehicleDriverPipeline:
     def __init__(
         self,
@@ -24,31 +51,137 @@ class VehicleDriverPipeline:
         output_path: str = "./data/outputs",
         vehicle_model_path: str = "yolov8m.pt",
         face_model_path: str = None,
+        face_strategy: str = "regions",
+        face_call_budget: int = 1,
+        frame_face_detection: bool = False,
+        snapshot_selection: str = "first",
+        snapshot_top_k: int = 1,
+        snapshot_frame_budget: int = 30,
         reid_opts: str = "./configs/opts.yaml",
         reid_ckpt: str = "./models/reid_model/net_19.pth",
+        reid_artifact: str = None,
+        reid_input_size: Tuple[int, int] = (224, 224),
         vehicle_similarity_threshold: float = 0.7, 
         driver_similarity_threshold: float = 0.6, 
         overall_match_threshold: float = 0.5,
         video_fps: int = 20,
+        embed_batch_size: int = 16,
+        match_mode: str = "matrix",
+        match_assignment: str = "independent",
+        index_backend: str = "flat",
+        index_params: Dict[str, Any] = None,
+        entry_ttl: float = 4 * 3600.0,
+        exit_idle_timeout: float = 5.0,
+        stream_queue_size: int = 8,
+        frame_prefetch: int = 8,
+        frame_decode_workers: int = 4,
+        frame_reduce: int = 1,
+        execution: str = "sequential",
+        stage_queue_size: int = 8,
+        parallel_streams: bool = False,
+        snapshot_storage: str = "full",
+        crop_store_dir: str = None,
+        quality_weighted_clusters: bool = False,
+        cache_dir: str = None,
+        cache_max_bytes: int = 2 * 1024 ** 3,
+        embedding_dump_path: str = None,
+        metrics_path: str = None,
         verbose: bool = True
     ):
+        # constructor arguments, used to rebuild the pipeline in worker processes
+        self.config = {k: v for k, v in locals().items() if k != "self"}
         self.entry_frames_path = entry_frames_path
         self.exit_frames_path = exit_frames_path
         self.output_path = output_path
         os.makedirs(self.output_path, exist_ok=True)
         self.verbose = verbose 
 
-        # detectors / trackers / embedders
-        self.vehicle_detector = VehicleDetector(model_path=vehicle_model_path)
-        self.face_detector = FaceDetector(yolov8_face_model=face_model_path)
-        self.tracker = ByteTrackManager(frame_rate=video_fps)
-        self.driver_embedder = DriverEmbedder()
-        self.vehicle_embedder = VehicleEmbedder(reid_opts=reid_opts, reid_ckpt=reid_ckpt)
+        # detectors / trackers / embedders are built (and their models loaded) on first use,
+        # so replay / matching-only jobs never import or load a model they don't need
+        self._components: Dict[str, Any] = {}
+        self._components_lock = threading.RLock()
+        if face_strategy not in FACE_STRATEGIES:
+            raise ValueError(f"Unknown face detection strategy: {face_strategy}, choose from: {list(FACE_STRATEGIES)}")
+        self.vehicle_model_path = vehicle_model_path
+        self.face_model_path = face_model_path
+        # face_strategy="single_pass" runs at most face_call_budget face backends once per vehicle
+        self.face_strategy = face_strategy
+        self.face_call_budget = face_call_budget
+        self.reid_opts = reid_opts
+        self.reid_ckpt = reid_ckpt
+        # reid_artifact: exported TorchScript (.pt) / ONNX (.onnx) model, used instead of reid_opts/reid_ckpt
+        self.reid_artifact = reid_artifact
+        self.reid_input_size = reid_input_size
+        # batch the YOLO face passes of all tracked vehicles of a frame (same faces as per vehicle)
+        self.frame_face_detection = frame_face_detection
+
+        # "first" snapshots a track on its first frame with a face; "best" buffers the snapshot_top_k
+        # best-scoring candidates per track and embeds them when the track ends or after
+        # snapshot_frame_budget frames
+        if snapshot_selection not in ("first", "best"):
+            raise ValueError(f"Unknown snapshot selection: {snapshot_selection}, choose from: ['first', 'best']")
+        self.snapshot_selection = snapshot_selection
+        self.snapshot_top_k = max(1, snapshot_top_k)
+        self.snapshot_frame_budget = max(1, snapshot_frame_budget)
+        self.video_fps = video_fps
+
+        # persistent detection/embedding cache: re-runs over the same footage skip model inference
+        self.cache = None
+        if cache_dir:
+            self.cache = DiskCache(cache_dir, max_bytes=cache_max_bytes)
 
         # thresholds
         self.vehicle_similarity_threshold = vehicle_similarity_threshold
         self.driver_similarity_threshold = driver_similarity_threshold
         self.overall_match_threshold = overall_match_threshold
+        # weight snapshots by their quality score in cluster centroids
+        self.quality_weighted_clusters = quality_weighted_clusters
+        self.match_mode = match_mode
+        self.match_assignment = match_assignment
+        # embedding index used when match_mode="index": flat | ivf | faiss_flat | faiss_ivf
+        self.index_backend = index_backend
+        self.index_params = index_params or {}
+
+        # number of new-track crops collected (possibly across frames) before one batched embedding pass
+        self.embed_batch_size = max(1, embed_batch_size)
+
+        # streaming mode: entry clusters are evicted after entry_ttl seconds (video time) without updates,
+        # exit clusters are matched once idle for exit_idle_timeout seconds; evicted clusters free their
+        # compact store rows
+        self.entry_ttl = entry_ttl
+        self.exit_idle_timeout = exit_idle_timeout
+        self.stream_queue_size = stream_queue_size
+
+        # image-directory decoding: frames decoded ahead in a thread pool, optionally at reduced resolution
+        self.frame_prefetch = frame_prefetch
+        self.frame_decode_workers = frame_decode_workers
+        self.frame_reduce = frame_reduce
+
+        # "sequential" runs all stages back-to-back per frame; "pipelined" runs each stage on its own thread
+        if execution not in ("sequential", "pipelined"):
+            raise ValueError(f"Unknown execution mode: {execution}, choose from: ['sequential', 'pipelined']")
+        self.execution = execution
+        self.stage_queue_size = stage_queue_size
+        self.stage_metrics: Dict[str, Any] = {}
+
+        # run entry and exit camera pipelines in two worker processes (each with its own models)
+        self.parallel_streams = parallel_streams
+
+        # "full" keeps crops and embeddings on every VehicleSnapshot; "compact" stores embeddings in
+        # shared float32 arrays and spills crops to crop_store_dir as JPEG (dropped if not set)
+        if snapshot_storage not in ("full", "compact"):
+            raise ValueError(f"Unknown snapshot storage: {snapshot_storage}, choose from: ['full', 'compact']")
+        self.snapshot_storage = snapshot_storage
+        self.snapshot_store = SnapshotStore(crop_dir=crop_store_dir) if snapshot_storage == "compact" else None
+
+        # entry/exit snapshot embeddings are written here (see core/replay.py) for offline threshold sweeps
+        self.embedding_dump_path = embedding_dump_path
+
+        # per-stage / per-backend timings of this pipeline (reset at the start of each run, then merged
+        # into the process-wide METRICS); exported at the end of a run to metrics_path as JSON, or
+        # Prometheus text for .prom/.txt
+        self.metrics = MetricsRegistry()
+        self.metrics_path = metrics_path
 
         # stats
         self.stats = {
@@ -63,58 +196,135 @@ class VehicleDriverPipeline:
             'no_match_found': 0
         }
 
+    # lazily built components
+    def _component(self, name: str, build: Callable[[], Any]) -> Any:
+        with self._components_lock:
+            if name not in self._components:
+                self._components[name] = build()
+            return self._components[name]
+
+    def _cached(self, component, wrapper):
+        return wrapper(component, self.cache) if self.cache is not None else component
+
+    @property
+    def vehicle_detector(self):
+        return self._component("vehicle_detector", lambda: self._cached(
+            VehicleDetector(model_path=self.vehicle_model_path), CachedVehicleDetector))
+
+    @property
+    def face_detector(self):
+        return self._component("face_detector", lambda: self._cached(
+            FaceDetector(yolov8_face_model=self.face_model_path, strategy=self.face_strategy,
+                         call_budget=self.face_call_budget), CachedFaceDetector))
+
+    @property
+    def tracker(self) -> ByteTrackManager:
+        return self._component("tracker", lambda: ByteTrackManager(frame_rate=self.video_fps))
+
+    @property
+    def driver_embedder(self):
+        return self._component("driver_embedder", lambda: self._cached(DriverEmbedder(), CachedDriverEmbedder))
+
+    @property
+    def vehicle_embedder(self):
+        return self._component("vehicle_embedder", lambda: self._cached(
+            VehicleEmbedder(reid_opts=self.reid_opts, reid_ckpt=self.reid_ckpt, reid_artifact=self.reid_artifact,
+                            input_size=self.reid_input_size), CachedVehicleEmbedder))
+
+    @vehicle_detector.setter
+    def vehicle_detector(self, value):
+        self._components["vehicle_detector"] = value
+
+    @face_detector.setter
+    def face_detector(self, value):
+        self._components["face_detector"] = value
+
+    @tracker.setter
+    def tracker(self, value):
+        self._components["tracker"] = value
+
+    @driver_embedder.setter
+    def driver_embedder(self, value):
+        self._components["driver_embedder"] = value
+
+    @vehicle_embedder.setter
+    def vehicle_embedder(self, value):
+        self._components["vehicle_embedder"] = value
+
+    def close(self):
+        """
+        Release the models of the built components and write pending cache access times.
+        Models are shared per process (see utils/model_registry.py) and unloaded once no
+        pipeline uses them any more.
+        """
+        if self.cache is not None:
+            self.cache.flush()
+        with self._components_lock:
+            components, self._components = list(self._components.values()), {}
+        for component in components:
+            close = getattr(component, "close", None)
+            if close is not None:
+                close()
+
     # main
+    @_recording_metrics
     def run_analysis(self) -> Dict[str, Any]:
         logger.info("="*80)
         logger.info("STARTING ANALYSIS PIPELINE")
         logger.info("="*80)
+        self.metrics.reset()
+        t0 = time.perf_counter()
+
+        if self.parallel_streams:
+            logger.info("Processing entry and exit frames in parallel worker processes...")
+            entry_snapshots, exit_snapshots, frame_counts = process_streams_parallel(
+                self.config, self.entry_frames_path, self.exit_frames_path, metrics=self.metrics)
+            self.stats.update(frame_counts)
+        else:
+            # Entry
+            logger.info("Processing entry frames...")
+            entry_snapshots = self._process_frames(self.entry_frames_path, is_entry=True)
+
+            # Exit
+            logger.info("Processing exit frames...")
+            exit_snapshots = self._process_frames(self.exit_frames_path, is_entry=False)
 
-        # Entry
-        logger.info("Processing entry frames...")
-        entry_snapshots = self._process_frames_batch(self.entry_frames_path, is_entry=True)
-        self.stats['entry_frames_processed'] = len(list(filter(lambda f: f.lower().endswith(('.jpg','.png','.jpeg')), os.listdir(self.entry_frames_path))))
         self.stats['entry_vehicles_detected'] = len(entry_snapshots)
         logger.info("Found %d entry snapshots", len(entry_snapshots))
-
-        # Exit
-        logger.info("Processing exit frames...")
-        exit_snapshots = self._process_frames_batch(self.exit_frames_path, is_entry=False)
-        self.stats['exit_frames_processed'] = len(list(filter(lambda f: f.lower().endswith(('.jpg','.png','.jpeg')), os.listdir(self.exit_frames_path))))
         self.stats['exit_vehicles_detected'] = len(exit_snapshots)
         logger.info("Found %d exit snapshots", len(exit_snapshots))
+        if self.embedding_dump_path:
+            export_dump(self.embedding_dump_path, entry_snapshots, exit_snapshots)
 
         # Clustering
         logger.info("Clustering entry snapshots...")
-        entry_clusters = cluster_snapshots(entry_snapshots, threshold=self.vehicle_similarity_threshold)
+        with self.metrics.timer("stage_seconds", stage="cluster"):
+            entry_clusters = cluster_snapshots(entry_snapshots, threshold=self.vehicle_similarity_threshold, quality_weighted=self.quality_weighted_clusters)
         for c in entry_clusters: c.finalize()
         self.stats['entry_clusters'] = len(entry_clusters)
         logger.info("Created %d entry clusters", len(entry_clusters))
 
         logger.info("Clustering exit snapshots...")
-        exit_clusters = cluster_snapshots(exit_snapshots, threshold=self.vehicle_similarity_threshold)
+        with self.metrics.timer("stage_seconds", stage="cluster"):
+            exit_clusters = cluster_snapshots(exit_snapshots, threshold=self.vehicle_similarity_threshold, quality_weighted=self.quality_weighted_clusters)
         for c in exit_clusters: c.finalize()
         self.stats['exit_clusters'] = len(exit_clusters)
         logger.info("Created %d exit clusters", len(exit_clusters))
 
         # Matching
         logger.info("Matching exit clusters to entry clusters...")
-        matcher = VehicleDriverMatcher(driver_threshold=self.driver_similarity_threshold, overall_threshold=self.overall_match_threshold)
-        match_results = matcher.match(entry_clusters, exit_clusters)
+        matcher = self._make_matcher()
+        with self.metrics.timer("stage_seconds", stage="match"):
+            match_results = matcher.match(entry_clusters, exit_clusters)
 
         # Update stats & optional alerts
         for r in match_results:
-            if r["is_match"]:
-                self.stats['matches_found'] += 1
-            else:
-                if r["reason"] == "no_entry_driver_found":
-                    self.stats['no_match_found'] += 1
-                else:
-                    self.stats['mismatches_detected'] += 1
-                    # Optionally create an alert video (not implemented here to keep simple)
+            self._record_result(r)
 
         logger.info("="*80)
         logger.info("ANALYSIS COMPLETE")
         logger.info("="*80)
+        self._finish_metrics(time.perf_counter() - t0)
         self._print_summary()
         return {
             'entry_clusters': entry_clusters,
@@ -123,74 +333,412 @@ class VehicleDriverPipeline:
             'stats': self.stats
         }
 
+    def _make_matcher(self) -> VehicleDriverMatcher:
+        return VehicleDriverMatcher(driver_threshold=self.driver_similarity_threshold, overall_threshold=self.overall_match_threshold,
+                                    mode=self.match_mode, assignment=self.match_assignment,
+                                    index_backend=self.index_backend, index_params=self.index_params)
+
+    def _record_result(self, r: Dict[str, Any]):
+        if r["is_match"]:
+            self.stats['matches_found'] += 1
+        else:
+            if r["reason"] == "no_entry_driver_found":
+                self.stats['no_match_found'] += 1
+            else:
+                self.stats['mismatches_detected'] += 1
+                # Optionally create an alert video (not implemented here to keep simple)
+
+    # streaming
+    @_recording_metrics
+    def run_streaming(self, on_result: Callable[[Dict[str, Any]], None] = None) -> Dict[str, Any]:
+        """
+        Consume entry and exit frame sources concurrently and emit a match result as soon as
+        an exit cluster is finalized, instead of matching everything at the end.
+        on_result is called with each result dict (same shape as run_analysis match results).
+
+        Frames of the two cameras are processed in timestamp order (video time for files, capture
+        time for live streams), and that timestamp is the streaming matcher's clock, so replaying
+        the same files gives the same matches however fast they are processed.
+        """
+        logger.info("="*80)
+        logger.info("STARTING STREAMING PIPELINE")
+        logger.info("="*80)
+        self.metrics.reset()
+        t0 = time.perf_counter()
+
+        stream = StreamingMatcher(
+            self._make_matcher(),
+            vehicle_threshold=self.vehicle_similarity_threshold,
+            quality_weighted=self.quality_weighted_clusters,
+            entry_ttl=self.entry_ttl,
+            exit_idle_timeout=self.exit_idle_timeout,
+            index_backend=self.index_backend,
+            index_params=self.index_params
+        )
+        trackers = {True: self.tracker, False: ByteTrackManager(frame_rate=self.video_fps)}
+        self.tracker.reset()
+
+        sources = {True: queue.Queue(maxsize=self.stream_queue_size), False: queue.Queue(maxsize=self.stream_queue_size)}
+        readers = [
+            threading.Thread(target=self._read_frames, args=(self.entry_frames_path, sources[True]), daemon=True),
+            threading.Thread(target=self._read_frames, args=(self.exit_frames_path, sources[False]), daemon=True)
+        ]
+        for t in readers:
+            t.start()
+
+        def emit(results):
+            for r in results:
+                self._record_result(r)
+                if on_result is not None:
+                    on_result(r)
+                elif self.verbose:
+                    logger.info("Exit cluster %s -> %s (overall %.3f)", r["exit_cluster"].cluster_id, r["reason"], r["overall_score"])
+            # dropped clusters' snapshots are not used again
+            evicted = stream.take_evicted()
+            if self.snapshot_store is not None:
+                for cluster in evicted:
+                    self.snapshot_store.discard(cluster.snapshots)
+
+        def add(snapshots, is_entry, now):
+            for snap in snapshots:
+                self.stats[f"{'entry' if is_entry else 'exit'}_vehicles_detected"] += 1
+                if is_entry:
+                    stream.add_entry(snap, now)
+                else:
+                    stream.add_exit(snap, now)
+
+        # next frame of each camera; the earlier one is processed first
+        heads = {is_entry: q.get() for is_entry, q in sources.items()}
+        now = 0.0
+        while True:
+            ready = [is_entry for is_entry, item in heads.items() if item is not _END_OF_STREAM]
+            if not ready:
+                break
+            is_entry = min(ready, key=lambda side: heads[side][2])
+            img_path, frame, now = heads[is_entry]
+            heads[is_entry] = sources[is_entry].get()
+
+            side = 'entry' if is_entry else 'exit'
+            self.stats[f'{side}_frames_processed'] += 1
+            try:
+                candidates = self._collect_candidates(img_path, frame, tracker=trackers[is_entry], camera=side)
+                snapshots = self._embed_candidates(candidates, is_entry) if candidates else []
+            except Exception as e:
+                logger.exception("Error processing frame %s: %s", img_path, e)
+                snapshots = []
+            add(snapshots, is_entry, now)
+            emit(stream.poll(now))
+
+        for is_entry, tracker in trackers.items():
+            candidates = self._finish_tracks(tracker)
+            add(self._embed_candidates(candidates, is_entry) if candidates else [], is_entry, now)
+        emit(stream.flush())
+        self.stats.update(stream.stats)
+
+        logger.info("="*80)
+        logger.info("STREAMING COMPLETE")
+        logger.info("="*80)
+        self._finish_metrics(time.perf_counter() - t0)
+        self._print_summary()
+        return {'stats': self.stats}
+
+    def _read_frames(self, frames_path: str, out: queue.Queue):
+        """Put (frame_id, frame, timestamp) of every frame of frames_path on out, then _END_OF_STREAM."""
+        try:
+            for item in self._make_loader(frames_path).iter_with_timestamps():
+                out.put(item)
+        except Exception as e:
+            logger.exception("Frame source %s failed: %s", frames_path, e)
+        finally:
+            out.put(_END_OF_STREAM)
+
+    def _make_loader(self, frames_path: str):
+        """Frame source for a path: video files / stream URLs use VideoLoader, directories FrameLoader."""
+        if VideoLoader.is_video_source(frames_path):
+            return VideoLoader(frames_path, target_fps=self.video_fps)
+        return FrameLoader(frames_path, prefetch=self.frame_prefetch, num_workers=self.frame_decode_workers, reduce=self.frame_reduce,
+                           fps=self.video_fps)
+
+    @_recording_metrics
+    def _process_frames(self, frames_dir: str, is_entry: bool) -> List[VehicleSnapshot]:
+        if self.execution == "pipelined":
+            return self._process_frames_pipelined(frames_dir, is_entry)
+        return self._process_frames_batch(frames_dir, is_entry)
+
     # frame batch processing with tracker
     def _process_frames_batch(self, frames_dir: str, is_entry: bool):
         snapshots = []
-        loader = FrameLoader(frames_dir)
+        pending = []
+        loader = self._make_loader(frames_dir)
         self.tracker.reset()
+        frames_key = 'entry_frames_processed' if is_entry else 'exit_frames_processed'
+        self.stats[frames_key] = 0
 
         for img_path, frame in loader:
+            self.stats[frames_key] += 1
             try:
-                detections = self.vehicle_detector.detect(frame)
-                tracked = self.tracker.update_with_detections(detections)
-
-                # tracked has attributes xyxy, confidence, tracker_id
-                if getattr(tracked, "xyxy", None) is None or len(tracked.xyxy) == 0:
-                    continue
-
-                for i, tid in enumerate(tracked.tracker_id):
-                    tid = int(tid)
-                    # If snapshot already taken for this track, skip
-                    if self.tracker.is_completed(tid):
-                        continue
-
-                    x1, y1, x2, y2 = map(int, tracked.xyxy[i])
-                    # sanity check
-                    h, w = frame.shape[:2]
-                    x1, y1 = max(0, x1), max(0, y1)
-                    x2, y2 = min(w, x2), min(h, y2)
-                    if x2 <= x1 or y2 <= y1:
-                        continue
-
-                    vehicle_crop = frame[y1:y2, x1:x2]
-                    if vehicle_crop.size == 0:
-                        continue
-
-                    # Detect driver faces in vehicle
-                    driver_crops = self.face_detector.detect_driver_faces(frame, (x1,y1,x2,y2))
-                    if not driver_crops:
-                        # wait for next frame
-                        continue
-
-                    # Extract embeddings
-                    vehicle_emb = self.vehicle_embedder.embed(vehicle_crop)
-                    driver_emb = self.driver_embedder.embed(driver_crops)
-
-                    snapshot = VehicleSnapshot(
-                        track_id=tid,
-                        frame_path=img_path,
-                        bbox=(x1,y1,x2,y2),
-                        vehicle_crop=vehicle_crop,
-                        driver_crops=driver_crops,
-                        vehicle_embedding=vehicle_emb,
-                        driver_embedding=driver_emb,
-                        timestamp=time.time(), 
-                        is_entry=is_entry
-                    )
-
-                    snapshots.append(snapshot)
-                    self.tracker.mark_completed(tid)
-                    if self.verbose:
-                        logger.info("Captured snapshot for track %s from frame %s", tid, os.path.basename(img_path))
-
+                pending.extend(self._collect_candidates(img_path, frame, camera="entry" if is_entry else "exit"))
             except Exception as e:
                 logger.exception("Error processing frame %s: %s", img_path, e)
                 continue
 
+            if len(pending) >= self.embed_batch_size:
+                snapshots.extend(self._embed_candidates(pending, is_entry))
+                pending = []
+
+        pending.extend(self._finish_tracks(self.tracker))
+        if pending:
+            snapshots.extend(self._embed_candidates(pending, is_entry))
+
+        metrics = getattr(loader, "metrics", None)
+        if metrics:
+            logger.info("Frame decode: %d frames, mean %.1f ms, consumer waited %.2f s",
+                        metrics['frames_decoded'], 1000 * metrics['decode_time_mean'], metrics['wait_time_total'])
+
         return snapshots
 
+    def _collect_candidates(self, img_path: str, frame, tracker: ByteTrackManager = None, camera: str = None) -> List[Dict[str, Any]]:
+        """
+        Run detection, tracking and face search on one frame.
+        Returns one candidate per new track with a visible driver face; embedding is deferred
+        so that candidates can be embedded together.
+        """
+        tracker = tracker or self.tracker
+        detections = self._detect_vehicles(frame)
+        tracked = self._track_frame(frame, detections, tracker)
+        return self._search_faces(img_path, frame, tracked, tracker, camera)
+
+    @timed("stage_seconds", stage="detect")
+    def _detect_vehicles(self, frame):
+        return self.vehicle_detector.detect(frame)
+
+    @timed("stage_seconds", stage="track")
+    def _track_frame(self, frame, detections, tracker: ByteTrackManager) -> Tuple[List[Tuple[int, Tuple[int, int, int, int], VehicleTrackState]], int, List[VehicleTrackState]]:
+        """
+        Update the tracker and return ((track_id, clipped bbox, track state) for tracks still
+        waiting for a snapshot, the tracker frame index, the states of tracks removed in this
+        update). Face search works only on what is returned here, never on the tracker's live
+        id table or frame counter, which the track stage keeps advancing (pipelined execution).
+        """
+        tracks = []
+        tracked = tracker.update_with_detections(detections)
+        frame_index, removed = tracker.frame_index, tracker.take_removed()
+
+        # tracked has attributes xyxy, confidence, tracker_id
+        if getattr(tracked, "xyxy", None) is None or len(tracked.xyxy) == 0:
+            return tracks, frame_index, removed
+
+        h, w = frame.shape[:2]
+        for i, tid in enumerate(tracked.tracker_id):
+            tid = int(tid)
+            st = tracker.state(tid)
+            # If snapshot already taken for this track, skip
+            if st is None or st.snapshot_taken:
+                continue
+
+            x1, y1, x2, y2 = map(int, tracked.xyxy[i])
+            # sanity check
+            x1, y1 = max(0, x1), max(0, y1)
+            x2, y2 = min(w, x2), min(h, y2)
+            if x2 <= x1 or y2 <= y1:
+                continue
+            tracks.append((tid, (x1, y1, x2, y2), st))
+        return tracks, frame_index, removed
+
+    @timed("stage_seconds", stage="faces")
+    def _search_faces(self, img_path: str, frame, tracked, tracker: ByteTrackManager, camera: str = None) -> List[Dict[str, Any]]:
+        """Face search on the tracks of one _track_frame() result; returns the candidates ready to embed."""
+        tracks, frame_index, removed = tracked
+        candidates = []
+        # may have completed since tracking ran (pipelined execution)
+        pending = [(tid, bbox, st) for tid, bbox, st in tracks if not st.snapshot_taken]
+
+        # Detect driver faces in vehicles
+        if not pending:
+            face_lists = []
+        elif self.frame_face_detection:
+            face_lists = self.face_detector.detect_driver_faces_frame(frame, [bbox for _, bbox, _ in pending], camera=camera)
+        else:
+            face_lists = (self.face_detector.detect_driver_faces(frame, bbox, camera=camera) for _, bbox, _ in pending)
+
+        for (tid, (x1, y1, x2, y2), st), driver_crops in zip(pending, face_lists):
+            if not driver_crops:
+                # wait for next frame
+                continue
+
+            candidate = {
+                "track_id": tid,
+                "frame_path": img_path,
+                "bbox": (x1,y1,x2,y2),
+                "vehicle_crop": frame[y1:y2, x1:x2],
+                "driver_crops": driver_crops,
+                "timestamp": time.time(),
+                # un-marked if embedding fails, so the track is searched again
+                "track_state": st
+            }
+            if self.snapshot_selection == "best":
+                # copies, so buffered candidates do not keep whole frames alive
+                candidate["vehicle_crop"] = candidate["vehicle_crop"].copy()
+                candidate["driver_crops"] = [f.copy() for f in driver_crops]
+                tracker.offer_candidate(st, candidate, snapshot_quality_score(driver_crops), self.snapshot_top_k, frame_index)
+                continue
+
+            candidates.append(candidate)
+            st.snapshot_taken = True
+
+        if self.snapshot_selection == "best":
+            candidates.extend(tracker.pop_ready_candidates(self.snapshot_frame_budget, frame_index, finished=removed))
+        return candidates
+
+    def _finish_tracks(self, tracker: ByteTrackManager, removed: List[VehicleTrackState] = None) -> List[Dict[str, Any]]:
+        """
+        End all open tracks of a finished frame source; returns the candidates they still buffered.
+        removed: what tracker.finish() returned, when it already ran on the track stage.
+        """
+        if removed is None:
+            removed = tracker.finish()
+        if self.snapshot_selection != "best":
+            return []
+        return tracker.pop_ready_candidates(self.snapshot_frame_budget, tracker.frame_index, finished=removed, flush=True)
+
+    def _process_frames_pipelined(self, frames_dir: str, is_entry: bool) -> List[VehicleSnapshot]:
+        """
+        Same result as _process_frames_batch, but detection, tracking, face search and
+        embedding each run on their own thread connected by bounded queues. Tracking and
+        face search are single-threaded stages, so tracks are still handled in frame order.
+        Each frame's track states, frame index and removed tracks travel with the stage item,
+        so face search sees the tracker as it was after that frame, however far ahead it is.
+        """
+        loader = self._make_loader(frames_dir)
+        tracker = self.tracker
+        tracker.reset()
+        frames_key = 'entry_frames_processed' if is_entry else 'exit_frames_processed'
+        self.stats[frames_key] = 0
+
+        def detect(item):
+            if item is _END_OF_STREAM:
+                return [item]
+            img_path, frame = item
+            self.stats[frames_key] += 1
+            return [(img_path, frame, self._detect_vehicles(frame))]
+
+        def track(item):
+            if item is _END_OF_STREAM:
+                # tracks end here, on the track thread; face search only hands over their candidates
+                return [(_END_OF_STREAM, tracker.finish())]
+            img_path, frame, detections = item
+            tracked = self._track_frame(frame, detections, tracker)
+            # with best-snapshot selection the face stage also runs for frames without open tracks,
+            # since it hands over the candidates of tracks that ended
+            return [(img_path, frame, tracked)] if tracked[0] or self.snapshot_selection == "best" else []
+
+        def faces(item):
+            if item[0] is _END_OF_STREAM:
+                return self._finish_tracks(tracker, removed=item[1])
+            img_path, frame, tracked = item
+            return self._search_faces(img_path, frame, tracked, tracker, "entry" if is_entry else "exit")
+
+        def embed(candidates):
+            return self._embed_candidates(candidates, is_entry)
+
+        executor = StagedExecutor([
+            Stage("detect", detect),
+            Stage("track", track),
+            Stage("faces", faces),
+            Stage("embed", embed, batch_size=self.embed_batch_size)
+        ], queue_size=self.stage_queue_size)
+
+        # _END_OF_STREAM follows the last frame so buffered snapshot candidates are flushed
+        snapshots = list(executor.run(itertools.chain(loader, [_END_OF_STREAM])))
+        executor.log_metrics()
+        self.stage_metrics['entry' if is_entry else 'exit'] = executor.metrics
+        return snapshots
+
+    def _embed_batch(self, candidates: List[Dict[str, Any]]):
+        with self.metrics.timer("stage_seconds", stage="embed_vehicle"):
+            vehicle_embs = self.vehicle_embedder.embed_batch([c["vehicle_crop"] for c in candidates])
+        # face crops of all candidates go through the face model together
+        with self.metrics.timer("stage_seconds", stage="embed_driver"):
+            driver_embs = self.driver_embedder.embed_batch([c["driver_crops"] for c in candidates])
+        return list(zip(candidates, vehicle_embs, driver_embs))
+
+    def _embed_candidates(self, candidates: List[Dict[str, Any]], is_entry: bool) -> List[VehicleSnapshot]:
+        """
+        Embed candidates in one batch. If the batch fails they are embedded one at a time;
+        the tracks of candidates that still fail are no longer completed, so they get
+        another snapshot from a later frame while they are open.
+        """
+        snapshots = []
+        try:
+            embedded = self._embed_batch(candidates)
+        except Exception as e:
+            logger.exception("Batched embedding failed, embedding %d candidates one at a time: %s", len(candidates), e)
+            embedded = []
+            for c in candidates:
+                try:
+                    embedded.extend(self._embed_batch([c]))
+                except Exception as e:
+                    logger.warning("Embedding failed for track %s from frame %s: %s", c["track_id"], os.path.basename(c["frame_path"]), e)
+                    if c.get("track_state") is not None:
+                        c["track_state"].snapshot_taken = False
+
+        for c, vehicle_emb, driver_emb in embedded:
+            snapshot = self._make_snapshot(
+                track_id=c["track_id"],
+                frame_path=c["frame_path"],
+                bbox=c["bbox"],
+                vehicle_crop=c["vehicle_crop"],
+                driver_crops=c["driver_crops"],
+                vehicle_embedding=vehicle_emb,
+                driver_embedding=driver_emb,
+                timestamp=c["timestamp"],
+                is_entry=is_entry,
+                quality=c.get("quality", 1.0)
+            )
+            snapshots.append(snapshot)
+            if self.verbose:
+                logger.info("Captured snapshot for track %s from frame %s", c["track_id"], os.path.basename(c["frame_path"]))
+
+        return snapshots
+
+    def _make_snapshot(self, **fields):
+        if self.snapshot_store is not None:
+            return self.snapshot_store.create(**fields)
+        return VehicleSnapshot(**fields)
+
+    def _finish_metrics(self, elapsed: float):
+        """Record run-level throughput gauges and export the metrics if metrics_path is set."""
+        frames = self.stats['entry_frames_processed'] + self.stats['exit_frames_processed']
+        snapshots = self.stats['entry_vehicles_detected'] + self.stats['exit_vehicles_detected']
+        self.metrics.set("run_seconds", elapsed)
+        self.metrics.set("frames_per_second", frames / elapsed if elapsed > 0 else 0.0)
+        self.metrics.set("snapshots_per_second", snapshots / elapsed if elapsed > 0 else 0.0)
+        METRICS.merge(self.metrics)
+        if self.metrics_path:
+            self.metrics.export(self.metrics_path)
+            logger.info("Metrics written to %s", self.metrics_path)
+
     def _print_summary(self):
         logger.info("📊 ANALYSIS SUMMARY:")
         for k, v in self.stats.items():
             logger.info("   %s: %s", k, v)
+        gauges = self.metrics.gauges
+        if "run_seconds" in gauges:
+            logger.info("   throughput: %.1f frames/s, %.2f snapshots/s over %.1f s", gauges["frames_per_second"][()],
+                        gauges["snapshots_per_second"][()], gauges["run_seconds"][()])
+        for name in ("stage_seconds", "backend_seconds"):
+            for labels in self.metrics.histograms.get(name, {}):
+                h = self.metrics.histogram_summary(name, **dict(labels))
+                logger.info("   %s %s: n=%d p50=%.1fms p95=%.1fms p99=%.1fms", name, ",".join(f"{k}={v}" for k, v in labels),
+                            h['count'], 1000 * h['p50'], 1000 * h['p95'], 1000 * h['p99'])
+        # only components this run actually built (parallel runs build them in the workers)
+        tracker = self._components.get("tracker")
+        if tracker is not None:
+            ts = tracker.stats
+            logger.info("   tracks: %d born, %d lost, %d removed", ts['tracks_born'], ts['tracks_lost'], ts['tracks_removed'])
+        fm = getattr(self._components.get("face_detector"), "metrics", None)
+        if fm:
+            logger.info("   face search: %d vehicles, %d with faces, %d backend calls", fm['vehicles'], fm['vehicles_with_faces'], fm['backend_calls'])
+        if self.cache is not None:
+            logger.info("   cache: %d hits, %d misses, %.1f MB", self.cache.hits, self.cache.misses, self.cache.total_bytes / 1e6)
         logger.info("📁 Output directory: %s", self.output_path)
\ No newline at end of file
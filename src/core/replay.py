@@ -0,0 +1,289 @@
+# src/core/replay.py
+"""
+Replay and threshold sweeps over stored embeddings.
+
+export_dump() writes entry/exit snapshots (embeddings + track metadata, no crops) to one
+.npz file; load_dump() reads it back. replay() re-runs cluster_snapshots and
+VehicleDriverMatcher on a dump for one set of thresholds, without any model inference.
+
+sweep_thresholds() evaluates a whole grid of (vehicle, driver, overall) thresholds. The
+snapshot-level similarity matrices (vehicle within each side, driver and vehicle across
+sides) are computed once. Clustering for each vehicle threshold only reads the
+within-side matrix. Cluster-level scores are then label-sums of the cross matrices.
+The driver and overall thresholds are evaluated together by broadcasting over the
+per-exit scores, so the matcher is never called per grid point.
+
+Run: python -m core.replay dump.npz --vehicle 0.6 0.7 0.8 --driver 0.5 0.6 --overall 0.4 0.5
+"""
+import argparse
+import csv
+import itertools
+import logging
+from typing import Any, Dict, List, Sequence, Tuple
+import numpy as np
+
+from data_models.snapshot import VehicleSnapshot, pack_snapshots, unpack_snapshots
+from core.clustering import cluster_snapshots
+from core.matcher import VehicleDriverMatcher, DRIVER_WEIGHT, VEHICLE_WEIGHT, _HAS_SCIPY
+
+logger = logging.getLogger(__name__)
+
+SWEEP_COLUMNS = ("vehicle_threshold", "driver_threshold", "overall_threshold", "entry_clusters", "exit_clusters",
+                 "matches_found", "mismatches_detected", "no_match_found")
+
+
+# dump files
+def export_dump(path: str, entry_snapshots: List[VehicleSnapshot], exit_snapshots: List[VehicleSnapshot]):
+    """Save entry and exit snapshots (embeddings + metadata) to a compressed .npz file."""
+    arrays = {}
+    for prefix, snapshots in (("entry", entry_snapshots), ("exit", exit_snapshots)):
+        for key, value in pack_snapshots(snapshots).items():
+            arrays[f"{prefix}_{key}"] = value
+    np.savez_compressed(path, **arrays)
+    logger.info("Exported %d entry / %d exit snapshots to %s", len(entry_snapshots), len(exit_snapshots), path)
+
+
+def load_dump(path: str) -> Tuple[List[VehicleSnapshot], List[VehicleSnapshot]]:
+    """Load (entry_snapshots, exit_snapshots) written by export_dump; crops come back as None / []."""
+    with np.load(path) as data:
+        sides = []
+        for prefix in ("entry", "exit"):
+            packed = {k[len(prefix) + 1:]: data[k] for k in data.files if k.startswith(prefix + "_")}
+            sides.append(unpack_snapshots(packed))
+    return sides[0], sides[1]
+
+
+# single replay
+def replay(entry_snapshots: List[VehicleSnapshot], exit_snapshots: List[VehicleSnapshot],
+           vehicle_threshold: float = 0.7, driver_threshold: float = 0.6, overall_threshold: float = 0.5,
+           quality_weighted: bool = False, **matcher_kwargs) -> Dict[str, Any]:
+    """Re-run clustering and matching on stored snapshots for one set of thresholds."""
+    entry_clusters = cluster_snapshots(entry_snapshots, threshold=vehicle_threshold, quality_weighted=quality_weighted)
+    exit_clusters = cluster_snapshots(exit_snapshots, threshold=vehicle_threshold, quality_weighted=quality_weighted)
+    matcher = VehicleDriverMatcher(driver_threshold=driver_threshold, overall_threshold=overall_threshold, **matcher_kwargs)
+    return {
+        'entry_clusters': entry_clusters,
+        'exit_clusters': exit_clusters,
+        'match_results': matcher.match(entry_clusters, exit_clusters)
+    }
+
+
+# vectorized sweep
+class _Side:
+    """Packed embeddings of one camera side plus the within-side vehicle similarity matrix."""
+
+    def __init__(self, snapshots: List[VehicleSnapshot], quality_weighted: bool):
+        packed = pack_snapshots(snapshots)
+        self.n = len(snapshots)
+        self.vehicle = packed["vehicle_embedding"].astype(np.float64)
+        self.has_vehicle = packed["has_vehicle_embedding"]
+        self.driver = packed["driver_embedding"].astype(np.float64)
+        self.has_driver = packed["has_driver_embedding"]
+        self.weights = packed["quality"].astype(np.float64) if quality_weighted else np.ones(self.n)
+        # snapshots with a non-positive weight join clusters but add nothing to their sums
+        self.weights = np.where(self.weights > 0, self.weights, 0.0)
+        self.vehicle_sims = self.vehicle @ self.vehicle.T
+
+
+def _cluster_labels(side: _Side, threshold: float) -> np.ndarray:
+    """
+    Cluster labels equal to cluster_snapshots(threshold) (up to float rounding), computed
+    from side.vehicle_sims. A centroid is the normalized weighted sum of its members, so
+    its similarity to snapshot x is sum_m w_m S[m, x] / ||sum_m w_m v_m||; both terms are
+    kept per cluster and updated in O(N) when a snapshot joins.
+    """
+    n = side.n
+    labels = np.zeros(n, dtype=np.int64)
+    row_sums = np.zeros((max(n, 1), n), dtype=np.float64)
+    norms_sq = np.zeros(max(n, 1), dtype=np.float64)
+    k = 0
+    for x in range(n):
+        target = k
+        if side.has_vehicle[x] and k > 0:
+            norms = np.sqrt(norms_sq[:k])
+            scores = np.divide(row_sums[:k, x], norms, out=np.zeros(k), where=norms > 0)
+            best = int(np.argmax(scores))
+            if scores[best] >= threshold:
+                target = best
+        if target == k:
+            k += 1
+        labels[x] = target
+        w = side.weights[x]
+        if side.has_vehicle[x] and w > 0:
+            s = side.vehicle_sims[x]
+            norms_sq[target] += 2 * w * row_sums[target, x] + w * w * s[x]
+            row_sums[target] += w * s
+    return labels
+
+
+def _sum_by_label(mat: np.ndarray, labels: np.ndarray, k: int) -> np.ndarray:
+    """Sum rows of mat that share a label -> (k, ...)."""
+    out = np.zeros((k,) + mat.shape[1:], dtype=np.float64)
+    np.add.at(out, labels, mat)
+    return out
+
+
+def _cluster_norms(emb: np.ndarray, weights: np.ndarray, labels: np.ndarray, k: int) -> np.ndarray:
+    return np.linalg.norm(_sum_by_label(emb * weights[:, None], labels, k), axis=1)
+
+
+def _cluster_scores(cross: np.ndarray, exit_side: _Side, entry_side: _Side, exit_labels, entry_labels,
+                    emb_attr: str, has_attr: str) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """
+    (exit cluster x entry cluster) cosine matrix of the clusters' normalized weighted mean
+    embeddings, aggregated from the snapshot-level cross matrix. Also returns which clusters
+    have the embedding at all.
+    """
+    kx, ke = int(exit_labels.max()) + 1, int(entry_labels.max()) + 1
+    wx = exit_side.weights * getattr(exit_side, has_attr)
+    we = entry_side.weights * getattr(entry_side, has_attr)
+    sums = _sum_by_label(cross * wx[:, None], exit_labels, kx)
+    sums = _sum_by_label((sums * we[None, :]).T, entry_labels, ke).T
+    nx = _cluster_norms(getattr(exit_side, emb_attr), wx, exit_labels, kx)
+    ne = _cluster_norms(getattr(entry_side, emb_attr), we, entry_labels, ke)
+    denom = nx[:, None] * ne[None, :]
+    sims = np.divide(sums, denom, out=np.zeros_like(sums), where=denom > 0)
+    # a cluster has an embedding if any member with a positive weight had one, as in VehicleCluster
+    has_x = _sum_by_label(wx, exit_labels, kx) > 0
+    has_e = _sum_by_label(we, entry_labels, ke) > 0
+    return sims, has_x, has_e
+
+
+def _grid_counts(driver: np.ndarray, vehicle: np.ndarray, assigned: np.ndarray, best_driver: np.ndarray,
+                 driver_thresholds: np.ndarray, overall_thresholds: np.ndarray) -> Tuple[np.ndarray, ...]:
+    """
+    Count outcomes of VehicleDriverMatcher._result for every (driver, overall) threshold pair.
+    driver / vehicle / assigned have shape (n_driver, n_exit) or (n_exit,) (threshold-independent).
+    """
+    driver = np.broadcast_to(driver, (driver_thresholds.size, best_driver.size))
+    vehicle = np.broadcast_to(vehicle, driver.shape)
+    assigned = np.broadcast_to(assigned, driver.shape)
+    candidate = assigned & (driver >= driver_thresholds[:, None])
+    overall = DRIVER_WEIGHT * driver + VEHICLE_WEIGHT * vehicle
+    is_match = candidate[:, None, :] & (overall[:, None, :] >= overall_thresholds[None, :, None])
+    matches = is_match.sum(axis=2)
+    no_match = np.broadcast_to((~candidate).sum(axis=1)[:, None], matches.shape)
+    mismatches = best_driver.size - matches - no_match
+    return matches, mismatches, no_match
+
+
+def sweep_thresholds(entry_snapshots: List[VehicleSnapshot], exit_snapshots: List[VehicleSnapshot],
+                     vehicle_thresholds: Sequence[float], driver_thresholds: Sequence[float],
+                     overall_thresholds: Sequence[float], quality_weighted: bool = False,
+                     assignment: str = "independent") -> List[Dict[str, Any]]:
+    """
+    Evaluate every combination of thresholds; returns one row per grid point with the
+    cluster counts and the pipeline's match stats (see SWEEP_COLUMNS).
+    Counts agree with replay() using mode="matrix" (or the exact "flat" index).
+    """
+    if assignment not in ("independent", "greedy", "hungarian"):
+        raise ValueError(f"Unknown assignment mode: {assignment}, choose from: ['independent', 'greedy', 'hungarian']")
+    if assignment == "hungarian" and not _HAS_SCIPY:
+        logger.warning("scipy not available; falling back to greedy assignment")
+        assignment = "greedy"
+    solve = VehicleDriverMatcher._solve_hungarian if assignment == "hungarian" else VehicleDriverMatcher._solve_greedy
+
+    d_thr = np.asarray(driver_thresholds, dtype=np.float64)
+    o_thr = np.asarray(overall_thresholds, dtype=np.float64)
+    entry = _Side(entry_snapshots, quality_weighted)
+    exit_ = _Side(exit_snapshots, quality_weighted)
+    # snapshot-level cross matrices, computed once for the whole grid
+    cross_driver = exit_.driver @ entry.driver.T
+    cross_vehicle = exit_.vehicle @ entry.vehicle.T
+
+    rows = []
+    for v_thr in vehicle_thresholds:
+        entry_labels = _cluster_labels(entry, v_thr)
+        exit_labels = _cluster_labels(exit_, v_thr)
+        n_entry = int(entry_labels.max()) + 1 if entry.n else 0
+        n_exit = int(exit_labels.max()) + 1 if exit_.n else 0
+
+        best_driver = np.zeros(n_exit)
+        driver = np.zeros(n_exit)
+        vehicle = np.zeros(n_exit)
+        assigned = np.zeros(n_exit, dtype=bool)
+        driver_sims = vehicle_sims = None
+        if n_exit and n_entry:
+            driver_sims, has_dx, has_de = _cluster_scores(cross_driver, exit_, entry, exit_labels, entry_labels,
+                                                          "driver", "has_driver")
+            if has_dx.any() and has_de.any():
+                driver_sims[~has_dx, :] = -np.inf
+                driver_sims[:, ~has_de] = -np.inf
+                vehicle_sims, _, _ = _cluster_scores(cross_vehicle, exit_, entry, exit_labels, entry_labels,
+                                                     "vehicle", "has_vehicle")
+            else:
+                driver_sims = None
+
+        if driver_sims is not None:
+            cand = np.argmax(driver_sims, axis=1)
+            cand_score = driver_sims[np.arange(n_exit), cand]
+            assigned = cand_score > 0.0
+            best_driver = np.where(assigned, cand_score, 0.0)
+
+        if assignment == "independent" or driver_sims is None:
+            if driver_sims is not None:
+                driver = best_driver
+                vehicle = np.where(assigned, vehicle_sims[np.arange(n_exit), cand], 0.0)
+        else:
+            # the assignment depends on the driver threshold through pruning
+            driver = np.zeros((d_thr.size, n_exit))
+            vehicle = np.zeros((d_thr.size, n_exit))
+            assigned = np.zeros((d_thr.size, n_exit), dtype=bool)
+            for t, thr in enumerate(d_thr):
+                keep = (driver_sims >= thr) & (driver_sims > 0.0)
+                r, c = np.nonzero(keep)
+                if not r.size:
+                    continue
+                combined = DRIVER_WEIGHT * driver_sims[r, c] + VEHICLE_WEIGHT * vehicle_sims[r, c]
+                for i, j in solve(r, c, combined):
+                    driver[t, i] = driver_sims[i, j]
+                    vehicle[t, i] = vehicle_sims[i, j]
+                    assigned[t, i] = True
+
+        matches, mismatches, no_match = _grid_counts(driver, vehicle, assigned, best_driver, d_thr, o_thr)
+        for (a, d), (b, o) in itertools.product(enumerate(d_thr), enumerate(o_thr)):
+            rows.append({
+                "vehicle_threshold": float(v_thr),
+                "driver_threshold": float(d),
+                "overall_threshold": float(o),
+                "entry_clusters": n_entry,
+                "exit_clusters": n_exit,
+                "matches_found": int(matches[a, b]),
+                "mismatches_detected": int(mismatches[a, b]),
+                "no_match_found": int(no_match[a, b])
+            })
+    return rows
+
+
+def write_sweep_csv(path: str, rows: List[Dict[str, Any]]):
+    with open(path, "w", newline="") as f:
+        writer = csv.DictWriter(f, fieldnames=SWEEP_COLUMNS)
+        writer.writeheader()
+        writer.writerows(rows)
+
+
+def main():
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s [%(levelname)s] %(message)s")
+    parser = argparse.ArgumentParser(description="Threshold sweep over an embedding dump")
+    parser.add_argument("dump", help=".npz file written with --export-dump")
+    parser.add_argument("--vehicle", type=float, nargs="+", default=[0.7], help="Vehicle similarity thresholds")
+    parser.add_argument("--driver", type=float, nargs="+", default=[0.6], help="Driver similarity thresholds")
+    parser.add_argument("--overall", type=float, nargs="+", default=[0.5], help="Overall match thresholds")
+    parser.add_argument("--assignment", default="independent", choices=["independent", "greedy", "hungarian"])
+    parser.add_argument("--quality-weighted", action="store_true", help="Quality-weighted cluster centroids")
+    parser.add_argument("--csv", default=None, help="Write the sweep table to this CSV file")
+    args = parser.parse_args()
+
+    entry_snapshots, exit_snapshots = load_dump(args.dump)
+    rows = sweep_thresholds(entry_snapshots, exit_snapshots, args.vehicle, args.driver, args.overall,
+                            quality_weighted=args.quality_weighted, assignment=args.assignment)
+    if args.csv:
+        write_sweep_csv(args.csv, rows)
+        logger.info("Wrote %d rows to %s", len(rows), args.csv)
+    print(" ".join(f"{c:>19}" for c in SWEEP_COLUMNS))
+    for r in rows:
+        print(" ".join(f"{r[c]:>19.3f}" if isinstance(r[c], float) else f"{r[c]:>19d}" for c in SWEEP_COLUMNS))
+
+
+if __name__ == "__main__":
+    main()
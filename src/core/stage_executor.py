@@ -0,0 +1,165 @@
+# src/core/stage_executor.py
+"""
+Pipelined execution of processing stages connected by bounded queues.
+
+Each stage runs on its own worker thread and consumes its input queue in FIFO order,
+so a single-worker stage preserves item order (required for tracking) while later
+stages overlap with earlier stages working on newer items. Model inference in
+torch / OpenCV / onnx releases the GIL, which is where the overlap comes from.
+"""
+import time
+import queue
+import contextvars
+import threading
+import logging
+from typing import Any, Callable, Dict, Iterable, Iterator, List
+
+logger = logging.getLogger(__name__)
+
+# end-of-input marker passed down the queues
+_DONE = object()
+
+
+class Stage:
+    """
+    A processing step. fn receives one item (or a list of up to batch_size items when
+    batch_size > 1, taking whatever is already queued without waiting) and returns an
+    iterable of outputs for the next stage; None or [] drops the item.
+    """
+
+    def __init__(self, name: str, fn: Callable[[Any], Iterable[Any]], batch_size: int = 1):
+        self.name = name
+        self.fn = fn
+        self.batch_size = max(1, batch_size)
+        self.metrics = {
+            'items_in': 0,
+            'items_out': 0,
+            'errors': 0,
+            'busy_time': 0.0,
+            'queue_depth_max': 0,
+            'queue_depth_mean': 0.0
+        }
+        self._depth_samples = 0
+
+    def _sample_depth(self, q: queue.Queue):
+        depth = q.qsize()
+        m = self.metrics
+        self._depth_samples += 1
+        m['queue_depth_max'] = max(m['queue_depth_max'], depth)
+        m['queue_depth_mean'] += (depth - m['queue_depth_mean']) / self._depth_samples
+
+    def _take(self, inbox: queue.Queue):
+        item = inbox.get()
+        self._sample_depth(inbox)
+        if item is _DONE or self.batch_size == 1:
+            return item, item is _DONE
+        batch = [item]
+        done = False
+        while len(batch) < self.batch_size:
+            try:
+                nxt = inbox.get_nowait()
+            except queue.Empty:
+                break
+            if nxt is _DONE:
+                done = True
+                break
+            batch.append(nxt)
+        return batch, done
+
+    def run(self, inbox: queue.Queue, outbox: queue.Queue):
+        while True:
+            work, done = self._take(inbox)
+            if work is not _DONE:
+                self.metrics['items_in'] += len(work) if self.batch_size > 1 else 1
+                t0 = time.perf_counter()
+                try:
+                    outputs = self.fn(work) or []
+                except Exception as e:
+                    self.metrics['errors'] += 1
+                    logger.exception("Stage %s failed: %s", self.name, e)
+                    outputs = []
+                self.metrics['busy_time'] += time.perf_counter() - t0
+                for out in outputs:
+                    self.metrics['items_out'] += 1
+                    outbox.put(out)
+            if done:
+                outbox.put(_DONE)
+                return
+
+
+class StagedExecutor:
+    """
+    Runs items from a source through a chain of stages, each on its own thread.
+    run() yields the outputs of the last stage as they become available.
+    """
+
+    def __init__(self, stages: List[Stage], queue_size: int = 8):
+        if not stages:
+            raise ValueError("StagedExecutor needs at least one stage")
+        self.stages = stages
+        self.queue_size = max(1, queue_size)
+        self.metrics: Dict[str, Any] = {}
+
+    def run(self, source: Iterable[Any]) -> Iterator[Any]:
+        queues = [queue.Queue(maxsize=self.queue_size) for _ in self.stages]
+        # the last stage writes to an unbounded queue drained by the caller
+        queues.append(queue.Queue())
+        # stages run in the caller's context (e.g. its active metrics registry)
+        workers = [
+            threading.Thread(target=contextvars.copy_context().run, args=(stage.run, queues[i], queues[i + 1]),
+                             name=f"stage-{stage.name}", daemon=True)
+            for i, stage in enumerate(self.stages)
+        ]
+        for w in workers:
+            w.start()
+
+        n_source = [0]
+
+        def feed():
+            try:
+                for item in source:
+                    n_source[0] += 1
+                    queues[0].put(item)
+            except Exception as e:
+                logger.exception("Stage source failed: %s", e)
+            finally:
+                queues[0].put(_DONE)
+
+        t0 = time.perf_counter()
+        feeder = threading.Thread(target=contextvars.copy_context().run, args=(feed,), name="stage-source", daemon=True)
+        feeder.start()
+
+        results = queues[-1]
+        while True:
+            out = results.get()
+            if out is _DONE:
+                break
+            yield out
+
+        feeder.join()
+        for w in workers:
+            w.join()
+        self._collect_metrics(n_source[0], time.perf_counter() - t0)
+
+    def _collect_metrics(self, n_source: int, elapsed: float):
+        self.metrics = {
+            'items': n_source,
+            'elapsed': elapsed,
+            'throughput': n_source / elapsed if elapsed > 0 else 0.0,
+            'stages': {}
+        }
+        for stage in self.stages:
+            m = dict(stage.metrics)
+            m['throughput'] = m['items_in'] / m['busy_time'] if m['busy_time'] > 0 else 0.0
+            m['utilization'] = m['busy_time'] / elapsed if elapsed > 0 else 0.0
+            self.metrics['stages'][stage.name] = m
+
+    def log_metrics(self):
+        m = self.metrics
+        if not m:
+            return
+        logger.info("Pipelined run: %d items in %.2f s (%.1f items/s)", m['items'], m['elapsed'], m['throughput'])
+        for name, sm in m['stages'].items():
+            logger.info("   stage %-12s in=%d out=%d busy=%.2fs util=%.0f%% queue(max=%d, mean=%.1f)",
+                        name, sm['items_in'], sm['items_out'], sm['busy_time'], 100 * sm['utilization'],
+                        sm['queue_depth_max'], sm['queue_depth_mean'])
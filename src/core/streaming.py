@@ -0,0 +1,154 @@
+# src/core/streaming.py
+"""
+Incremental clustering and matching for long-running (streaming) analysis.
+
+Entry snapshots are clustered as they arrive and their clusters are kept in an
+embedding index. Exit snapshots are clustered too; an exit cluster is finalized once
+it has received no new snapshot for exit_idle_timeout seconds, and is then matched
+against the open entry clusters right away. Matched entry clusters, and entry
+clusters not updated for entry_ttl seconds, are evicted so memory stays bounded.
+
+Time is video time: callers pass the timestamp of the frame being processed as
+`now` (snapshots default to their own timestamp), so eviction, and the matches,
+do not depend on how fast frames are processed.
+"""
+import logging
+from typing import Any, Dict, List, Tuple
+
+from data_models.snapshot import VehicleSnapshot
+from data_models.cluster import VehicleCluster
+from core.clustering import CentroidClusterer
+from core.matcher import VehicleDriverMatcher
+from index.base import EmbeddingIndex
+from index.factory import create_index
+
+logger = logging.getLogger(__name__)
+
+
+class StreamingMatcher:
+
+    def __init__(
+        self,
+        matcher: VehicleDriverMatcher,
+        vehicle_threshold: float = 0.7,
+        quality_weighted: bool = False,
+        entry_ttl: float = 4 * 3600.0,
+        exit_idle_timeout: float = 5.0,
+        index_backend: str = "flat",
+        index_params: Dict[str, Any] = None
+    ):
+        self.matcher = matcher
+        self.entry_ttl = entry_ttl
+        self.exit_idle_timeout = exit_idle_timeout
+        self.index_backend = index_backend
+        self.index_params = index_params or {}
+
+        self.entry_clusterer = CentroidClusterer(threshold=vehicle_threshold, quality_weighted=quality_weighted)
+        self.exit_clusterer = CentroidClusterer(threshold=vehicle_threshold, quality_weighted=quality_weighted)
+        self.entry_index: EmbeddingIndex = None
+
+        # open entry clusters by index key
+        self.entries: Dict[int, VehicleCluster] = {}
+        self._entry_keys: Dict[int, int] = {}
+        self._entry_seen: Dict[int, float] = {}
+        self._next_key = 0
+
+        # open exit clusters: id(cluster) -> (cluster, last update)
+        self._open_exits: Dict[int, Tuple[VehicleCluster, float]] = {}
+        # evicted entry clusters and finalized exit clusters, until take_evicted()
+        self._evicted: List[VehicleCluster] = []
+
+        self.stats = {
+            'entry_clusters': 0,
+            'exit_clusters': 0,
+            'entries_evicted_matched': 0,
+            'entries_evicted_ttl': 0
+        }
+
+    def __len__(self):
+        return len(self.entries) + len(self._open_exits)
+
+    def add_entry(self, snapshot: VehicleSnapshot, now: float = None):
+        now = snapshot.timestamp if now is None else now
+        cluster = self.entry_clusterer.add(snapshot)
+        cluster.finalize()
+
+        key = self._entry_keys.get(id(cluster))
+        if key is None:
+            key = self._next_key
+            self._next_key += 1
+            self._entry_keys[id(cluster)] = key
+            self.entries[key] = cluster
+            self.stats['entry_clusters'] += 1
+        self._entry_seen[key] = now
+
+        if cluster.driver_embedding is not None:
+            if self.entry_index is None:
+                self.entry_index = create_index(self.index_backend, dim=cluster.driver_embedding.shape[0], **self.index_params)
+            self.entry_index.add([key], cluster.driver_embedding[None, :])
+
+    def add_exit(self, snapshot: VehicleSnapshot, now: float = None):
+        now = snapshot.timestamp if now is None else now
+        cluster = self.exit_clusterer.add(snapshot)
+        self._open_exits[id(cluster)] = (cluster, now)
+
+    def poll(self, now: float) -> List[Dict[str, Any]]:
+        """
+        Finalize and match exit clusters that went idle by now, then evict expired entry clusters.
+        Returns the match results produced by this call.
+        """
+        idle = [c for c, seen in self._open_exits.values() if now - seen >= self.exit_idle_timeout]
+        results = self._finalize_exits(idle)
+
+        expired = [key for key, seen in self._entry_seen.items() if now - seen >= self.entry_ttl]
+        for key in expired:
+            self._evict_entry(key)
+        self.stats['entries_evicted_ttl'] += len(expired)
+        return results
+
+    def flush(self) -> List[Dict[str, Any]]:
+        """Finalize and match every open exit cluster (end of stream)."""
+        return self._finalize_exits([c for c, _ in self._open_exits.values()])
+
+    def take_evicted(self) -> List[VehicleCluster]:
+        """
+        Clusters dropped since the last call: evicted entry clusters and finalized exit clusters.
+        Their snapshots are no longer used (e.g. their store rows can be released).
+        """
+        evicted, self._evicted = self._evicted, []
+        return evicted
+
+    def _finalize_exits(self, exit_clusters: List[VehicleCluster]) -> List[Dict[str, Any]]:
+        if not exit_clusters:
+            return []
+
+        for c in exit_clusters:
+            c.finalize()
+            self.exit_clusterer.remove(c)
+            del self._open_exits[id(c)]
+        self.stats['exit_clusters'] += len(exit_clusters)
+        self._evicted.extend(exit_clusters)
+
+        if self.entry_index is None:
+            results = self.matcher.match([], exit_clusters)
+        else:
+            results = self.matcher.match_indexed(self.entry_index, self.entries, exit_clusters)
+
+        for r in results:
+            if r["is_match"]:
+                key = self._entry_keys.get(id(r["entry_cluster"]))
+                if key is not None:
+                    self._evict_entry(key)
+                    self.stats['entries_evicted_matched'] += 1
+        return results
+
+    def _evict_entry(self, key: int):
+        cluster = self.entries.pop(key, None)
+        if cluster is None:
+            return
+        self._entry_seen.pop(key, None)
+        self._entry_keys.pop(id(cluster), None)
+        self.entry_clusterer.remove(cluster)
+        self._evicted.append(cluster)
+        if self.entry_index is not None:
+            self.entry_index.remove([key])
@@ -6,31 +6,64 @@ from .snapshot import VehicleSnapshot
 
 @dataclass
 class VehicleCluster:
+    """
+    Snapshots of one vehicle. Vehicle and driver embeddings are kept as running
+    (optionally quality-weighted) sums, so add_snapshot() and finalize() are O(D).
+    """
     cluster_id: str
     is_entry: bool
     snapshots: List[VehicleSnapshot] = field(default_factory=list)
     vehicle_embedding: np.ndarray = None
     driver_embedding: np.ndarray = None
+    # weight each snapshot by its quality score instead of counting all equally
+    quality_weighted: bool = False
+    _vehicle_sum: np.ndarray = field(default=None, init=False, repr=False, compare=False)
+    _driver_sum: np.ndarray = field(default=None, init=False, repr=False, compare=False)
+    _vehicle_weight: float = field(default=0.0, init=False, repr=False, compare=False)
+    _driver_weight: float = field(default=0.0, init=False, repr=False, compare=False)
+
+    def __post_init__(self):
+        for s in self.snapshots:
+            self._accumulate(s)
 
     def add_snapshot(self, snapshot: VehicleSnapshot):
         self.snapshots.append(snapshot)
+        self._accumulate(snapshot)
+
+    def _accumulate(self, snapshot: VehicleSnapshot):
+        w = float(getattr(snapshot, "quality", 1.0)) if self.quality_weighted else 1.0
+        if w <= 0:
+            return
+        if snapshot.vehicle_embedding is not None:
+            if self._vehicle_sum is None:
+                self._vehicle_sum = np.zeros(snapshot.vehicle_embedding.shape, dtype=np.float64)
+            self._vehicle_sum += w * snapshot.vehicle_embedding
+            self._vehicle_weight += w
+        if snapshot.driver_embedding is not None:
+            if self._driver_sum is None:
+                self._driver_sum = np.zeros(snapshot.driver_embedding.shape, dtype=np.float64)
+            self._driver_sum += w * snapshot.driver_embedding
+            self._driver_weight += w
+
+    @staticmethod
+    def _normalized(total: np.ndarray) -> np.ndarray:
+        # the mean and the sum point the same way, so normalizing the sum gives the normalized mean
+        norm = np.linalg.norm(total)
+        out = total / norm if norm > 0 else total
+        return out.astype(np.float32)
 
     def finalize(self):
         if not self.snapshots:
             return
-        vehicle_embs = [s.vehicle_embedding for s in self.snapshots if s.vehicle_embedding is not None]
-        driver_embs = [s.driver_embedding for s in self.snapshots if s.driver_embedding is not None]
 
-        if vehicle_embs:
-            self.vehicle_embedding = np.mean(vehicle_embs, axis=0)
-            self.vehicle_embedding = self.vehicle_embedding / (np.linalg.norm(self.vehicle_embedding))
+        if self._vehicle_sum is not None:
+            self.vehicle_embedding = self._normalized(self._vehicle_sum)
 
-        if driver_embs:
-            self.driver_embedding = np.mean(driver_embs, axis=0)
-            self.driver_embedding = self.driver_embedding / (np.linalg.norm(self.driver_embedding))
+        if self._driver_sum is not None:
+            self.driver_embedding = self._normalized(self._driver_sum)
 
     @classmethod
-    def from_snapshots(cls, cluster_id: str, snapshots: List[VehicleSnapshot], is_entry: bool):
-        c = cls(cluster_id=cluster_id, is_entry=is_entry, snapshots=list(snapshots))
+    def from_snapshots(cls, cluster_id: str, snapshots: List[VehicleSnapshot], is_entry: bool, quality_weighted: bool = False):
+        c = cls(cluster_id=cluster_id, is_entry=is_entry, snapshots=list(snapshots), quality_weighted=quality_weighted)
         c.finalize()
-        return c
\ No newline at end of file
+        return c
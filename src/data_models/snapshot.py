@@ -1,6 +1,6 @@
 # src/data_models/snapshot.py
 from dataclasses import dataclass
-from typing import Tuple, List
+from typing import Any, Dict, Tuple, List
 import numpy as np
 
 @dataclass(frozen=True)
@@ -13,4 +13,56 @@ class VehicleSnapshot:
     vehicle_embedding: np.ndarray
     driver_embedding: np.ndarray
     timestamp: float
-    is_entry: bool
\ No newline at end of file
+    is_entry: bool
+    # snapshot quality score; used to weight cluster means when enabled
+    quality: float = 1.0
+
+
+def _stack(embs: List[np.ndarray]):
+    valid = np.array([e is not None and e.size > 0 for e in embs], dtype=bool)
+    dim = next((e.shape[0] for e, ok in zip(embs, valid) if ok), 0)
+    mat = np.zeros((len(embs), dim), dtype=np.float32)
+    for i, ok in enumerate(valid):
+        if ok:
+            mat[i] = embs[i]
+    return mat, valid
+
+
+def pack_snapshots(snapshots: List[VehicleSnapshot]) -> Dict[str, Any]:
+    """
+    Compact columnar form of snapshots: embeddings as (N, D) float32 matrices plus
+    metadata arrays, without any image crops. Cheap to pickle or save with np.savez.
+    """
+    vehicle, has_vehicle = _stack([s.vehicle_embedding for s in snapshots])
+    driver, has_driver = _stack([s.driver_embedding for s in snapshots])
+    return {
+        "track_id": np.array([s.track_id for s in snapshots], dtype=np.int64),
+        "frame_path": np.array([str(s.frame_path) for s in snapshots], dtype=str),
+        "bbox": np.array([s.bbox for s in snapshots], dtype=np.int32).reshape(-1, 4),
+        "timestamp": np.array([s.timestamp for s in snapshots], dtype=np.float64),
+        "is_entry": np.array([s.is_entry for s in snapshots], dtype=bool),
+        "quality": np.array([getattr(s, "quality", 1.0) for s in snapshots], dtype=np.float32),
+        "vehicle_embedding": vehicle,
+        "has_vehicle_embedding": has_vehicle,
+        "driver_embedding": driver,
+        "has_driver_embedding": has_driver,
+    }
+
+
+def unpack_snapshots(packed: Dict[str, Any]) -> List[VehicleSnapshot]:
+    """Inverse of pack_snapshots; crops come back as None / []."""
+    snapshots = []
+    for i in range(len(packed["track_id"])):
+        snapshots.append(VehicleSnapshot(
+            track_id=int(packed["track_id"][i]),
+            frame_path=str(packed["frame_path"][i]),
+            bbox=tuple(int(v) for v in packed["bbox"][i]),
+            vehicle_crop=None,
+            driver_crops=[],
+            vehicle_embedding=packed["vehicle_embedding"][i] if packed["has_vehicle_embedding"][i] else None,
+            driver_embedding=packed["driver_embedding"][i] if packed["has_driver_embedding"][i] else None,
+            timestamp=float(packed["timestamp"][i]),
+            is_entry=bool(packed["is_entry"][i]),
+            quality=float(packed["quality"][i]) if "quality" in packed else 1.0
+        ))
+    return snapshots
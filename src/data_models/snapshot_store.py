@@ -0,0 +1,196 @@
+# src/data_models/snapshot_store.py
+"""
+Compact snapshot storage.
+
+VehicleSnapshot keeps full-resolution crops and its own embedding arrays for every
+track. CompactSnapshot instead keeps metadata in __slots__, embeddings as rows of a
+shared float32 EmbeddingStore, and crops either dropped or spilled to a JPEG
+CropStore and reloaded lazily (e.g. when building an alert). Rows of discarded
+snapshots are released and reused, so the stores stay bounded in long runs.
+"""
+import os
+import threading
+from typing import List, Optional, Tuple
+import cv2
+import numpy as np
+
+
+class EmbeddingStore:
+    """
+    (N, D) float32 array, grown by doubling. Rows are addressed by index; released rows
+    go on a free list and are handed out again by add() before the array grows.
+    """
+
+    def __init__(self, dim: int = 512, capacity: int = 1024):
+        self.dim = dim
+        self._capacity = max(1, capacity)
+        self._data = np.zeros((self._capacity, dim), dtype=np.float32)
+        self._size = 0
+        self._free: List[int] = []
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        """Number of rows in use."""
+        return self._size - len(self._free)
+
+    @property
+    def nbytes(self) -> int:
+        return self._data.nbytes
+
+    def add(self, vector: Optional[np.ndarray]) -> int:
+        """Store a vector and return its row, or -1 for a missing/empty vector."""
+        if vector is None or vector.size == 0:
+            return -1
+        with self._lock:
+            if self._size == 0 and vector.shape[0] != self.dim:
+                self.dim = vector.shape[0]
+                self._data = np.zeros((self._capacity, self.dim), dtype=np.float32)
+            if self._free:
+                row = self._free.pop()
+                self._data[row] = vector
+                return row
+            if self._size == self._capacity:
+                self._capacity *= 2
+                data = np.zeros((self._capacity, self.dim), dtype=np.float32)
+                data[:self._size] = self._data[:self._size]
+                self._data = data
+            row = self._size
+            self._data[row] = vector
+            self._size += 1
+            return row
+
+    def release(self, row: int):
+        """Free a row returned by add() (-1 is ignored); it is zeroed and reused by a later add()."""
+        if row < 0:
+            return
+        with self._lock:
+            self._data[row] = 0.0
+            self._free.append(row)
+
+    def get(self, row: int) -> Optional[np.ndarray]:
+        if row < 0:
+            return None
+        return self._data[row]
+
+    def matrix(self) -> np.ndarray:
+        """View of all stored rows (released rows are zero)."""
+        return self._data[:self._size]
+
+
+class CropStore:
+    """
+    Spills crops to JPEG files under root and reloads them on demand.
+    With root=None crops are dropped and load() returns None.
+    """
+
+    def __init__(self, root: str = None, jpeg_quality: int = 90):
+        self.root = root
+        self.jpeg_quality = jpeg_quality
+        self._count = 0
+        self._lock = threading.Lock()
+        if root:
+            os.makedirs(root, exist_ok=True)
+
+    def put(self, crop: Optional[np.ndarray], name: str) -> Optional[str]:
+        if not self.root or crop is None or crop.size == 0:
+            return None
+        with self._lock:
+            self._count += 1
+            path = os.path.join(self.root, f"{name}_{self._count:08d}.jpg")
+        if not cv2.imwrite(path, crop, [cv2.IMWRITE_JPEG_QUALITY, self.jpeg_quality]):
+            return None
+        return path
+
+    @staticmethod
+    def load(ref: Optional[str]) -> Optional[np.ndarray]:
+        if ref is None:
+            return None
+        return cv2.imread(ref)
+
+
+class CompactSnapshot:
+    """
+    Drop-in replacement for VehicleSnapshot (same attribute names, read-only) backed by
+    shared stores. vehicle_crop / driver_crops are reloaded from the CropStore on access.
+    """
+
+    __slots__ = ("track_id", "frame_path", "bbox", "timestamp", "is_entry", "quality",
+                 "_vehicle_store", "_vehicle_row", "_driver_store", "_driver_row",
+                 "_vehicle_crop_ref", "_driver_crop_refs")
+
+    def __init__(self, track_id: int, frame_path: str, bbox: Tuple[int, int, int, int], timestamp: float, is_entry: bool,
+                 vehicle_store: EmbeddingStore, vehicle_row: int, driver_store: EmbeddingStore, driver_row: int,
+                 vehicle_crop_ref: Optional[str] = None, driver_crop_refs: Tuple[str, ...] = (), quality: float = 1.0):
+        self.track_id = track_id
+        self.frame_path = frame_path
+        self.bbox = bbox
+        self.timestamp = timestamp
+        self.is_entry = is_entry
+        self.quality = quality
+        self._vehicle_store = vehicle_store
+        self._vehicle_row = vehicle_row
+        self._driver_store = driver_store
+        self._driver_row = driver_row
+        self._vehicle_crop_ref = vehicle_crop_ref
+        self._driver_crop_refs = driver_crop_refs
+
+    @property
+    def vehicle_embedding(self) -> Optional[np.ndarray]:
+        return self._vehicle_store.get(self._vehicle_row)
+
+    @property
+    def driver_embedding(self) -> Optional[np.ndarray]:
+        return self._driver_store.get(self._driver_row)
+
+    @property
+    def vehicle_crop(self) -> Optional[np.ndarray]:
+        return CropStore.load(self._vehicle_crop_ref)
+
+    @property
+    def driver_crops(self) -> List[np.ndarray]:
+        crops = [CropStore.load(ref) for ref in self._driver_crop_refs]
+        return [c for c in crops if c is not None]
+
+    def release(self):
+        """Free the embedding rows; the embeddings read as None afterwards."""
+        self._vehicle_store.release(self._vehicle_row)
+        self._driver_store.release(self._driver_row)
+        self._vehicle_row = -1
+        self._driver_row = -1
+
+    def __repr__(self):
+        return f"CompactSnapshot(track_id={self.track_id}, frame_path={self.frame_path!r}, bbox={self.bbox}, is_entry={self.is_entry})"
+
+
+class SnapshotStore:
+    """Creates CompactSnapshots that share one vehicle and one driver EmbeddingStore."""
+
+    def __init__(self, crop_dir: str = None, dim: int = 512):
+        self.vehicle_embeddings = EmbeddingStore(dim)
+        self.driver_embeddings = EmbeddingStore(dim)
+        self.crops = CropStore(crop_dir)
+
+    def create(self, track_id: int, frame_path: str, bbox: Tuple[int, int, int, int], vehicle_crop: np.ndarray,
+               driver_crops: List[np.ndarray], vehicle_embedding: np.ndarray, driver_embedding: np.ndarray,
+               timestamp: float, is_entry: bool, quality: float = 1.0) -> CompactSnapshot:
+        prefix = f"{'entry' if is_entry else 'exit'}_{track_id}"
+        return CompactSnapshot(
+            track_id=track_id,
+            frame_path=frame_path,
+            bbox=bbox,
+            timestamp=timestamp,
+            is_entry=is_entry,
+            quality=quality,
+            vehicle_store=self.vehicle_embeddings,
+            vehicle_row=self.vehicle_embeddings.add(vehicle_embedding),
+            driver_store=self.driver_embeddings,
+            driver_row=self.driver_embeddings.add(driver_embedding),
+            vehicle_crop_ref=self.crops.put(vehicle_crop, f"{prefix}_vehicle"),
+            driver_crop_refs=tuple(r for r in (self.crops.put(c, f"{prefix}_driver") for c in driver_crops or []) if r)
+        )
+
+    def discard(self, snapshots: List[CompactSnapshot]):
+        """Release the embedding rows of snapshots that are no longer needed (e.g. evicted clusters)."""
+        for snapshot in snapshots:
+            if isinstance(snapshot, CompactSnapshot):
+                snapshot.release()
@@ -2,23 +2,45 @@
 import cv2
 import numpy as np
 import logging
-from typing import List, Tuple
+from typing import Dict, List, Tuple
+from utils.logging import timed
+from utils.backends import available, optional, require
+from utils.model_registry import MODELS, weights_version
 
 logger = logging.getLogger(__name__)
 
-# Try different backends
-try:
-    import face_recognition
-    _HAS_FR = True
-except Exception:
-    _HAS_FR = False
+# YOLO face model via ultralytics is optional; backends are imported when a FaceDetector is built
+_HAS_YOLO_FACE = available("ultralytics")
+
+FACE_STRATEGIES = ("regions", "single_pass")
+
+
+class DriverSidePrior:
+    """
+    Learns on which side of the vehicle (as seen by one camera) driver faces show up.
+    Once confident, single-pass detection only searches that side's upper region.
+    """
+
+    def __init__(self, default: str = "right", min_observations: int = 20, min_ratio: float = 0.8):
+        self.default = default
+        self.min_observations = min_observations
+        self.min_ratio = min_ratio
+        self.counts = {"left": 0, "right": 0}
+
+    def update(self, side: str):
+        self.counts[side] += 1
+
+    @property
+    def preferred(self) -> str:
+        if self.counts["left"] == self.counts["right"]:
+            return self.default
+        return max(self.counts, key=self.counts.get)
+
+    @property
+    def confident(self) -> bool:
+        total = sum(self.counts.values())
+        return total >= self.min_observations and self.counts[self.preferred] / total >= self.min_ratio
 
-# YOLO face model via ultralytics is optional
-try:
-    from ultralytics import YOLO
-    _HAS_YOLO_FACE = True
-except Exception:
-    _HAS_YOLO_FACE = False
 
 class FaceDetector:
     """
@@ -26,131 +48,347 @@ class FaceDetector:
       - Try YOLO face if provided (fast/good)
       - Else try face_recognition (dlib hog)
       - Else fallback to Haar cascade (OpenCV)
+
+    strategy="regions" searches up to four overlapping vehicle regions, each with the full
+    backend chain. strategy="single_pass" runs the chain once on the vehicle's upper region,
+    trying at most call_budget backends, and assigns the faces to the left/right side
+    geometrically. Faces on the camera's preferred driver side are returned first; the
+    side is learned per camera (DriverSidePrior).
     """
 
-    def __init__(self, yolov8_face_model: str = None):
-        self.yolo_face = None
+    def __init__(self, yolov8_face_model: str = None, strategy: str = "regions", call_budget: int = 1):
+        if strategy not in FACE_STRATEGIES:
+            raise ValueError(f"Unknown face detection strategy: {strategy}, choose from: {list(FACE_STRATEGIES)}")
+        self.strategy = strategy
+        self.call_budget = max(1, call_budget)
+        self.priors: Dict[str, DriverSidePrior] = {}
+        self.metrics = {
+            'vehicles': 0,
+            'backend_calls': 0,
+            'vehicles_with_faces': 0
+        }
+        self.model_path = yolov8_face_model
+        # face_recognition (dlib) is only imported when the chain first reaches it
+        self._has_face_recognition = available("face_recognition")
+        self._yolo_handle = None
         if yolov8_face_model and _HAS_YOLO_FACE:
             try:
-                self.yolo_face = YOLO(yolov8_face_model)
+                # shared with every detector in the process using the same weights
+                self._yolo_handle = MODELS.acquire("yolo", yolov8_face_model,
+                                                   lambda: require("ultralytics").YOLO(yolov8_face_model))
                 logger.info("Loaded YOLO face model")
             except Exception as e:
                 logger.warning("Could not load YOLO face model: %s", e)
-                self.yolo_face = None
 
-        if not _HAS_FR and self.yolo_face is None:
-            # Haar cascade fallback
-            try:
-                self.haar = cv2.CascadeClassifier(cv2.data.haarcascades + "haarcascade_frontalface_default.xml")
-                logger.info("Using OpenCV Haar cascade for faces")
-            except Exception as e:
-                logger.error("Haar cascade not available: %s", e)
-                self.haar = None
-        else:
+        self.haar = None
+        if not self._has_face_recognition and self._yolo_handle is None:
+            self._load_haar()
+
+    def _load_haar(self):
+        # Haar cascade fallback
+        try:
+            self.haar = cv2.CascadeClassifier(cv2.data.haarcascades + "haarcascade_frontalface_default.xml")
+            logger.info("Using OpenCV Haar cascade for faces")
+        except Exception as e:
+            logger.error("Haar cascade not available: %s", e)
             self.haar = None
 
+    @property
+    def face_recognition(self):
+        """
+        The face_recognition module, imported on first use; None when it is missing or fails
+        to import (then the Haar cascade takes its place if there is no YOLO model).
+        """
+        if not self._has_face_recognition:
+            return None
+        module = optional("face_recognition")
+        if module is None:
+            self._has_face_recognition = False
+            if self._yolo_handle is None:
+                self._load_haar()
+        return module
+
+    def close(self):
+        """Release the shared YOLO face model."""
+        if self._yolo_handle is not None:
+            self._yolo_handle.release()
+            self._yolo_handle = None
+
+    @property
+    def yolo_face(self):
+        """The shared YOLO face model, read through its registry handle on every call; None without one."""
+        return self._yolo_handle.model if self._yolo_handle is not None else None
+
+    @property
+    def model_id(self) -> str:
+        """Identifies the active backend chain (used as a cache key)."""
+        parts = []
+        if self._yolo_handle is not None:
+            parts.append(f"yolo:{weights_version(self.model_path)}")
+        if self._has_face_recognition:
+            parts.append("face_recognition")
+        if self.haar is not None:
+            parts.append("haar")
+        backends = "+".join(parts) or "none"
+        if self.strategy == "single_pass":
+            return f"{backends}:single_pass:{self.call_budget}"
+        return backends
+
     def detect_faces_in_region(self, region: np.ndarray) -> List[np.ndarray]:
         """
         Return list of face crops found inside the given region image.
         """
-        faces = []
+        boxes, _ = self._detect_face_boxes(region)
+        return [region[y1:y2, x1:x2] for x1, y1, x2, y2 in boxes]
 
+    def _detect_face_boxes(self, region: np.ndarray, max_calls: int = None,
+                           yolo_boxes: List[Tuple[int, int, int, int]] = None) -> Tuple[List[Tuple[int, int, int, int]], int]:
+        """
+        Run the backend chain on a region and return (face boxes in region coordinates, backends called).
+        Backends are tried in order until one finds a face that passes the quality check, or
+        max_calls backends have been tried. yolo_boxes is YOLO's output for this region from
+        a batched call (see detect_driver_faces_frame), used instead of calling YOLO again.
+        """
         if region is None or region.size == 0:
-            return faces
+            return [], 0
 
-        # 1) YOLO face detector (if loaded)
-        if self.yolo_face is not None:
-            try:
-                results = self.yolo_face(region, verbose=False, conf=0.3)
-                for r in results:
-                    if not hasattr(r, "boxes") or r.boxes is None:
-                        continue
-                    for b in r.boxes:
-                        coords = b.xyxy[0].cpu().numpy() if hasattr(b.xyxy[0], "cpu") else b.xyxy[0]
-                        x1, y1, x2, y2 = map(int, coords)
-                        if x2 <= x1 or y2 <= y1:
-                            continue
-                        crop = region[y1:y2, x1:x2]
-                        if crop.size > 0 and self._check_face_quality(crop):
-                            faces.append(crop)
-                if faces:
-                    return faces
-            except Exception:
-                logger.exception("YOLO face detection failed; falling back")
-
-        # 2) face_recognition (dlib HOG)
-        if _HAS_FR:
-            try:
-                rgb = cv2.cvtColor(region, cv2.COLOR_BGR2RGB)
-                locs = face_recognition.face_locations(rgb, model="hog")
-                for (top, right, bottom, left) in locs:
-                    crop = region[top:bottom, left:right]
-                    if crop.size > 0 and self._check_face_quality(crop):
-                        faces.append(crop)
-                if faces:
-                    return faces
-            except Exception:
-                logger.exception("face_recognition detection failed; falling back")
-
-        # 3) Haar cascade
+        backends = []
+        if self._yolo_handle is not None:
+            backends.append(self._yolo_boxes)
+        if self._has_face_recognition:
+            backends.append(self._face_recognition_boxes)
         if self.haar is not None:
-            try:
-                gray = cv2.cvtColor(region, cv2.COLOR_BGR2GRAY)
-                rects = self.haar.detectMultiScale(gray, scaleFactor=1.1, minNeighbors=4, minSize=(24, 24))
-                for (x, y, w, h) in rects:
-                    crop = region[y:y+h, x:x+w]
-                    if crop.size > 0 and self._check_face_quality(crop):
-                        faces.append(crop)
-                return faces
-            except Exception:
-                logger.exception("Haar cascade failed")
+            backends.append(self._haar_boxes)
+        if max_calls is not None:
+            backends = backends[:max_calls]
+
+        calls = 0
+        for backend in backends:
+            if yolo_boxes is not None and backend == self._yolo_boxes:
+                found = yolo_boxes
+            else:
+                calls += 1
+                found = backend(region)
+            boxes = [b for b in found if self._check_face_quality(region[b[1]:b[3], b[0]:b[2]])]
+            if boxes:
+                return boxes, calls
+        return [], calls
+
+    @timed("backend_seconds", component="face_detector", backend="yolo")
+    def _yolo_boxes(self, region: np.ndarray) -> List[Tuple[int, int, int, int]]:
+        try:
+            with self._yolo_handle.lock:
+                results = self.yolo_face(region, verbose=False, conf=0.3)
+            return [box for r in results for box in self._result_boxes(r)]
+        except Exception:
+            logger.exception("YOLO face detection failed; falling back")
+            return []
+
+    @timed("backend_seconds", component="face_detector", backend="yolo_batch")
+    def _yolo_boxes_batch(self, regions: List[np.ndarray]) -> List[List[Tuple[int, int, int, int]]]:
+        """YOLO face boxes of several regions in one call (each region is letterboxed on its own); None on failure."""
+        try:
+            with self._yolo_handle.lock:
+                results = self.yolo_face(list(regions), verbose=False, conf=0.3)
+            return [self._result_boxes(r) for r in results]
+        except Exception:
+            logger.exception("Batched YOLO face detection failed; searching regions one by one")
+            return None
+
+    @staticmethod
+    def _result_boxes(r) -> List[Tuple[int, int, int, int]]:
+        boxes = []
+        if not hasattr(r, "boxes") or r.boxes is None:
+            return boxes
+        for b in r.boxes:
+            coords = b.xyxy[0].cpu().numpy() if hasattr(b.xyxy[0], "cpu") else b.xyxy[0]
+            x1, y1, x2, y2 = map(int, coords)
+            if x2 <= x1 or y2 <= y1:
+                continue
+            boxes.append((x1, y1, x2, y2))
+        return boxes
 
-        return faces
+    @timed("backend_seconds", component="face_detector", backend="face_recognition")
+    def _face_recognition_boxes(self, region: np.ndarray) -> List[Tuple[int, int, int, int]]:
+        try:
+            # dlib HOG
+            face_recognition = self.face_recognition
+            if face_recognition is None:
+                # failed to import just now; the Haar cascade replaces it from here on
+                return self._haar_boxes(region) if self.haar is not None else []
+            rgb = cv2.cvtColor(region, cv2.COLOR_BGR2RGB)
+            locs = face_recognition.face_locations(rgb, model="hog")
+            return [(left, top, right, bottom) for (top, right, bottom, left) in locs]
+        except Exception:
+            logger.exception("face_recognition detection failed; falling back")
+            return []
+
+    @timed("backend_seconds", component="face_detector", backend="haar")
+    def _haar_boxes(self, region: np.ndarray) -> List[Tuple[int, int, int, int]]:
+        try:
+            gray = cv2.cvtColor(region, cv2.COLOR_BGR2GRAY)
+            rects = self.haar.detectMultiScale(gray, scaleFactor=1.1, minNeighbors=4, minSize=(24, 24))
+            return [(x, y, x + w, y + h) for (x, y, w, h) in rects]
+        except Exception:
+            logger.exception("Haar cascade failed")
+            return []
 
-    def detect_driver_faces(self, frame: np.ndarray, vehicle_bbox: Tuple[int,int,int,int]) -> List[np.ndarray]:
+    def detect_driver_faces(self, frame: np.ndarray, vehicle_bbox: Tuple[int,int,int,int], camera: str = None) -> List[np.ndarray]:
         """
-        Multi-region strategy based on vehicle bbox.
-        Only searches upper half of vehicle and tries right-side first (driver side for right-hand traffic).
+        Face crops of the driver of the vehicle at vehicle_bbox.
+        camera names the source camera; single_pass keeps one driver-side prior per camera.
+        """
+        return self._detect_vehicle(frame, vehicle_bbox, camera)
+
+    def detect_driver_faces_frame(self, frame: np.ndarray, vehicle_bboxes: List[Tuple[int,int,int,int]],
+                                  camera: str = None) -> List[List[np.ndarray]]:
+        """
+        detect_driver_faces for every vehicle of a frame, with the same output, but the YOLO
+        passes batched: the regions the per-vehicle search would run YOLO on go through one
+        YOLO call per round (each region still at its own resolution). "regions" searches the
+        regions round by round for the vehicles still without a face; "single_pass" prefetches
+        each vehicle's upper region. A region not prefetched (the driver-side prior changed
+        within the frame) gets its own YOLO call.
+        Without a YOLO face model this is the per-vehicle API in a loop.
+        """
+        if self._yolo_handle is None or not vehicle_bboxes:
+            return [self._detect_vehicle(frame, bbox, camera) for bbox in vehicle_bboxes]
+
+        yolo: Dict[Tuple[int, int, int, int], List[Tuple[int, int, int, int]]] = {}
+        if self.strategy == "single_pass":
+            prior = self.priors.setdefault(camera, DriverSidePrior())
+            self._prefetch_yolo(frame, [self._upper_region(bbox, prior) for bbox in vehicle_bboxes], yolo)
+            return [self._detect_vehicle(frame, bbox, camera, yolo) for bbox in vehicle_bboxes]
+
+        found: List[List[Tuple[int, int, int, int]]] = [[] for _ in vehicle_bboxes]
+        searching = list(range(len(vehicle_bboxes)))
+        regions = [self._vehicle_regions(bbox) for bbox in vehicle_bboxes]
+        for r in range(len(regions[0])):
+            self._prefetch_yolo(frame, [regions[i][r] for i in searching], yolo)
+            still = []
+            for i in searching:
+                found[i] = self._search_region(frame, regions[i][r], yolo=yolo)
+                if not found[i]:
+                    still.append(i)
+            searching = still
+            if not searching:
+                break
+
+        out = []
+        for boxes in found:
+            self.metrics['vehicles'] += 1
+            if boxes:
+                self.metrics['vehicles_with_faces'] += 1
+            out.append([frame[by1:by2, bx1:bx2] for bx1, by1, bx2, by2 in boxes])
+        return out
+
+    def _prefetch_yolo(self, frame: np.ndarray, boxes: List[Tuple[int, int, int, int]],
+                       yolo: Dict[Tuple[int, int, int, int], List[Tuple[int, int, int, int]]]):
+        """Run YOLO once over the non-empty regions at boxes not in yolo yet, storing region -> face boxes."""
+        todo = list(dict.fromkeys(b for b in boxes if b not in yolo and frame[b[1]:b[3], b[0]:b[2]].size > 0))
+        if not todo:
+            return
+        results = self._yolo_boxes_batch([frame[y1:y2, x1:x2] for x1, y1, x2, y2 in todo])
+        if results is None:
+            return
+        self.metrics['backend_calls'] += 1
+        yolo.update(zip(todo, results))
+
+    def _detect_vehicle(self, frame: np.ndarray, vehicle_bbox: Tuple[int,int,int,int], camera: str = None,
+                        yolo: Dict[Tuple[int, int, int, int], List[Tuple[int, int, int, int]]] = None) -> List[np.ndarray]:
+        self.metrics['vehicles'] += 1
+        if self.strategy == "single_pass":
+            boxes = self._detect_single_pass(frame, vehicle_bbox, camera, yolo)
+        else:
+            boxes = self._detect_regions(frame, vehicle_bbox)
+        if boxes:
+            self.metrics['vehicles_with_faces'] += 1
+        return [frame[by1:by2, bx1:bx2] for bx1, by1, bx2, by2 in boxes]
+
+    def _search_region(self, frame: np.ndarray, box: Tuple[int, int, int, int], max_calls: int = None,
+                       yolo: Dict[Tuple[int, int, int, int], List[Tuple[int, int, int, int]]] = None) -> List[Tuple[int, int, int, int]]:
+        """
+        Face boxes (frame coordinates) inside box. yolo maps regions to YOLO's output from a
+        batched call; YOLO is not run again on a region found there.
+        """
+        x1, y1, x2, y2 = box
+        region = frame[y1:y2, x1:x2]
+        if region.size == 0:
+            return []
+
+        boxes, calls = self._detect_face_boxes(region, max_calls=max_calls, yolo_boxes=(yolo or {}).get(box))
+        self.metrics['backend_calls'] += calls
+        return [(max(bx1, 0) + x1, max(by1, 0) + y1, min(bx2, x2 - x1) + x1, min(by2, y2 - y1) + y1)
+                for bx1, by1, bx2, by2 in boxes]
+
+    @staticmethod
+    def _upper_region(vehicle_bbox: Tuple[int,int,int,int], prior: DriverSidePrior) -> Tuple[int, int, int, int]:
+        """
+        Region searched by single_pass: the upper region (same height as the side regions of
+        the "regions" strategy); once the camera's driver side is known only that side (0.6 of
+        the width).
         """
         x1, y1, x2, y2 = vehicle_bbox
         w = x2 - x1
         h = y2 - y1
-        regions = []
-
-        # right upper (driver side in right-hand traffic), prefer this
-        rx1 = int(x1 + 0.4 * w)
-        rx2 = x2
-        ry1 = y1
-        ry2 = int(y1 + 0.6 * h)
-        regions.append(frame[ry1:ry2, rx1:rx2])
-
-        # left upper
-        lx1 = x1
-        lx2 = int(x1 + 0.6 * w)
-        ly1 = y1
-        ly2 = int(y1 + 0.6 * h)
-        regions.append(frame[ly1:ly2, lx1:lx2])
-
-        # center upper
-        cx1 = int(x1 + 0.25 * w)
-        cx2 = int(x2 - 0.25 * w)
-        cy1 = y1
-        cy2 = int(y1 + 0.5 * h)
-        regions.append(frame[cy1:cy2, cx1:cx2])
-
-        # full vehicle
-        regions.append(frame[y1:y2, x1:x2])
+        ux1, ux2 = x1, x2
+        if prior.confident:
+            if prior.preferred == "right":
+                ux1 = int(x1 + 0.4 * w)
+            else:
+                ux2 = int(x1 + 0.6 * w)
+        return ux1, y1, ux2, int(y1 + 0.6 * h)
+
+    def _detect_single_pass(self, frame: np.ndarray, vehicle_bbox: Tuple[int,int,int,int], camera: str = None,
+                            yolo: Dict[Tuple[int, int, int, int], List[Tuple[int, int, int, int]]] = None) -> List[Tuple[int, int, int, int]]:
+        x1, y1, x2, y2 = vehicle_bbox
+        w = x2 - x1
+        prior = self.priors.setdefault(camera, DriverSidePrior())
+
+        boxes = self._search_region(frame, self._upper_region(vehicle_bbox, prior), self.call_budget, yolo)
+        if not boxes:
+            return []
+
+        # assign faces to the vehicle's left/right half by their center
+        sides = {"left": [], "right": []}
+        for box in boxes:
+            center = (box[0] + box[2]) / 2
+            sides["right" if center >= x1 + 0.5 * w else "left"].append(box)
+
+        side = prior.preferred if sides[prior.preferred] else next(s for s in sides if sides[s])
+        prior.update(side)
+        return sides[side]
 
+    def _detect_regions(self, frame: np.ndarray, vehicle_bbox: Tuple[int,int,int,int]) -> List[Tuple[int, int, int, int]]:
+        """
+        Multi-region strategy based on vehicle bbox.
+        Only searches upper half of vehicle and tries right-side first (driver side for right-hand traffic).
+        """
         # try regions in order and return as soon as any faces are found
-        for region in regions:
-            if region is None or region.size == 0:
-                continue
-            faces = self.detect_faces_in_region(region)
-            if faces:
-                return faces
+        for region in self._vehicle_regions(vehicle_bbox):
+            boxes = self._search_region(frame, region)
+            if boxes:
+                return boxes
 
         return []
 
+    @staticmethod
+    def _vehicle_regions(vehicle_bbox: Tuple[int,int,int,int]) -> List[Tuple[int, int, int, int]]:
+        """Regions searched by the "regions" strategy, in order."""
+        x1, y1, x2, y2 = vehicle_bbox
+        w = x2 - x1
+        h = y2 - y1
+        return [
+            # right upper (driver side in right-hand traffic), prefer this
+            (int(x1 + 0.4 * w), y1, x2, int(y1 + 0.6 * h)),
+            # left upper
+            (x1, y1, int(x1 + 0.6 * w), int(y1 + 0.6 * h)),
+            # center upper
+            (int(x1 + 0.25 * w), y1, int(x2 - 0.25 * w), int(y1 + 0.5 * h)),
+            # full vehicle
+            (x1, y1, x2, y2)
+        ]
+
     def _check_face_quality(self, face_crop: np.ndarray) -> bool:
         # Basic quality checks: size, brightness, variance
         try:
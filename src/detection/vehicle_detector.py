@@ -1,14 +1,16 @@
 # src/detection/vehicle_detector.py
 import numpy as np
 import logging
-from typing import List, Tuple
-import supervision as sv
+from typing import List, Tuple, TYPE_CHECKING
+from utils.logging import active_metrics
+from utils.backends import available, require
+from utils.model_registry import MODELS, weights_version
 
-try:
-    from ultralytics import YOLO
-    _YOLO_AVAILABLE = True
-except Exception:
-    _YOLO_AVAILABLE = False
+if TYPE_CHECKING:
+    import supervision as sv
+
+# found, not imported: ultralytics (and torch) load when the detector is built
+_YOLO_AVAILABLE = available("ultralytics")
 
 logger = logging.getLogger(__name__)
 
@@ -16,29 +18,51 @@ class VehicleDetector:
     """
     Wraps a YOLO detector (ultralytics) and converts results to supervision.Detections.
     If YOLO is not installed, returns empty detections.
+    The YOLO instance is shared through the model registry; close() releases it.
     """
     def __init__(self, model_path: str = "yolov8m.pt", conf: float = 0.5):
+        self.model_path = model_path
         self.conf = conf
-        self.model = None
+        self._handle = None
         if _YOLO_AVAILABLE:
             try:
-                logger.info("Loading YOLO vehicle model: %s", model_path)
-                self.model = YOLO(model_path)
+                self._handle = MODELS.acquire("yolo", model_path, lambda: require("ultralytics").YOLO(model_path))
             except Exception as e:
                 logger.warning("Failed to load YOLO model [%s]: %s", model_path, e)
-                self.model = None
         else:
             logger.warning("ultralytics YOLO not available. Vehicle detection will be disabled.")
 
-    def detect(self, frame) -> sv.Detections:
+    def close(self):
+        """Release the shared YOLO model (unloaded once no detector uses it)."""
+        if self._handle is not None:
+            self._handle.release()
+            self._handle = None
+
+    @property
+    def model(self):
+        """
+        The shared YOLO instance, read through the registry handle on every call (never kept
+        here), so MODELS.unload() frees it; raises once it was unloaded. None without YOLO.
+        """
+        return self._handle.model if self._handle is not None else None
+
+    @property
+    def model_id(self) -> str:
+        """Identifies the weights/options producing detections (used as a cache key)."""
+        return f"yolo:{weights_version(self.model_path)}:{self.conf}" if self._handle is not None else "none"
+
+    def detect(self, frame) -> "sv.Detections":
         """
         Returns supervision.Detections with fields xyxy (N,4) and confidence (N,)
         """
-        if self.model is None:
+        sv = require("supervision")
+        if self._handle is None:
             return sv.Detections.empty()
 
         try:
-            results = self.model(frame, verbose=False, conf=self.conf, classes=[2,3,5,7])  # car, motorbike, bus, truck
+            # ultralytics predictors are not thread-safe; the lock is shared by all users of these weights
+            with self._handle.lock, active_metrics().timer("backend_seconds", component="vehicle_detector", backend="yolo"):
+                results = self.model(frame, verbose=False, conf=self.conf, classes=[2,3,5,7])  # car, motorbike, bus, truck
             boxes = []
             scores = []
             for r in results:
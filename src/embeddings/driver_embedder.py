@@ -1,23 +1,18 @@
 # src/embeddings/driver_embedder.py
 import numpy as np
 import logging
+import threading
 import cv2
+from utils.logging import active_metrics
+from utils.backends import available, optional, require
+from utils.model_registry import MODELS
+from embeddings.preprocessing import BatchPreprocessor
 
 logger = logging.getLogger(__name__)
 
-# try keras-facenet first
-try:
-    from keras_facenet import FaceNet
-    _HAS_FACENET = True
-except Exception:
-    _HAS_FACENET = False
-
+# try keras-facenet first (imports TensorFlow, so only when an embedder is built),
 # fallback to face_recognition encodings if available
-try:
-    import face_recognition
-    _HAS_FR = True
-except Exception:
-    _HAS_FR = False
+_HAS_FACENET = available("keras_facenet")
 
 class DriverEmbedder:
     """
@@ -28,71 +23,135 @@ class DriverEmbedder:
     """
 
     def __init__(self):
+        # keras-facenet takes raw (N,H,W,3) pixels and standardizes them itself
+        self.preprocess = BatchPreprocessor(size=(128, 128), mean=None, std=None, to_rgb=False, layout="NHWC")
+        self._lock = threading.Lock()
+        self._handle = None
         if _HAS_FACENET:
-            self.model = FaceNet()
-        else:
-            self.model = None
-            if _HAS_FR:
+            try:
+                # one FaceNet per process, shared by all embedders
+                self._handle = MODELS.acquire("keras_facenet", None, lambda: require("keras_facenet").FaceNet())
+            except Exception as e:
+                logger.warning("Failed to init FaceNet: %s", e)
+        # face_recognition (dlib) is only imported when it is the backend and the first crops come in
+        self._has_face_recognition = self._handle is None and available("face_recognition")
+        if self._handle is None:
+            if self._has_face_recognition:
                 logger.info("Using face_recognition for driver embeddings")
             else:
                 logger.warning("No face embedding backend available; using fallback histograms")
 
+    @property
+    def face_recognition(self):
+        """The face_recognition module when it is the backend, imported on first use; None otherwise."""
+        if not self._has_face_recognition or self._handle is not None:
+            return None
+        module = optional("face_recognition")
+        if module is None:
+            self._has_face_recognition = False
+        return module
+
+    def close(self):
+        """Release the shared FaceNet model."""
+        if self._handle is not None:
+            self._handle.release()
+            self._handle = None
+
+    @property
+    def model(self):
+        """The shared FaceNet, read through its registry handle on every call; None without one."""
+        return self._handle.model if self._handle is not None else None
+
+    @property
+    def model_id(self) -> str:
+        """Identifies the active embedding backend (used as a cache key)."""
+        if self._handle is not None:
+            return "facenet"
+        return "face_recognition" if self.face_recognition is not None else "histogram"
+
     def embed(self, face_crops):
-        if not face_crops:
-            return np.zeros(512, dtype=np.float32)
+        return self.embed_batch([face_crops])[0]
 
-        if self.model is not None:
-            embs = []
-            for f in face_crops:
-                try:
-                    resized = cv2.resize(f, (128,128))
-                    resized = resized.astype("float32")
-                    resized = np.expand_dims(resized, 0)
-                    emb = self.model.embeddings(resized)[0]
-                    embs.append(emb)
-                except Exception:
-                    continue
-            if not embs:
-                return np.zeros(512, dtype=np.float32)
-            avg = np.mean(embs, axis=0)
-            return (avg / (np.linalg.norm(avg))).astype(np.float32)
+    def embed_batch(self, face_crop_lists):
+        """
+        Embed the face crops of many tracks at once and average them per track.
+        All crops go through the backend together (one FaceNet call for the whole batch);
+        returns an (N, 512) float32 matrix, with a zero row for tracks without usable crops.
+        """
+        out = np.zeros((len(face_crop_lists), 512), dtype=np.float32)
+        crops, owners = [], []
+        for i, face_crops in enumerate(face_crop_lists):
+            for f in face_crops or []:
+                crops.append(f)
+                owners.append(i)
+        if not crops:
+            return out
 
-        if _HAS_FR:
-            embs = []
-            for f in face_crops:
+        with active_metrics().timer("backend_seconds", component="driver_embedder", backend=self.model_id):
+            if self._handle is not None:
+                embs, kept = self._facenet_embeddings(crops)
+            elif self.face_recognition is not None:
+                embs, kept = self._face_recognition_embeddings(crops)
+            else:
+                embs, kept = self._histogram_embeddings(crops)
+        if not kept:
+            return out
+
+        owners = np.asarray(owners)[kept]
+        sums = np.zeros((len(face_crop_lists), embs.shape[1]), dtype=np.float64)
+        np.add.at(sums, owners, embs)
+        counts = np.bincount(owners, minlength=len(face_crop_lists))
+        has = counts > 0
+        avg = sums[has] / counts[has, None]
+        # pad 128-d face_recognition / short histogram vectors to 512
+        out[has, :avg.shape[1]] = avg / np.linalg.norm(avg, axis=1, keepdims=True)
+        return out
+
+    def _facenet_embeddings(self, crops):
+        kept = [k for k, f in enumerate(crops) if f is not None and f.ndim == 3 and f.shape[2] == 3 and f.size > 0]
+        if not kept:
+            return None, []
+        # own lock for the preprocessing buffer, registry lock for the shared Keras model
+        with self._lock, self._handle.lock:
+            model = self.model
+            try:
+                batch = self.preprocess([crops[k] for k in kept])
+                return np.asarray(model.embeddings(batch)), kept
+            except Exception as e:
+                logger.warning("Batched FaceNet call failed (%s); embedding %d crops one at a time", e, len(kept))
+            # one crop at a time, dropping only the crops that fail
+            embs, ok = [], []
+            for k in kept:
                 try:
-                    rgb = cv2.cvtColor(f, cv2.COLOR_BGR2RGB)
-                    enc = face_recognition.face_encodings(rgb)
-                    if len(enc):
-                        embs.append(enc[0])
+                    embs.append(np.asarray(model.embeddings(self.preprocess([crops[k]])))[0])
+                    ok.append(k)
                 except Exception:
                     continue
-            if not embs:
-                return np.zeros(512, dtype=np.float32)
-            avg = np.mean(embs, axis=0)
-            # pad 128->512
-            if avg.shape[0] == 128:
-                padded = np.zeros(512, dtype=np.float32)
-                padded[:128] = avg
-                avg = padded
-            return (avg / (np.linalg.norm(avg))).astype(np.float32)
+        return (np.asarray(embs) if embs else None), ok
+
+    def _face_recognition_embeddings(self, crops):
+        # face_recognition has no batched encoder; crops are encoded one by one
+        embs, kept = [], []
+        for k, f in enumerate(crops):
+            try:
+                rgb = cv2.cvtColor(f, cv2.COLOR_BGR2RGB)
+                enc = self.face_recognition.face_encodings(rgb)
+                if len(enc):
+                    embs.append(enc[0])
+                    kept.append(k)
+            except Exception:
+                continue
+        return (np.asarray(embs) if embs else None), kept
 
+    @staticmethod
+    def _histogram_embeddings(crops):
         # fallback: basic histogram
-        hist = []
-        for f in face_crops:
+        hist, kept = [], []
+        for k, f in enumerate(crops):
             try:
                 hsv = cv2.cvtColor(f, cv2.COLOR_BGR2HSV)
-                h = cv2.calcHist([hsv], [0,1,2], None, [8,8,8], [0,180,0,256,0,256]).flatten()
-                hist.append(h)
+                hist.append(cv2.calcHist([hsv], [0,1,2], None, [8,8,8], [0,180,0,256,0,256]).flatten())
+                kept.append(k)
             except Exception:
                 continue
-        if not hist:
-            return np.zeros(512, dtype=np.float32)
-        avg = np.mean(hist, axis=0)
-        # resize/pad to 512
-        if avg.size < 512:
-            padded = np.zeros(512, dtype=np.float32)
-            padded[:avg.size] = avg
-            avg = padded
-        avg = avg.astype(np.float32)
-        return (avg / (np.linalg.norm(avg))).astype(np.float32)
\ No newline at end of file
+        return (np.asarray(hist) if hist else None), kept
@@ -0,0 +1,65 @@
+# src/embeddings/preprocessing.py
+import numpy as np
+import cv2
+from typing import TYPE_CHECKING
+
+if TYPE_CHECKING:
+    import torch
+
+IMAGENET_MEAN = (0.485, 0.456, 0.406)
+IMAGENET_STD = (0.229, 0.224, 0.225)
+
+
+class BatchPreprocessor:
+    """
+    Resize a batch of BGR crops into a reusable float32 buffer and normalize it in place:
+    x = (pixel / 255 - mean) / std, per channel.
+
+    size is (height, width). layout "NCHW" (torch models) or "NHWC" (Keras models).
+    mean/std=None leaves raw 0..255 pixel values. The buffer only grows, so a call returns
+    a view that is overwritten by the next call - consume (or copy) it before calling again.
+    """
+
+    def __init__(self, size=(224, 224), mean=IMAGENET_MEAN, std=IMAGENET_STD, to_rgb=True, layout="NCHW"):
+        if layout not in ("NCHW", "NHWC"):
+            raise ValueError(f"Unknown layout: {layout}")
+        self.size = (int(size[0]), int(size[1]))
+        self.to_rgb = to_rgb
+        self.layout = layout
+        self.normalize = mean is not None and std is not None
+        shape = (1, 3, 1, 1) if layout == "NCHW" else (1, 1, 1, 3)
+        if self.normalize:
+            std = np.asarray(std, dtype=np.float32)
+            # (x / 255 - mean) / std == x * scale - shift
+            self._scale = (1.0 / (255.0 * std)).reshape(shape)
+            self._shift = (np.asarray(mean, dtype=np.float32) / std).reshape(shape)
+        self._buffer = np.empty((0,) + self._item_shape(), dtype=np.float32)
+
+    def _item_shape(self):
+        h, w = self.size
+        return (3, h, w) if self.layout == "NCHW" else (h, w, 3)
+
+    def _reserve(self, n: int) -> np.ndarray:
+        if n > len(self._buffer):
+            self._buffer = np.empty((max(n, 2 * len(self._buffer)),) + self._item_shape(), dtype=np.float32)
+        return self._buffer[:n]
+
+    def __call__(self, crops) -> np.ndarray:
+        """(N, 3, H, W) or (N, H, W, 3) float32 view of the internal buffer."""
+        h, w = self.size
+        batch = self._reserve(len(crops))
+        for j, crop in enumerate(crops):
+            img = cv2.resize(crop, (w, h))
+            if self.to_rgb:
+                img = img[:, :, ::-1]
+            # uint8 -> float32 cast straight into the buffer slot
+            batch[j] = img.transpose(2, 0, 1) if self.layout == "NCHW" else img
+        if self.normalize:
+            np.multiply(batch, self._scale, out=batch)
+            np.subtract(batch, self._shift, out=batch)
+        return batch
+
+    def tensor(self, crops) -> "torch.Tensor":
+        """Same as __call__, as a CPU tensor sharing the buffer's memory (no copy)."""
+        import torch
+        return torch.from_numpy(self(crops))
@@ -1,17 +1,22 @@
 # src/embeddings/vehicle_embedder.py
+import os
 import numpy as np
 import cv2
 import logging
-import torch
+import threading
+from utils.logging import active_metrics
+from utils.backends import available, require
+from utils.model_registry import MODELS, file_digest, weights_version
+from embeddings.preprocessing import BatchPreprocessor
 
 logger = logging.getLogger(__name__)
 
-# Try to import a reid loader if available. If not, fallback to color-histogram.
-try:
-    from reid_model.load_reid_model import load_model_from_opts
-    _HAS_REID = True
-except Exception:
-    _HAS_REID = False
+# Use the reid loader if its backends are installed. If not, fallback to color-histogram.
+# torch / torchvision / timm are imported only when a model is actually loaded.
+_HAS_REID = all(available(m) for m in ("torch", "torchvision", "timm", "yaml"))
+
+# exported (TorchScript / ONNX) ReID models, see reid_model/export.py
+_HAS_REID_RUNTIME = available("torch") or available("onnxruntime")
 
 class VehicleEmbedder:
     """
@@ -19,35 +24,115 @@ class VehicleEmbedder:
     compute a color histogram based descriptor (normalized) of size 512.
     """
 
-    def __init__(self, reid_opts=None, reid_ckpt=None, device='cuda'):
+    def __init__(self, reid_opts=None, reid_ckpt=None, device='cuda', reid_artifact=None, input_size=(224, 224)):
         self.device = device
-        self.model = None
-        if _HAS_REID and reid_opts and reid_ckpt:
+        self.reid_opts = reid_opts
+        self.reid_ckpt = reid_ckpt
+        self.reid_artifact = reid_artifact
+        # resize + ImageNet normalization into a reused (N,3,H,W) buffer; input_size is (height, width)
+        self.preprocess = BatchPreprocessor(size=input_size)
+        self._lock = threading.Lock()
+        # ReID models are shared by all embedders of the process (model registry) and read
+        # through the handle on every call; torch eval modules and ORT sessions are safe to
+        # call concurrently, so no model lock is taken
+        self._handle = None
+        # the handle holds a runner for an exported artifact: preprocessed batch (N,3,H,W) -> features (N,D)
+        self._artifact = False
+        if reid_artifact and _HAS_REID_RUNTIME:
+            try:
+                from reid_model.runtime import load_runner
+                self._handle = MODELS.acquire("reid_artifact", reid_artifact, lambda: load_runner(reid_artifact))
+                self._artifact = True
+            except Exception as e:
+                logger.warning("Failed to load ReID artifact %s: %s", reid_artifact, e)
+        if self._handle is None and _HAS_REID and reid_opts and reid_ckpt:
             try:
-                logger.info("Loading vehicle ReID model")
-                self.model = load_model_from_opts(reid_opts, ckpt=reid_ckpt, remove_classifier=True)
-                self.model.eval()
+                # architecture only + checkpoint (memory-mapped)
+                from reid_model.load_reid_model import load_inference_model
+                self._handle = MODELS.acquire("reid", reid_ckpt, lambda: load_inference_model(reid_opts, reid_ckpt),
+                                              opts=os.path.abspath(reid_opts), opts_mtime=os.path.getmtime(reid_opts))
             except Exception as e:
                 logger.warning("Failed to init ReID model: %s", e)
-                self.model = None
+
+    def close(self):
+        """Release the shared ReID model."""
+        if self._handle is not None:
+            self._handle.release()
+            self._handle = None
+            self._artifact = False
+
+    @property
+    def model(self):
+        """The shared ReID model or artifact runner, read through its registry handle; None without one."""
+        return self._handle.model if self._handle is not None else None
+
+    @property
+    def runner(self):
+        """The artifact runner, if an exported artifact is loaded."""
+        return self.model if self._artifact else None
+
+    @property
+    def model_id(self) -> str:
+        """
+        Identifies the active embedding backend (used as a cache key): the artifact, or the
+        checkpoint plus a hash of the opts file, and the input size; "histogram" without a model.
+        """
+        h, w = self.preprocess.size
+        if self._artifact:
+            return f"reid:{weights_version(self.reid_artifact)}@{h}x{w}"
+        if self._handle is not None:
+            return f"reid:{weights_version(self.reid_ckpt)}:opts={file_digest(self.reid_opts)}@{h}x{w}"
+        return "histogram"
 
     def embed(self, vehicle_crop):
         if vehicle_crop is None or vehicle_crop.size == 0:
             return np.zeros(512, dtype=np.float32)
+        return self.embed_batch([vehicle_crop])[0]
+
+    def embed_batch(self, crops):
+        """
+        Embed a list of vehicle crops with a single forward pass.
+        Returns an (N, D) float32 matrix, one normalized row per crop.
+        Empty/None crops get a zero row.
+        """
+        return self.embed_batch_with_id(crops)[0]
+
+    def embed_batch_with_id(self, crops):
+        """
+        embed_batch, plus the model_id of the backend that produced the rows: "histogram" when
+        the ReID model failed on this batch, so fallback rows are never cached as ReID output.
+        """
+        if not crops:
+            return np.zeros((0, 512), dtype=np.float32), self.model_id
 
-        if self.model is not None:
+        valid = [i for i, c in enumerate(crops) if c is not None and c.size > 0]
+
+        if self._handle is not None and valid:
             try:
-                img = cv2.cvtColor(vehicle_crop, cv2.COLOR_BGR2RGB)
-                img = cv2.resize(img, (224,224))
-                img = img.transpose(2,0,1).astype("float32")
-                tensor = torch.from_numpy(img).unsqueeze(0)
-                with torch.no_grad():
-                    out = self.model(tensor).cpu().numpy()[0]
-                out = out.astype(np.float32)
-                return out / (np.linalg.norm(out))
+                model = self.model
+                # the preprocessing buffer is shared, so one batch at a time
+                with self._lock, active_metrics().timer("backend_seconds", component="vehicle_embedder", backend=model.name if self._artifact else "reid"):
+                    batch = self.preprocess([crops[i] for i in valid])
+                    if self._artifact:
+                        out = model(batch)
+                    else:
+                        torch = require("torch")
+                        with torch.no_grad():
+                            out = model(torch.from_numpy(batch)).cpu().numpy().astype(np.float32)
+                out = out / (np.linalg.norm(out, axis=1, keepdims=True))
+                embs = np.zeros((len(crops), out.shape[1]), dtype=np.float32)
+                embs[valid] = out
+                return embs, self.model_id
             except Exception:
                 logger.exception("ReID model failed; falling back to histogram")
 
+        embs = np.zeros((len(crops), 512), dtype=np.float32)
+        with active_metrics().timer("backend_seconds", component="vehicle_embedder", backend="histogram"):
+            for i in valid:
+                embs[i] = self._histogram_embedding(crops[i])
+        return embs, "histogram"
+
+    def _histogram_embedding(self, vehicle_crop):
         # Fallback histogram: multichannel concatenated histograms (size adjustable -> 512)
         try:
             hsv = cv2.cvtColor(vehicle_crop, cv2.COLOR_BGR2HSV)
@@ -63,4 +148,4 @@ class VehicleEmbedder:
             hist = hist / (np.linalg.norm(hist) + 1e-8)
             return hist
         except Exception:
-            return np.zeros(512, dtype=np.float32)
\ No newline at end of file
+            return np.zeros(512, dtype=np.float32)
@@ -0,0 +1,43 @@
+# src/index/base.py
+"""
+Common interface for embedding indexes over L2-normalized vectors.
+Scores are inner products, i.e. cosine similarity for normalized inputs.
+"""
+from typing import Iterable, Tuple
+import numpy as np
+
+
+class EmbeddingIndex:
+    """
+    Base class for embedding indexes keyed by integer ids.
+
+    search() returns (scores, ids), both shaped (Q, k) and sorted by descending score.
+    Slots without a result hold score -inf and id -1.
+    """
+
+    def __init__(self, dim: int):
+        self.dim = dim
+
+    def __len__(self) -> int:
+        raise NotImplementedError
+
+    def add(self, ids: Iterable[int], vectors: np.ndarray):
+        raise NotImplementedError
+
+    def remove(self, ids: Iterable[int]):
+        raise NotImplementedError
+
+    def search(self, queries: np.ndarray, k: int = 1) -> Tuple[np.ndarray, np.ndarray]:
+        raise NotImplementedError
+
+    def _as_matrix(self, vectors: np.ndarray) -> np.ndarray:
+        vectors = np.asarray(vectors, dtype=np.float32)
+        if vectors.ndim == 1:
+            vectors = vectors[None, :]
+        if vectors.shape[1] != self.dim:
+            raise ValueError(f"{type(self).__name__}: expected dim {self.dim}, got {vectors.shape[1]}")
+        return vectors
+
+    @staticmethod
+    def _empty_result(n_queries: int, k: int) -> Tuple[np.ndarray, np.ndarray]:
+        return np.full((n_queries, k), -np.inf, dtype=np.float32), np.full((n_queries, k), -1, dtype=np.int64)
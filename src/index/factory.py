@@ -0,0 +1,18 @@
+# src/index/factory.py
+from .base import EmbeddingIndex
+from .flat import FlatIndex
+from .ivf import IVFIndex
+
+INDEX_BACKENDS = ("flat", "ivf", "faiss_flat", "faiss_ivf")
+
+
+def create_index(backend: str = "flat", dim: int = 512, **kwargs) -> EmbeddingIndex:
+    """Creates an embedding index for the given backend name."""
+    if backend == "flat":
+        return FlatIndex(dim, **kwargs)
+    if backend == "ivf":
+        return IVFIndex(dim, **kwargs)
+    if backend in ("faiss_flat", "faiss_ivf"):
+        from .faiss_index import FaissIndex
+        return FaissIndex(dim, kind=backend.split("_", 1)[1], **kwargs)
+    raise ValueError(f"Unknown index backend: {backend}, choose from: {list(INDEX_BACKENDS)}")
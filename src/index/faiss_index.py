@@ -0,0 +1,79 @@
+# src/index/faiss_index.py
+"""
+Optional faiss-backed index (pip install faiss-cpu); faiss is imported when an index is built.
+"""
+from typing import Iterable, Tuple
+import numpy as np
+from utils.backends import require
+from .base import EmbeddingIndex
+
+
+class FaissIndex(EmbeddingIndex):
+    """
+    kind="flat" wraps IndexFlatIP (exact); kind="ivf" wraps IndexIVFFlat, which is
+    trained once min_train vectors have been added (vectors are buffered until then).
+    """
+
+    def __init__(self, dim: int, kind: str = "flat", nlist: int = 64, nprobe: int = 8, min_train: int = 1024):
+        faiss = require("faiss")
+        super().__init__(dim)
+        self.kind = kind
+        self.min_train = max(min_train, nlist)
+        if kind == "flat":
+            self.index = faiss.IndexIDMap2(faiss.IndexFlatIP(dim))
+        elif kind == "ivf":
+            self._quantizer = faiss.IndexFlatIP(dim)
+            self.index = faiss.IndexIVFFlat(self._quantizer, dim, nlist, faiss.METRIC_INNER_PRODUCT)
+            self.index.nprobe = nprobe
+        else:
+            raise ValueError(f"Unknown faiss index kind: {kind}, choose from: ['flat', 'ivf']")
+        self._buffer_ids = []
+        self._buffer_vecs = []
+
+    def __len__(self) -> int:
+        return int(self.index.ntotal) + len(self._buffer_ids)
+
+    def add(self, ids: Iterable[int], vectors: np.ndarray):
+        vectors = np.ascontiguousarray(self._as_matrix(vectors))
+        ids = np.asarray([int(i) for i in ids], dtype=np.int64)
+        self.remove(ids)
+        if self.index.is_trained:
+            self.index.add_with_ids(vectors, ids)
+            return
+        self._buffer_ids.extend(ids.tolist())
+        self._buffer_vecs.extend(vectors)
+        if len(self._buffer_ids) >= self.min_train:
+            buf = np.ascontiguousarray(np.stack(self._buffer_vecs))
+            self.index.train(buf)
+            self.index.add_with_ids(buf, np.asarray(self._buffer_ids, dtype=np.int64))
+            self._buffer_ids, self._buffer_vecs = [], []
+
+    def remove(self, ids: Iterable[int]):
+        ids = [int(i) for i in ids]
+        if not ids:
+            return
+        if self.index.ntotal:
+            self.index.remove_ids(np.asarray(ids, dtype=np.int64))
+        if self._buffer_ids:
+            drop = set(ids)
+            kept = [(i, v) for i, v in zip(self._buffer_ids, self._buffer_vecs) if i not in drop]
+            self._buffer_ids = [i for i, _ in kept]
+            self._buffer_vecs = [v for _, v in kept]
+
+    def search(self, queries: np.ndarray, k: int = 1) -> Tuple[np.ndarray, np.ndarray]:
+        queries = np.ascontiguousarray(self._as_matrix(queries))
+        if not self.index.is_trained:
+            # untrained IVF: exact scan over the buffered vectors
+            out_scores, out_ids = self._empty_result(queries.shape[0], k)
+            if not self._buffer_ids:
+                return out_scores, out_ids
+            scores = queries @ np.stack(self._buffer_vecs).T
+            kk = min(k, scores.shape[1])
+            order = np.argsort(-scores, axis=1, kind="stable")[:, :kk]
+            out_scores[:, :kk] = np.take_along_axis(scores, order, axis=1)
+            out_ids[:, :kk] = np.asarray(self._buffer_ids, dtype=np.int64)[order]
+            return out_scores, out_ids
+        scores, ids = self.index.search(queries, k)
+        scores = scores.astype(np.float32)
+        scores[ids < 0] = -np.inf
+        return scores, ids.astype(np.int64)
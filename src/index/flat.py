@@ -0,0 +1,99 @@
+# src/index/flat.py
+"""
+Exact inner-product index: one GEMM against every stored vector.
+"""
+from typing import Dict, Iterable, Tuple
+import numpy as np
+from .base import EmbeddingIndex
+
+
+def top_k(scores: np.ndarray, k: int) -> np.ndarray:
+    """
+    Column indices of the k best scores per row, sorted by descending score.
+    Ties keep the lower column first.
+    """
+    n = scores.shape[1]
+    if k < n:
+        part = np.argpartition(-scores, k - 1, axis=1)[:, :k]
+        part.sort(axis=1)
+    else:
+        part = np.tile(np.arange(n), (scores.shape[0], 1))
+    order = np.argsort(-np.take_along_axis(scores, part, axis=1), axis=1, kind="stable")
+    return np.take_along_axis(part, order, axis=1)
+
+
+class FlatIndex(EmbeddingIndex):
+    """
+    Vectors are kept in one preallocated (capacity, D) matrix; removal moves the
+    last row into the freed slot so the live rows stay contiguous.
+    """
+
+    def __init__(self, dim: int, capacity: int = 256):
+        super().__init__(dim)
+        self._capacity = max(1, capacity)
+        self._vectors = np.zeros((self._capacity, dim), dtype=np.float32)
+        self._ids = np.zeros(self._capacity, dtype=np.int64)
+        self._rows: Dict[int, int] = {}
+
+    def __len__(self) -> int:
+        return len(self._rows)
+
+    def __contains__(self, id_: int) -> bool:
+        return int(id_) in self._rows
+
+    def _reserve(self, n: int):
+        if n <= self._capacity:
+            return
+        while self._capacity < n:
+            self._capacity *= 2
+        vectors = np.zeros((self._capacity, self.dim), dtype=np.float32)
+        ids = np.zeros(self._capacity, dtype=np.int64)
+        size = len(self._rows)
+        vectors[:size] = self._vectors[:size]
+        ids[:size] = self._ids[:size]
+        self._vectors, self._ids = vectors, ids
+
+    def add(self, ids: Iterable[int], vectors: np.ndarray):
+        vectors = self._as_matrix(vectors)
+        ids = [int(i) for i in ids]
+        if len(ids) != vectors.shape[0]:
+            raise ValueError("FlatIndex.add: ids and vectors length mismatch")
+        self._reserve(len(self._rows) + len(ids))
+        for id_, vec in zip(ids, vectors):
+            row = self._rows.get(id_)
+            if row is None:
+                row = len(self._rows)
+                self._rows[id_] = row
+                self._ids[row] = id_
+            self._vectors[row] = vec
+
+    def remove(self, ids: Iterable[int]):
+        for id_ in ids:
+            row = self._rows.pop(int(id_), None)
+            if row is None:
+                continue
+            last = len(self._rows)
+            if row != last:
+                moved = int(self._ids[last])
+                self._vectors[row] = self._vectors[last]
+                self._ids[row] = moved
+                self._rows[moved] = row
+
+    def vectors(self) -> Tuple[np.ndarray, np.ndarray]:
+        """(ids, vectors) views of the live rows."""
+        size = len(self._rows)
+        return self._ids[:size], self._vectors[:size]
+
+    def search(self, queries: np.ndarray, k: int = 1) -> Tuple[np.ndarray, np.ndarray]:
+        queries = self._as_matrix(queries)
+        out_scores, out_ids = self._empty_result(queries.shape[0], k)
+        size = len(self._rows)
+        if size == 0:
+            return out_scores, out_ids
+
+        scores = queries @ self._vectors[:size].T
+        cols = top_k(scores, min(k, size))
+        kk = cols.shape[1]
+        out_scores[:, :kk] = np.take_along_axis(scores, cols, axis=1)
+        out_ids[:, :kk] = self._ids[cols]
+        return out_scores, out_ids
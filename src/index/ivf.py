@@ -0,0 +1,112 @@
+# src/index/ivf.py
+"""
+Approximate inverted-file (IVF) index in NumPy.
+
+Vectors are partitioned into nlist cells by a spherical k-means quantizer; a query
+scans only the nprobe cells whose centroids score highest. Until min_train vectors
+have been added the index behaves as an exact flat index.
+"""
+from typing import Dict, Iterable, List, Tuple
+import numpy as np
+from .base import EmbeddingIndex
+from .flat import FlatIndex
+
+
+def spherical_kmeans(vectors: np.ndarray, k: int, n_iter: int = 10, seed: int = 0) -> np.ndarray:
+    """Cosine k-means; returns (k, D) normalized centroids."""
+    rng = np.random.default_rng(seed)
+    k = min(k, vectors.shape[0])
+    centroids = vectors[rng.choice(vectors.shape[0], size=k, replace=False)].copy()
+    for _ in range(n_iter):
+        assign = np.argmax(vectors @ centroids.T, axis=1)
+        sums = np.zeros_like(centroids)
+        np.add.at(sums, assign, vectors)
+        counts = np.bincount(assign, minlength=k)
+        empty = counts == 0
+        # re-seed empty cells with random points so every cell stays usable
+        if empty.any():
+            sums[empty] = vectors[rng.choice(vectors.shape[0], size=int(empty.sum()))]
+        norms = np.linalg.norm(sums, axis=1, keepdims=True)
+        centroids = sums / np.maximum(norms, 1e-12)
+    return centroids.astype(np.float32)
+
+
+class IVFIndex(EmbeddingIndex):
+
+    def __init__(self, dim: int, nlist: int = 64, nprobe: int = 8, min_train: int = 1024, seed: int = 0):
+        super().__init__(dim)
+        self.nlist = nlist
+        self.nprobe = nprobe
+        self.min_train = max(min_train, nlist)
+        self.seed = seed
+        self.centroids: np.ndarray = None
+        self._lists: List[FlatIndex] = []
+        self._pending = FlatIndex(dim)
+        self._cell: Dict[int, int] = {}
+
+    @property
+    def is_trained(self) -> bool:
+        return self.centroids is not None
+
+    def __len__(self) -> int:
+        return len(self._pending) + len(self._cell)
+
+    def train(self, vectors: np.ndarray):
+        self.centroids = spherical_kmeans(self._as_matrix(vectors), self.nlist, seed=self.seed)
+        self._lists = [FlatIndex(self.dim, capacity=64) for _ in range(self.centroids.shape[0])]
+
+    def add(self, ids: Iterable[int], vectors: np.ndarray):
+        vectors = self._as_matrix(vectors)
+        ids = [int(i) for i in ids]
+        if not self.is_trained:
+            self._pending.add(ids, vectors)
+            if len(self._pending) >= self.min_train:
+                pending_ids, pending_vecs = self._pending.vectors()
+                pending_ids, pending_vecs = pending_ids.copy(), pending_vecs.copy()
+                self.train(pending_vecs)
+                self._pending = FlatIndex(self.dim)
+                self._add_to_lists(pending_ids, pending_vecs)
+            return
+        self.remove([i for i in ids if i in self._cell])
+        self._add_to_lists(ids, vectors)
+
+    def _add_to_lists(self, ids, vectors: np.ndarray):
+        cells = np.argmax(vectors @ self.centroids.T, axis=1)
+        for cell in np.unique(cells):
+            sel = np.nonzero(cells == cell)[0]
+            cell_ids = [int(ids[i]) for i in sel]
+            self._lists[cell].add(cell_ids, vectors[sel])
+            for id_ in cell_ids:
+                self._cell[id_] = int(cell)
+
+    def remove(self, ids: Iterable[int]):
+        for id_ in ids:
+            id_ = int(id_)
+            cell = self._cell.pop(id_, None)
+            if cell is not None:
+                self._lists[cell].remove([id_])
+            else:
+                self._pending.remove([id_])
+
+    def search(self, queries: np.ndarray, k: int = 1) -> Tuple[np.ndarray, np.ndarray]:
+        queries = self._as_matrix(queries)
+        if not self.is_trained:
+            return self._pending.search(queries, k)
+
+        n_queries = queries.shape[0]
+        nprobe = min(self.nprobe, self.centroids.shape[0])
+        probes = np.argsort(-(queries @ self.centroids.T), axis=1)[:, :nprobe]
+
+        # one GEMM per probed cell over all queries probing it; slot p*k..(p+1)*k holds probe p
+        cand_scores, cand_ids = self._empty_result(n_queries, nprobe * k)
+        for cell in np.unique(probes):
+            q_idx, p_idx = np.nonzero(probes == cell)
+            if not len(self._lists[cell]):
+                continue
+            s, i = self._lists[cell].search(queries[q_idx], k)
+            cols = p_idx[:, None] * k + np.arange(k)[None, :]
+            cand_scores[q_idx[:, None], cols] = s
+            cand_ids[q_idx[:, None], cols] = i
+
+        order = np.argsort(-cand_scores, axis=1, kind="stable")[:, :k]
+        return np.take_along_axis(cand_scores, order, axis=1), np.take_along_axis(cand_ids, order, axis=1)
@@ -1,27 +1,104 @@
 # src/io/frame_loader.py
 import os
+import time
 import cv2
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
 from typing import Iterator, Tuple
 import logging
 
 logger = logging.getLogger(__name__)
 
+# reduce factor -> imread flag (decoder downscales while decoding JPEGs)
+_IMREAD_FLAGS = {
+    1: cv2.IMREAD_COLOR,
+    2: cv2.IMREAD_REDUCED_COLOR_2,
+    4: cv2.IMREAD_REDUCED_COLOR_4,
+    8: cv2.IMREAD_REDUCED_COLOR_8,
+}
+
 class FrameLoader:
     """
     Iterates over image files in a directory (jpg, png, jpeg), returning (path, frame).
+
+    With prefetch > 0 the next `prefetch` frames are decoded ahead in a thread pool
+    (cv2.imread releases the GIL) and still yielded in sorted order.
+    reduce=2/4/8 decodes at 1/2, 1/4, 1/8 resolution.
+    Decode timings are collected in self.metrics.
+    The files are taken as consecutive frames at fps frames per second: the timestamp of
+    the i-th file (see iter_with_timestamps) is i / fps, or i without fps.
     """
 
-    def __init__(self, path: str):
+    def __init__(self, path: str, prefetch: int = 0, num_workers: int = 4, reduce: int = 1, fps: float = None):
         self.path = path
         if not os.path.exists(path):
             raise FileNotFoundError(f"FrameLoader: directory not found: {path}")
+        if reduce not in _IMREAD_FLAGS:
+            raise ValueError(f"FrameLoader: reduce must be one of {sorted(_IMREAD_FLAGS)}, got {reduce}")
         self.files = sorted([f for f in os.listdir(path) if f.lower().endswith(('.jpg', '.jpeg', '.png'))])
+        self.prefetch = max(0, prefetch)
+        self.num_workers = max(1, num_workers)
+        self.imread_flag = _IMREAD_FLAGS[reduce]
+        self.fps = fps
+        self.metrics = {
+            'frames_decoded': 0,
+            'decode_failures': 0,
+            'decode_time_total': 0.0,
+            'decode_time_mean': 0.0,
+            'wait_time_total': 0.0
+        }
+
+    def __len__(self):
+        return len(self.files)
+
+    def _read(self, full: str):
+        t0 = time.perf_counter()
+        frame = cv2.imread(full, self.imread_flag)
+        return frame, time.perf_counter() - t0
+
+    def _record(self, full: str, frame, decode_time: float) -> bool:
+        self.metrics['decode_time_total'] += decode_time
+        if frame is None:
+            self.metrics['decode_failures'] += 1
+            logger.warning("Failed to read frame: %s", full)
+            return False
+        self.metrics['frames_decoded'] += 1
+        self.metrics['decode_time_mean'] = self.metrics['decode_time_total'] / self.metrics['frames_decoded']
+        return True
+
+    def iter_with_timestamps(self) -> Iterator[Tuple[str, any, float]]:
+        """Yields (path, frame, timestamp_seconds), like VideoLoader.iter_with_timestamps."""
+        index = {os.path.join(self.path, f): i for i, f in enumerate(self.files)}
+        for full, frame in self:
+            yield full, frame, index[full] / self.fps if self.fps else float(index[full])
 
     def __iter__(self) -> Iterator[Tuple[str, any]]:
-        for f in self.files:
-            full = os.path.join(self.path, f)
-            frame = cv2.imread(full)
-            if frame is None:
-                logger.warning("Failed to read frame: %s", full)
-                continue
-            yield full, frame
\ No newline at end of file
+        paths = [os.path.join(self.path, f) for f in self.files]
+        if self.prefetch == 0:
+            for full in paths:
+                frame, dt = self._read(full)
+                if self._record(full, frame, dt):
+                    yield full, frame
+            return
+
+        with ThreadPoolExecutor(max_workers=self.num_workers, thread_name_prefix="frame-decode") as pool:
+            pending = deque()
+            it = iter(paths)
+            for full in it:
+                pending.append((full, pool.submit(self._read, full)))
+                if len(pending) >= self.prefetch:
+                    break
+            try:
+                while pending:
+                    full, fut = pending.popleft()
+                    t0 = time.perf_counter()
+                    frame, dt = fut.result()
+                    self.metrics['wait_time_total'] += time.perf_counter() - t0
+                    nxt = next(it, None)
+                    if nxt is not None:
+                        pending.append((nxt, pool.submit(self._read, nxt)))
+                    if self._record(full, frame, dt):
+                        yield full, frame
+            finally:
+                for _, fut in pending:
+                    fut.cancel()
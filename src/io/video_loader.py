@@ -0,0 +1,112 @@
+# src/io/video_loader.py
+import os
+import time
+import queue
+import threading
+import logging
+import cv2
+from typing import Iterator, Tuple
+
+logger = logging.getLogger(__name__)
+
+VIDEO_EXTENSIONS = ('.mp4', '.avi', '.mov', '.mkv', '.m4v', '.mpg', '.mpeg', '.ts', '.webm')
+
+# queue markers used by the decode thread
+_END = object()
+
+
+class VideoLoader:
+    """
+    Iterates over frames of a video file or stream (anything cv2.VideoCapture opens,
+    e.g. rtsp:// URLs or camera indices), returning (frame_id, frame) like FrameLoader.
+
+    Frames are decoded on a background thread into a bounded queue. Use stride to keep
+    every n-th frame, or target_fps to subsample by timestamp; skipped frames are only
+    grabbed, not decoded. frame_id is "<source>#<frame index>".
+    The timestamp (seconds) of the last yielded frame is available as last_timestamp:
+    the container position for files, wall-clock capture time for live streams.
+    """
+
+    def __init__(self, source, stride: int = 1, target_fps: float = None, queue_size: int = 32):
+        self.source = source
+        self.is_stream = not (isinstance(source, str) and os.path.isfile(source))
+        if isinstance(source, str) and self.is_stream and "://" not in source:
+            raise FileNotFoundError(f"VideoLoader: video not found: {source}")
+        self.stride = max(1, int(stride))
+        self.target_fps = target_fps
+        self.queue_size = max(1, queue_size)
+        self.last_timestamp = None
+        self.fps = None
+
+    @staticmethod
+    def is_video_source(path) -> bool:
+        if not isinstance(path, str):
+            return True
+        return "://" in path or path.lower().endswith(VIDEO_EXTENSIONS)
+
+    def __iter__(self) -> Iterator[Tuple[str, any]]:
+        for frame_id, frame, ts in self.iter_with_timestamps():
+            self.last_timestamp = ts
+            yield frame_id, frame
+
+    def iter_with_timestamps(self) -> Iterator[Tuple[str, any, float]]:
+        """Yields (frame_id, frame, timestamp_seconds)."""
+        frames = queue.Queue(maxsize=self.queue_size)
+        stop = threading.Event()
+        worker = threading.Thread(target=self._decode, args=(frames, stop), daemon=True)
+        worker.start()
+        try:
+            while True:
+                item = frames.get()
+                if item is _END:
+                    break
+                if isinstance(item, Exception):
+                    raise item
+                yield item
+        finally:
+            stop.set()
+            # unblock the decode thread if it is waiting on a full queue
+            while worker.is_alive():
+                try:
+                    frames.get_nowait()
+                except queue.Empty:
+                    worker.join(timeout=0.05)
+
+    def _decode(self, frames: queue.Queue, stop: threading.Event):
+        cap = cv2.VideoCapture(self.source)
+        try:
+            if not cap.isOpened():
+                raise IOError(f"VideoLoader: could not open video source: {self.source}")
+            self.fps = cap.get(cv2.CAP_PROP_FPS) or None
+            min_interval = 1.0 / self.target_fps if self.target_fps else 0.0
+            last_kept = None
+            index = -1
+            while not stop.is_set():
+                if not cap.grab():
+                    break
+                index += 1
+                if index % self.stride:
+                    continue
+                ts = time.time() if self.is_stream else cap.get(cv2.CAP_PROP_POS_MSEC) / 1000.0
+                if last_kept is not None and ts - last_kept < min_interval - 1e-6:
+                    continue
+                ok, frame = cap.retrieve()
+                if not ok or frame is None:
+                    logger.warning("Failed to decode frame %d of %s", index, self.source)
+                    continue
+                last_kept = ts
+                self._put(frames, stop, (f"{self.source}#{index:06d}", frame, ts))
+        except Exception as e:
+            self._put(frames, stop, e)
+        finally:
+            cap.release()
+            self._put(frames, stop, _END)
+
+    @staticmethod
+    def _put(frames: queue.Queue, stop: threading.Event, item):
+        while not stop.is_set():
+            try:
+                frames.put(item, timeout=0.1)
+                return
+            except queue.Full:
+                continue
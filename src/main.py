@@ -14,16 +14,38 @@ def main():
     parser.add_argument("--entry", default="data/entry_frames", help="Directory with entry frames")
     parser.add_argument("--exit", default="data/exit_frames", help="Directory with exit frames")
     parser.add_argument("--output", default="data/outputs", help="Output directory")
+    parser.add_argument("--stream", action="store_true", help="Process entry/exit concurrently and emit results as exits finalize")
+    parser.add_argument("--parallel", action="store_true", help="Run entry and exit camera pipelines in separate worker processes")
+    parser.add_argument("--cache-dir", default=None, help="Directory for the persistent detection/embedding cache")
+    parser.add_argument("--export-dump", default=None, help="Save snapshot embeddings to this .npz for threshold sweeps (python -m core.replay)")
+    parser.add_argument("--face-strategy", default="regions", choices=["regions", "single_pass"], help="Driver face search strategy")
+    parser.add_argument("--frame-faces", action="store_true", help="Batch the YOLO face passes of all vehicles of a frame "
+                        "(same faces as per-vehicle detection)")
+    parser.add_argument("--best-snapshots", type=int, default=0, metavar="K", help="Keep the K best-quality snapshots per track instead of the first")
+    parser.add_argument("--metrics", default=None, help="Export stage/backend timings to this file (.json, or .prom for Prometheus text)")
+    parser.add_argument("--reid-input-size", type=int, nargs=2, default=[224, 224], metavar=("H", "W"),
+                        help="ReID model input resolution")
+    parser.add_argument("--reid-artifact", default=None, help="Exported ReID model (.onnx / TorchScript .pt, see reid_model/export.py)")
     args = parser.parse_args()
 
     pipeline = VehicleDriverPipeline(
         entry_frames_path=args.entry,
         exit_frames_path=args.exit,
         output_path=args.output,
+        parallel_streams=args.parallel,
+        face_strategy=args.face_strategy,
+        frame_face_detection=args.frame_faces,
+        snapshot_selection="best" if args.best_snapshots > 0 else "first",
+        snapshot_top_k=max(1, args.best_snapshots),
+        cache_dir=args.cache_dir,
+        embedding_dump_path=args.export_dump,
+        metrics_path=args.metrics,
+        reid_artifact=args.reid_artifact,
+        reid_input_size=tuple(args.reid_input_size),
         verbose=True
     )
 
-    res = pipeline.run_analysis()
+    res = pipeline.run_streaming() if args.stream else pipeline.run_analysis()
     logging.info("Done. Summary:\n%s", res["stats"])
 
 if __name__ == "__main__":
@@ -0,0 +1,232 @@
+"""
+Inference export for the ReID model.
+
+prepare_for_inference() copies an ft_net, strips training-only parts (MixStyle, dropout,
+the ID classifier) and folds every BatchNorm into the conv / linear layer before it.
+The result is exported to TorchScript (traced + frozen) and/or ONNX, optionally int8:
+  - dynamic: int8 weights, activations quantized on the fly (TorchScript: Linear layers
+    only; ONNX Runtime: all MatMul/Conv, which is slower than fp32 on most CPUs because of
+    ConvInteger - prefer static for the conv backbone)
+  - static: int8 weights and activations calibrated on sample crops (ONNX only)
+Every artifact is checked against the eager model (cosine >= 0.99 per feature) and timed.
+
+Run: python -m reid_model.export --opts configs/opts.yaml --ckpt models/reid_model/net_19.pth \
+         --out models/reid_export --formats torchscript onnx --quantize dynamic --calib-dir data/entry_frames
+"""
+import os
+import copy
+import time
+import argparse
+import logging
+import cv2
+import numpy as np
+import torch
+import torch.nn as nn
+from torch.nn.utils.fusion import fuse_conv_bn_eval, fuse_linear_bn_eval
+
+from .load_reid_model import load_model_from_opts
+from .runtime import TorchRunner, load_runner
+from embeddings.preprocessing import BatchPreprocessor
+
+logger = logging.getLogger(__name__)
+
+try:
+    from onnxruntime.quantization import quantize_dynamic, quantize_static, CalibrationDataReader, QuantFormat, QuantType
+    _HAS_ORT_QUANT = True
+except Exception:
+    _HAS_ORT_QUANT = False
+    CalibrationDataReader = object
+
+QUANT_MODES = ("none", "dynamic", "static")
+PARITY_THRESHOLD = 0.99
+
+
+def _fuse(layer, bn):
+    if isinstance(layer, nn.Conv2d) and isinstance(bn, nn.BatchNorm2d):
+        return fuse_conv_bn_eval(layer, bn)
+    if isinstance(layer, nn.Linear) and isinstance(bn, nn.BatchNorm1d):
+        return fuse_linear_bn_eval(layer, bn)
+    return None
+
+
+def fold_batchnorm(module: nn.Module) -> int:
+    """
+    Fold BatchNorm layers into the preceding conv / linear layer, in place (eval mode only).
+    Handles consecutive pairs in nn.Sequential (ResNet downsample, ClassBlock.add_block) and
+    convK / bnK attribute pairs (ResNet stem and bottlenecks). Returns the number of folds.
+    """
+    folded = 0
+    for child in module.children():
+        folded += fold_batchnorm(child)
+
+    if isinstance(module, nn.Sequential):
+        names = list(module._modules)
+        for a, b in zip(names, names[1:]):
+            fused = _fuse(module._modules[a], module._modules[b])
+            if fused is not None:
+                module._modules[a] = fused
+                module._modules[b] = nn.Identity()
+                folded += 1
+
+    for name, child in list(module.named_children()):
+        if not name.startswith("conv"):
+            continue
+        bn_name = "bn" + name[len("conv"):]
+        fused = _fuse(child, getattr(module, bn_name, None))
+        if fused is not None:
+            setattr(module, name, fused)
+            setattr(module, bn_name, nn.Identity())
+            folded += 1
+    return folded
+
+
+def prepare_for_inference(model: nn.Module) -> nn.Module:
+    """Copy of an ft_net returning features only, without training-only modules, BatchNorm folded."""
+    model = copy.deepcopy(model).eval()
+    model.mixstyle = None
+    model.classifier.classifier = nn.Sequential()
+    model.classifier.return_f = False
+    for parent in list(model.modules()):
+        for name, sub in list(parent.named_children()):
+            if isinstance(sub, nn.Dropout):
+                setattr(parent, name, nn.Identity())
+    n = fold_batchnorm(model)
+    logger.info("Folded %d BatchNorm layers", n)
+    return model
+
+
+def export_torchscript(model: nn.Module, path: str, example: torch.Tensor, quantize: str = "none") -> str:
+    if quantize == "static":
+        raise ValueError("Static int8 quantization is only supported for ONNX export")
+    if quantize == "dynamic":
+        model = torch.ao.quantization.quantize_dynamic(model, {nn.Linear}, dtype=torch.qint8)
+    with torch.no_grad():
+        traced = torch.jit.trace(model, example)
+        traced = torch.jit.freeze(traced)
+    torch.jit.save(traced, path)
+    return path
+
+
+class _CalibrationReader(CalibrationDataReader):
+
+    def __init__(self, input_name: str, batches):
+        self.input_name = input_name
+        self._it = iter(batches)
+
+    def get_next(self):
+        batch = next(self._it, None)
+        return None if batch is None else {self.input_name: batch}
+
+
+def export_onnx(model: nn.Module, path: str, example: torch.Tensor, quantize: str = "none", calibration=None,
+                opset: int = 17) -> str:
+    """
+    Export to ONNX with a dynamic batch dimension. With quantize != "none" the fp32 graph is
+    written next to path (.fp32.onnx) and quantized into path with ONNX Runtime.
+    """
+    if quantize != "none" and not _HAS_ORT_QUANT:
+        raise ImportError("onnxruntime is required for ONNX int8 quantization")
+    fp32_path = path if quantize == "none" else path.replace(".onnx", ".fp32.onnx")
+    with torch.no_grad():
+        torch.onnx.export(model, (example,), fp32_path, input_names=["input"], output_names=["features"],
+                          dynamic_axes={"input": {0: "batch"}, "features": {0: "batch"}}, opset_version=opset,
+                          dynamo=False)
+    if quantize == "dynamic":
+        quantize_dynamic(fp32_path, path, weight_type=QuantType.QInt8)
+    elif quantize == "static":
+        if not calibration:
+            raise ValueError("Static quantization needs calibration batches")
+        quantize_static(fp32_path, path, _CalibrationReader("input", calibration), quant_format=QuantFormat.QDQ,
+                        per_channel=True, activation_type=QuantType.QUInt8, weight_type=QuantType.QInt8)
+    return path
+
+
+def load_crops(image_dir: str, n: int, size=(224, 224)) -> np.ndarray:
+    """Up to n images from image_dir preprocessed like VehicleEmbedder.embed_batch -> (n, 3, H, W)."""
+    files = sorted(f for f in os.listdir(image_dir) if f.lower().endswith((".jpg", ".jpeg", ".png")))[:n]
+    images = [img for img in (cv2.imread(os.path.join(image_dir, f)) for f in files) if img is not None]
+    if not images:
+        raise ValueError(f"No readable images in {image_dir}")
+    return BatchPreprocessor(size=size)(images).copy()
+
+
+def check_parity(reference, runner, batch: np.ndarray, threshold: float = PARITY_THRESHOLD) -> dict:
+    """Cosine similarity between reference and runner features, per input row."""
+    a, b = reference(batch), runner(batch)
+    cos = (a * b).sum(axis=1) / (np.linalg.norm(a, axis=1) * np.linalg.norm(b, axis=1) + 1e-12)
+    return {'min_cosine': float(cos.min()), 'mean_cosine': float(cos.mean()), 'passed': bool(cos.min() >= threshold)}
+
+
+def benchmark(runner, batch: np.ndarray, warmup: int = 3, iters: int = 20) -> dict:
+    for _ in range(warmup):
+        runner(batch)
+    times = []
+    for _ in range(iters):
+        t0 = time.perf_counter()
+        runner(batch)
+        times.append(time.perf_counter() - t0)
+    p50 = float(np.median(times))
+    return {'p50_ms': 1000 * p50, 'mean_ms': 1000 * float(np.mean(times)), 'per_image_ms': 1000 * p50 / len(batch)}
+
+
+def export_all(opts_file: str, ckpt: str, out_dir: str, formats=("torchscript", "onnx"), quantize: str = "none",
+               calib_dir: str = None, n_calib: int = 32, batch_size: int = 16) -> list:
+    """Export the requested artifacts, then check parity and latency of each against eager fp32."""
+    if quantize not in QUANT_MODES:
+        raise ValueError(f"Unknown quantization: {quantize}, choose from: {list(QUANT_MODES)}")
+    os.makedirs(out_dir, exist_ok=True)
+    eager = load_model_from_opts(opts_file, ckpt=ckpt, remove_classifier=True, pretrained=False)
+    eager.eval()
+    optimized = prepare_for_inference(eager)
+
+    if calib_dir:
+        crops = load_crops(calib_dir, n_calib)
+    else:
+        logger.warning("No --calib-dir given; using random inputs for calibration / parity")
+        noise = np.random.default_rng(0).integers(0, 256, (n_calib, 224, 224, 3), dtype=np.uint8)
+        crops = BatchPreprocessor()(list(noise)).copy()
+    batch = crops[:batch_size]
+    example = torch.from_numpy(batch[:1])
+    suffix = "" if quantize == "none" else f".int8-{quantize}"
+
+    artifacts = []
+    if "torchscript" in formats:
+        artifacts.append(export_torchscript(optimized, os.path.join(out_dir, f"reid{suffix}.ts.pt"), example, quantize))
+    if "onnx" in formats:
+        calibration = [crops[i:i + 1] for i in range(len(crops))]
+        artifacts.append(export_onnx(optimized, os.path.join(out_dir, f"reid{suffix}.onnx"), example, quantize, calibration))
+
+    reference = TorchRunner(eager, name="eager")
+    baseline = benchmark(reference, batch)
+    report = [{'artifact': 'eager fp32', **baseline, 'min_cosine': 1.0, 'passed': True, 'speedup': 1.0}]
+    for path in artifacts:
+        runner = load_runner(path)
+        parity = check_parity(reference, runner, batch)
+        latency = benchmark(runner, batch)
+        report.append({'artifact': path, **latency, **parity, 'speedup': baseline['p50_ms'] / latency['p50_ms']})
+    return report
+
+
+def main():
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s [%(levelname)s] %(message)s")
+    parser = argparse.ArgumentParser(description="Export the ReID model for inference")
+    parser.add_argument("--opts", required=True)
+    parser.add_argument("--ckpt", required=True)
+    parser.add_argument("--out", default="models/reid_export")
+    parser.add_argument("--formats", nargs="+", default=["torchscript", "onnx"], choices=["torchscript", "onnx"])
+    parser.add_argument("--quantize", default="none", choices=list(QUANT_MODES))
+    parser.add_argument("--calib-dir", default=None, help="Vehicle crops used for static calibration and the parity check")
+    parser.add_argument("--batch-size", type=int, default=16)
+    args = parser.parse_args()
+
+    report = export_all(args.opts, args.ckpt, args.out, args.formats, args.quantize, args.calib_dir, batch_size=args.batch_size)
+    ok = True
+    for r in report:
+        ok &= r['passed']
+        logger.info("%-40s p50 %7.1f ms (%5.1f ms/img, x%.2f)  min cos %.4f %s", r['artifact'], r['p50_ms'],
+                    r['per_image_ms'], r['speedup'], r['min_cosine'], "" if r['passed'] else "PARITY FAILED")
+    raise SystemExit(0 if ok else 1)
+
+
+if __name__ == "__main__":
+    main()
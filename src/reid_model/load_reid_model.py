@@ -9,6 +9,10 @@ from .mixstyle import MixStyle
 import os
 import yaml
 import sys
+import pickle
+import logging
+
+logger = logging.getLogger(__name__)
 
 
 def weights_init_kaiming(m):
@@ -72,23 +76,26 @@ class ClassBlock(nn.Module):
 class ft_net(nn.Module):
 
     def __init__(self, class_num=751, droprate=0.5, stride=2, circle=False, ibn=False, linear_num=512,
-                 model_subtype="50", mixstyle=True):
+                 model_subtype="50", mixstyle=True, pretrained=True):
         super(ft_net, self).__init__()
+        # pretrained=False builds the architecture only (random init), for loading a checkpoint;
+        # IBN variants still need the IBN-Net hub code (cached under torch.hub.get_dir())
+        weights = "IMAGENET1K_V2" if pretrained else None
         if model_subtype in ("50", "default"):
             if ibn:
                 model_ft = torch.hub.load(
-                    'XingangPan/IBN-Net', 'resnet50_ibn_a', pretrained=True)
+                    'XingangPan/IBN-Net', 'resnet50_ibn_a', pretrained=pretrained)
             else:
-                model_ft = models.resnet50(weights="IMAGENET1K_V2")
+                model_ft = models.resnet50(weights=weights)
         elif model_subtype == "101":
             if ibn:
-                model_ft = torch.hub.load("XingangPan/IBN-Net", "resnet101_ibn_a", pretrained=True)
+                model_ft = torch.hub.load("XingangPan/IBN-Net", "resnet101_ibn_a", pretrained=pretrained)
             else:
-                model_ft = models.resnet101(weights="IMAGENET1K_V2")
+                model_ft = models.resnet101(weights=weights)
         elif model_subtype == "152":
             if ibn:
                 raise ValueError("Resnet152 has no IBN variants available.")
-            model_ft = models.resnet152(weights="IMAGENET1K_V2")
+            model_ft = models.resnet152(weights=weights)
         else:
             raise ValueError(f"Resnet model subtype: {model_subtype} is invalid, choose from: ['50','101','152'].")
 
@@ -121,13 +128,35 @@ class ft_net(nn.Module):
         x = self.classifier(x)
         return x
     
-def load_weights(model, ckpt_path):
-
-    state = torch.load(ckpt_path, map_location=torch.device("cpu"))
+def load_weights(model, ckpt_path, mmap=False):
+    """
+    Load a checkpoint into model. mmap=True memory-maps the checkpoint tensors (weights_only)
+    and uses them as the parameters directly instead of copying them into fresh ones;
+    checkpoints in the legacy (non-zip) format, or holding objects the weights_only
+    unpickler rejects, are read normally.
+    """
+    load_kwargs = {}
+    if mmap:
+        try:
+            state = torch.load(ckpt_path, map_location=torch.device("cpu"), mmap=True, weights_only=True)
+        except pickle.UnpicklingError as e:
+            # newer torch defaults to weights_only, which would reject it again
+            logger.warning("Checkpoint %s holds more than tensors (%s); loading it with full unpickling, "
+                           "without mmap", ckpt_path, e)
+            load_kwargs["weights_only"] = False
+            mmap = False
+        except (RuntimeError, TypeError) as e:
+            logger.warning("Cannot memory-map checkpoint %s (%s); loading it without mmap", ckpt_path, e)
+            mmap = False
+    if not mmap:
+        state = torch.load(ckpt_path, map_location=torch.device("cpu"), **load_kwargs)
     if model.classifier.classifier[0].weight.shape != state["classifier.classifier.0.weight"].shape:
         state["classifier.classifier.0.weight"] = model.classifier.classifier[0].weight
         state["classifier.classifier.0.bias"] = model.classifier.classifier[0].bias
-    model.load_state_dict(state)
+    if mmap:
+        model.load_state_dict(state, assign=True)
+    else:
+        model.load_state_dict(state)
     return model
 
 def create_model(n_classes, kind="resnet", **kwargs):
@@ -139,7 +168,14 @@ def create_model(n_classes, kind="resnet", **kwargs):
         raise ValueError("Model type cannot be created: {}".format(kind))
     
 
-def load_model_from_opts(opts_file, ckpt=None, return_feature=False, remove_classifier=False):
+def load_model_from_opts(opts_file, ckpt=None, return_feature=False, remove_classifier=False, pretrained=None, mmap=False):
+    """
+    Build the model described by opts_file and load ckpt into it.
+    pretrained defaults to "no checkpoint given": the checkpoint overwrites every weight, so
+    ImageNet weights are only downloaded/read when there is nothing to load.
+    """
+    if pretrained is None:
+        pretrained = not ckpt
 
     with open(opts_file, "r") as stream:
         opts = yaml.load(stream, Loader=yaml.FullLoader)
@@ -155,15 +191,26 @@ def load_model_from_opts(opts_file, ckpt=None, return_feature=False, remove_clas
     if model_type in ("resnet", "resnet_ibn"):
         model = create_model(n_classes, "resnet", droprate=droprate, ibn=(model_type == "resnet_ibn"),
                              stride=stride, circle=return_feature, linear_num=linear_num,
-                             model_subtype=model_subtype, mixstyle=mixstyle)
+                             model_subtype=model_subtype, mixstyle=mixstyle, pretrained=pretrained)
 
     else:
         raise ValueError("Unsupported model type: {}".format(model_type))
 
     if ckpt:
-        load_weights(model, ckpt)
+        load_weights(model, ckpt, mmap=mmap)
     if remove_classifier:
         model.classifier.classifier = nn.Sequential()
         model.eval()
     return model
 
+
+def load_inference_model(opts_file, ckpt, mmap=True):
+    """
+    Classifier-stripped model in eval mode, built without pretrained weights and loaded from ckpt
+    (memory-mapped by default). VehicleEmbedder shares it per process through the model
+    registry (utils/model_registry.py); treat it as read-only.
+    """
+    model = load_model_from_opts(opts_file, ckpt=ckpt, remove_classifier=True, pretrained=False, mmap=mmap)
+    model.eval()
+    return model
+
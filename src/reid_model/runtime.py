@@ -0,0 +1,54 @@
+"""
+Runners for exported ReID artifacts (see export.py).
+
+A runner maps a preprocessed (N, 3, H, W) float32 batch to an (N, D) float32 feature
+matrix, whatever the backend: eager PyTorch, TorchScript (.pt) or ONNX Runtime (.onnx).
+"""
+import os
+import numpy as np
+from utils.backends import available, require
+
+# torch is only needed for TorchScript artifacts, onnxruntime only for ONNX ones
+_HAS_ORT = available("onnxruntime")
+
+
+class TorchRunner:
+    """Eager or TorchScript module."""
+
+    def __init__(self, module, name="torch"):
+        self.module = module
+        self.name = name
+
+    def __call__(self, batch: np.ndarray) -> np.ndarray:
+        torch = require("torch")
+        with torch.no_grad():
+            return self.module(torch.from_numpy(batch)).cpu().numpy().astype(np.float32)
+
+
+class OnnxRunner:
+
+    def __init__(self, path, num_threads=0):
+        if not _HAS_ORT:
+            raise ImportError("onnxruntime is required to run ONNX ReID models")
+        ort = require("onnxruntime")
+        options = ort.SessionOptions()
+        options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        if num_threads:
+            options.intra_op_num_threads = num_threads
+        self.session = ort.InferenceSession(path, sess_options=options, providers=["CPUExecutionProvider"])
+        self.input_name = self.session.get_inputs()[0].name
+        self.name = "onnx"
+
+    def __call__(self, batch: np.ndarray) -> np.ndarray:
+        return self.session.run(None, {self.input_name: batch})[0].astype(np.float32)
+
+
+def load_runner(path, num_threads=0):
+    """Runner for an exported artifact, chosen by extension (.onnx or TorchScript .pt/.pth)."""
+    if not os.path.exists(path):
+        raise FileNotFoundError(f"ReID artifact not found: {path}")
+    if path.endswith(".onnx"):
+        return OnnxRunner(path, num_threads=num_threads)
+    module = require("torch").jit.load(path, map_location="cpu")
+    module.eval()
+    return TorchRunner(module, name="torchscript")
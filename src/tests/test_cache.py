@@ -0,0 +1,140 @@
+import numpy as np
+import pytest
+
+sv = pytest.importorskip("supervision")
+pytest.importorskip("cv2")
+
+from cache.cached_models import CachedVehicleDetector, CachedVehicleEmbedder
+from cache.disk_cache import DiskCache
+from embeddings.vehicle_embedder import VehicleEmbedder
+from utils.model_registry import ModelRegistry, weights_version
+
+
+class StubDetector:
+    """Two boxes per frame, derived from the frame's first pixel; counts its calls."""
+
+    def __init__(self, weights, with_class=True):
+        self.weights = weights
+        self.with_class = with_class
+        self.calls = 0
+
+    @property
+    def model_id(self):
+        return f"stub:{weights_version(self.weights)}"
+
+    def detect(self, frame):
+        self.calls += 1
+        v = float(frame[0, 0, 0])
+        if v == 0:
+            return sv.Detections.empty()
+        return sv.Detections(xyxy=np.array([[v, 1.5, v + 10.25, 20.0], [2.0, v, 30.0, v + 7.5]]),
+                             confidence=np.array([0.91, 0.42], dtype=np.float32),
+                             class_id=np.array([2, 7]) if self.with_class else None)
+
+
+class FakeReid:
+    """Mean colour of each crop; fails while fail is set."""
+
+    def __init__(self):
+        self.fail = False
+        self.calls = 0
+
+    def __call__(self, batch):
+        self.calls += 1
+        if self.fail:
+            raise RuntimeError("out of memory")
+        return batch.mean(dim=(2, 3))
+
+
+def _frame(value):
+    frame = np.zeros((48, 64, 3), dtype=np.uint8)
+    frame[0, 0, 0] = value
+    return frame
+
+
+def _weights(tmp_path, content):
+    path = tmp_path / "weights.pt"
+    path.write_bytes(content)
+    return str(path)
+
+
+@pytest.mark.parametrize("with_class", [True, False])
+def test_detector_hit_returns_the_same_detections(tmp_path, with_class):
+    inner = StubDetector(_weights(tmp_path, b"v1"), with_class)
+    detector = CachedVehicleDetector(inner, DiskCache(str(tmp_path / "cache")))
+
+    first = detector.detect(_frame(5))
+    again = detector.detect(_frame(5))
+    assert inner.calls == 1
+    assert detector.cache.hits == 1 and detector.cache.misses == 1
+    assert np.array_equal(again.xyxy, first.xyxy)
+    assert np.array_equal(again.confidence, first.confidence)
+    if with_class:
+        assert np.array_equal(again.class_id, first.class_id)
+    else:
+        assert again.class_id is None
+
+    assert len(detector.detect(_frame(0))) == 0
+    assert len(detector.detect(_frame(0))) == 0
+    detector.detect(_frame(6))
+    assert inner.calls == 3
+
+
+def test_detector_cache_is_invalidated_when_the_weights_change(tmp_path):
+    inner = StubDetector(_weights(tmp_path, b"v1"))
+    detector = CachedVehicleDetector(inner, DiskCache(str(tmp_path / "cache")))
+    detector.detect(_frame(5))
+    _weights(tmp_path, b"v2 with another size")
+
+    detector.detect(_frame(5))
+    detector.detect(_frame(5))
+    assert inner.calls == 2
+
+
+def _embedder(tmp_path, opts):
+    path = tmp_path / "opts.yaml"
+    path.write_text(opts)
+    embedder = VehicleEmbedder(device="cpu")
+    embedder.reid_opts = str(path)
+    embedder._handle = ModelRegistry().acquire("reid", None, FakeReid)
+    return embedder
+
+
+def _crops():
+    rng = np.random.default_rng(0)
+    return [rng.integers(0, 255, (40, 60, 3), dtype=np.uint8) for _ in range(3)]
+
+
+def test_embedder_cache_is_invalidated_when_the_opts_change(tmp_path):
+    pytest.importorskip("torch")
+    embedder = _embedder(tmp_path, "arch: a\n")
+    cached = CachedVehicleEmbedder(embedder, DiskCache(str(tmp_path / "cache")))
+    crops = _crops()
+
+    first = cached.embed_batch(crops)
+    assert np.array_equal(cached.embed_batch(crops), first)
+    assert embedder.model.calls == 1
+
+    (tmp_path / "opts.yaml").write_text("arch: b\n")
+    cached.embed_batch(crops)
+    assert embedder.model.calls == 2
+
+
+def test_histogram_fallback_is_not_served_as_reid_output(tmp_path):
+    pytest.importorskip("torch")
+    embedder = _embedder(tmp_path, "arch: a\n")
+    cached = CachedVehicleEmbedder(embedder, DiskCache(str(tmp_path / "cache")))
+    crops = _crops()
+
+    embedder.model.fail = True
+    fallback = cached.embed_batch(crops)
+    embedder.model.fail = False
+    reid = cached.embed_batch(crops)
+
+    assert embedder.model.calls == 2
+    assert np.array_equal(reid, embedder.embed_batch(crops))
+    assert not np.allclose(reid[:, :3], fallback[:, :3])
+    # the fallback rows were stored under the histogram backend's id
+    hits = cached.cache.hits
+    assert np.array_equal(CachedVehicleEmbedder(VehicleEmbedder(device="cpu"), cached.cache).embed_batch(crops), fallback)
+    assert cached.cache.hits == hits + len(crops)
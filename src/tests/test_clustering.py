@@ -0,0 +1,77 @@
+import dataclasses
+
+import numpy as np
+import pytest
+
+from core.clustering import CentroidClusterer, cluster_snapshots
+from data_models.snapshot import VehicleSnapshot
+
+DIM = 512
+
+
+def _baseline_clusters(snapshots, threshold):
+    """The original per-centroid loop (cosine_similarity was a plain dot product), as member lists."""
+    members, centroids = [], []
+
+    def centroid(group):
+        embs = [s.vehicle_embedding for s in group if s.vehicle_embedding is not None]
+        if not embs:
+            return None
+        mean = np.mean(embs, axis=0)
+        return mean / np.linalg.norm(mean)
+
+    def new_cluster(snap):
+        members.append([snap])
+        c = centroid([snap])
+        centroids.append(c if c is not None else np.zeros(512))
+
+    for snap in snapshots:
+        emb = snap.vehicle_embedding
+        if emb is None or emb.size == 0 or not centroids:
+            new_cluster(snap)
+            continue
+        sims = [np.dot(emb, cent) for cent in centroids]
+        best_idx = int(np.argmax(sims))
+        if sims[best_idx] >= threshold:
+            members[best_idx].append(snap)
+            centroids[best_idx] = centroid(members[best_idx])
+        else:
+            new_cluster(snap)
+    return members, centroids
+
+
+def _snapshots(seed, n=200):
+    """Noisy views of a few vehicles, in random order; some snapshots have no vehicle embedding."""
+    rng = np.random.default_rng(seed)
+    vehicles = rng.normal(size=(int(rng.integers(3, 15)), DIM))
+    snapshots = []
+    for i in range(n):
+        v = vehicles[int(rng.integers(len(vehicles)))] + rng.uniform(0.3, 1.5) * rng.normal(size=DIM)
+        emb = None if rng.random() < 0.1 else (v / np.linalg.norm(v)).astype(np.float32)
+        snapshots.append(VehicleSnapshot(track_id=i, frame_path=f"{i}.jpg", bbox=(0, 0, 1, 1), vehicle_crop=None,
+                                         driver_crops=[], vehicle_embedding=emb, driver_embedding=None,
+                                         timestamp=float(i), is_entry=True))
+    return snapshots
+
+
+@pytest.mark.parametrize("seed", range(30))
+@pytest.mark.parametrize("threshold", [0.3, 0.5, 0.7])
+def test_clusterer_equals_baseline_loop(seed, threshold):
+    snapshots = _snapshots(seed)
+    members, centroids = _baseline_clusters(snapshots, threshold)
+    clusters = cluster_snapshots(snapshots, threshold=threshold)
+
+    assert [[s.track_id for s in c.snapshots] for c in clusters] == [[s.track_id for s in m] for m in members]
+    assert 1 < len(clusters) < len(snapshots)
+    for c, centroid in zip(clusters, centroids):
+        got = np.zeros(DIM) if c.vehicle_embedding is None else c.vehicle_embedding
+        assert np.allclose(got, centroid, atol=1e-5)
+
+
+def test_clusterer_without_any_embedding():
+    snapshots = [dataclasses.replace(s, vehicle_embedding=None) for s in _snapshots(0, n=5)]
+    clusterer = CentroidClusterer()
+    clusters = [clusterer.add(s) for s in snapshots]
+
+    assert len(clusterer) == 5
+    assert [c.snapshots for c in clusters] == [[s] for s in snapshots]
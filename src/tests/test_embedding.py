@@ -0,0 +1,112 @@
+import gc
+import types
+import weakref
+
+import numpy as np
+import pytest
+
+pytest.importorskip("cv2")
+
+import embeddings.driver_embedder as driver_embedder
+from embeddings.driver_embedder import DriverEmbedder
+from utils.model_registry import ModelRegistry
+
+
+class FakeFaceNet:
+    """Embeds each crop as its mean pixel; any batch holding an all-255 crop raises."""
+
+    def __init__(self):
+        self.calls = []
+
+    def embeddings(self, batch):
+        self.calls.append(len(batch))
+        if any(np.all(b == 255) for b in batch):
+            raise ValueError("bad crop")
+        return np.repeat(batch.reshape(len(batch), -1).mean(axis=1, keepdims=True), 512, axis=1)
+
+
+@pytest.fixture
+def facenet_embedder():
+    registry = ModelRegistry()
+    embedder = DriverEmbedder()
+    embedder._handle = registry.acquire("keras_facenet", None, FakeFaceNet)
+    yield embedder
+    embedder.close()
+
+
+def _crop(value, shape=(60, 50, 3)):
+    return np.full(shape, value, dtype=np.uint8)
+
+
+def test_facenet_batch_failure_drops_only_failing_crops(facenet_embedder):
+    crops = [_crop(10), _crop(255), _crop(30)]
+    embs, kept = facenet_embedder._facenet_embeddings(crops)
+
+    assert kept == [0, 2]
+    assert embs.shape == (2, 512)
+    assert facenet_embedder.model.calls == [3, 1, 1, 1]
+
+
+def test_facenet_skips_crops_without_three_channels(facenet_embedder):
+    crops = [_crop(10), _crop(20, (60, 50, 4)), _crop(30, (60, 50, 1)), _crop(40, (0, 50, 3))]
+    embs, kept = facenet_embedder._facenet_embeddings(crops)
+
+    assert kept == [0]
+    assert facenet_embedder.model.calls == [1]
+
+
+def test_embed_batch_keeps_tracks_whose_crops_embed(facenet_embedder):
+    out = facenet_embedder.embed_batch([[_crop(10), _crop(255)], [_crop(255)], [_crop(30)]])
+
+    assert out.shape == (3, 512)
+    assert np.allclose(np.linalg.norm(out[[0, 2]], axis=1), 1.0)
+    assert not out[1].any()
+
+
+def test_unload_frees_the_model_of_a_live_embedder():
+    registry = ModelRegistry()
+    embedder = DriverEmbedder()
+    embedder._handle = registry.acquire("keras_facenet", None, FakeFaceNet)
+    model = weakref.ref(embedder.model)
+    embedder.embed_batch([[_crop(10)]])
+
+    registry.unload("keras_facenet")
+    gc.collect()
+    assert model() is None
+    with pytest.raises(RuntimeError):
+        embedder.embed_batch([[_crop(10)]])
+
+
+@pytest.fixture
+def fake_face_recognition(monkeypatch):
+    """face_recognition reported as installed; returns the list of its imports."""
+    imports = []
+    module = types.SimpleNamespace(face_encodings=lambda rgb: [np.full(128, rgb.mean())])
+
+    def optional(name):
+        assert name == "face_recognition"
+        imports.append(name)
+        return module
+
+    monkeypatch.setattr(driver_embedder, "available", lambda name: name == "face_recognition")
+    monkeypatch.setattr(driver_embedder, "optional", optional)
+    return imports
+
+
+def test_face_recognition_is_not_imported_while_facenet_is_used(fake_face_recognition):
+    embedder = DriverEmbedder()
+    embedder._handle = ModelRegistry().acquire("keras_facenet", None, FakeFaceNet)
+    embedder.embed_batch([[_crop(10)]])
+
+    assert embedder.model_id == "facenet"
+    assert fake_face_recognition == []
+
+
+def test_face_recognition_is_imported_on_first_use(fake_face_recognition):
+    embedder = DriverEmbedder()
+    assert fake_face_recognition == []
+
+    out = embedder.embed_batch([[_crop(10)], [_crop(30)]])
+    assert fake_face_recognition
+    assert embedder.model_id == "face_recognition"
+    assert np.allclose(np.linalg.norm(out, axis=1), 1.0)
@@ -0,0 +1,112 @@
+import types
+
+import numpy as np
+import pytest
+
+cv2 = pytest.importorskip("cv2")
+
+import detection.face_detector as face_detector
+from detection.face_detector import FaceDetector
+from utils.model_registry import ModelRegistry
+
+
+class _Box:
+
+    def __init__(self, xyxy):
+        self.xyxy = [np.array(xyxy, dtype=np.float32)]
+
+
+class _Result:
+
+    def __init__(self, boxes):
+        self.boxes = [_Box(b) for b in boxes]
+
+
+class FakeYoloFace:
+    """Finds the faces drawn by _frame (blue channel 255) in each image; records the batch sizes."""
+
+    def __init__(self):
+        self.calls = []
+
+    def __call__(self, source, verbose=False, conf=0.25):
+        images = source if isinstance(source, list) else [source]
+        self.calls.append(len(images))
+        results = []
+        for image in images:
+            mask = (image[:, :, 0] == 255).astype(np.uint8)
+            n, _, stats, _ = cv2.connectedComponentsWithStats(mask)
+            results.append(_Result([(x, y, x + w, y + h) for x, y, w, h, _ in stats[1:n]]))
+        return results
+
+
+# vehicles, and the faces in them (offsets relative to the vehicle box), per frame kind
+VEHICLES = [(20, 40, 220, 200), (180, 60, 400, 240), (420, 30, 620, 230), (60, 190, 300, 350)]
+FACES = [
+    [(130, 20), (10, 30)],  # right upper and left upper
+    [(20, 25)],  # left upper only
+    [(80, 100)],  # only in the full vehicle region
+    [],
+]
+
+
+def _frame(i):
+    rng = np.random.default_rng(i)
+    frame = rng.integers(0, 120, (360, 640, 3), dtype=np.uint8)
+    for k, (x1, y1, _, _) in enumerate(VEHICLES):
+        for dx, dy in FACES[(k + i) % len(FACES)]:
+            size = 30 + (i + k) % 12
+            face = rng.integers(60, 200, (size, size, 3), dtype=np.uint8)
+            face[:, :, 0] = 255
+            frame[y1 + dy:y1 + dy + size, x1 + dx:x1 + dx + size] = face
+    return frame
+
+
+def _detector(strategy):
+    detector = FaceDetector(strategy=strategy)
+    detector._yolo_handle = ModelRegistry().acquire("yolo", None, FakeYoloFace)
+    return detector
+
+
+@pytest.mark.parametrize("strategy", ["regions", "single_pass"])
+def test_frame_detection_equals_per_vehicle_detection(strategy):
+    per_vehicle = _detector(strategy)
+    per_frame = _detector(strategy)
+
+    found = 0
+    for i in range(40):
+        frame = _frame(i)
+        expected = [per_vehicle.detect_driver_faces(frame, bbox, "cam") for bbox in VEHICLES]
+        faces = per_frame.detect_driver_faces_frame(frame, VEHICLES, "cam")
+
+        assert len(faces) == len(expected)
+        for got, want in zip(faces, expected):
+            assert len(got) == len(want)
+            for a, b in zip(got, want):
+                assert np.array_equal(a, b)
+        found += sum(len(f) > 0 for f in faces)
+
+    assert found > 40
+    assert per_frame.metrics['vehicles'] == per_vehicle.metrics['vehicles'] == 160
+    assert per_frame.metrics['vehicles_with_faces'] == per_vehicle.metrics['vehicles_with_faces']
+    # the per-vehicle regions went through far fewer, batched, YOLO calls
+    batched = per_frame.yolo_face.calls
+    assert max(batched) > 1
+    assert len(batched) < len(per_vehicle.yolo_face.calls) / 2
+
+
+def test_face_recognition_is_imported_only_when_the_chain_reaches_it(monkeypatch):
+    imports = []
+    module = types.SimpleNamespace(face_locations=lambda rgb, model: [])
+    monkeypatch.setattr(face_detector, "available", lambda name: name == "face_recognition")
+    monkeypatch.setattr(face_detector, "optional", lambda name: imports.append(name) or module)
+
+    detector = _detector("regions")
+    frame = _frame(0)
+    # vehicle 0 has a face in its first region: YOLO finds it, face_recognition is never needed
+    assert detector.detect_driver_faces(frame, VEHICLES[0])
+    assert imports == []
+    assert "face_recognition" in detector.model_id
+
+    # vehicle 3 has no face, so every region falls through to face_recognition
+    assert detector.detect_driver_faces(frame, VEHICLES[3]) == []
+    assert imports
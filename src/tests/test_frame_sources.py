@@ -0,0 +1,104 @@
+import os
+import importlib.util
+
+import numpy as np
+import pytest
+
+cv2 = pytest.importorskip("cv2")
+
+SRC_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def _load(name):
+    # src/io is shadowed by the stdlib io module, so load the loaders by path
+    spec = importlib.util.spec_from_file_location(f"io.{name}", os.path.join(SRC_DIR, "io", f"{name}.py"))
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+VideoLoader = _load("video_loader").VideoLoader
+FrameLoader = _load("frame_loader").FrameLoader
+
+N_FRAMES = 20
+FPS = 10.0
+
+
+@pytest.fixture
+def video(tmp_path):
+    """A 2 s, 10 fps .avi whose i-th frame is filled with 10 * i."""
+    path = str(tmp_path / "clip.avi")
+    writer = cv2.VideoWriter(path, cv2.VideoWriter_fourcc(*"MJPG"), FPS, (64, 48))
+    if not writer.isOpened():
+        pytest.skip("no MJPG video writer in this OpenCV build")
+    for i in range(N_FRAMES):
+        writer.write(np.full((48, 64, 3), 10 * i, dtype=np.uint8))
+    writer.release()
+    return path
+
+
+def _read(loader):
+    return [(frame_id, ts, int(round(frame.mean() / 10))) for frame_id, frame, ts in loader.iter_with_timestamps()]
+
+
+def test_all_frames_with_ids_and_timestamps(video):
+    frames = _read(VideoLoader(video))
+
+    assert [f[0] for f in frames] == [f"{video}#{i:06d}" for i in range(N_FRAMES)]
+    assert [f[1] for f in frames] == pytest.approx([i / FPS for i in range(N_FRAMES)])
+    # each frame is the one written at that index
+    assert [f[2] for f in frames] == list(range(N_FRAMES))
+
+
+@pytest.mark.parametrize("stride", [2, 3, 7])
+def test_stride_keeps_every_nth_frame(video, stride):
+    frames = _read(VideoLoader(video, stride=stride))
+
+    kept = list(range(0, N_FRAMES, stride))
+    assert [f[0] for f in frames] == [f"{video}#{i:06d}" for i in kept]
+    assert [f[1] for f in frames] == pytest.approx([i / FPS for i in kept])
+    assert [f[2] for f in frames] == kept
+
+
+@pytest.mark.parametrize("target_fps, kept", [(5, range(0, N_FRAMES, 2)), (4, range(0, N_FRAMES, 3)),
+                                              (10, range(N_FRAMES)), (30, range(N_FRAMES))])
+def test_target_fps_subsamples_by_timestamp(video, target_fps, kept):
+    frames = _read(VideoLoader(video, target_fps=target_fps))
+
+    assert [f[2] for f in frames] == list(kept)
+    gaps = np.diff([f[1] for f in frames])
+    assert np.all(gaps >= min(1 / target_fps, 1 / FPS) - 1e-6)
+
+
+def test_iteration_tracks_the_last_timestamp(video):
+    loader = VideoLoader(video, stride=5)
+    seen = []
+    for frame_id, frame in loader:
+        seen.append(loader.last_timestamp)
+        if len(seen) == 3:
+            # stopping early stops the decode thread
+            break
+    assert seen == pytest.approx([0.0, 0.5, 1.0])
+    assert loader.fps == pytest.approx(FPS)
+
+
+def test_video_source_detection(tmp_path, video):
+    assert VideoLoader.is_video_source(video)
+    assert VideoLoader.is_video_source("rtsp://camera/stream")
+    assert VideoLoader.is_video_source(0)
+    assert not VideoLoader.is_video_source(str(tmp_path))
+    with pytest.raises(FileNotFoundError):
+        VideoLoader(str(tmp_path / "missing.mp4"))
+
+
+def test_frame_directory_timestamps(tmp_path):
+    for i in range(5):
+        cv2.imwrite(str(tmp_path / f"frame_{i:03d}.png"), np.full((8, 8, 3), 10 * i, dtype=np.uint8))
+    (tmp_path / "frame_002.png").write_bytes(b"not an image")
+
+    for prefetch in (0, 2):
+        frames = _read(FrameLoader(str(tmp_path), prefetch=prefetch, fps=FPS))
+        # timestamps follow the file positions, also around a frame that fails to decode
+        assert [os.path.basename(f[0]) for f in frames] == ["frame_000.png", "frame_001.png", "frame_003.png", "frame_004.png"]
+        assert [f[1] for f in frames] == pytest.approx([0.0, 0.1, 0.3, 0.4])
+    assert [f[1] for f in _read(FrameLoader(str(tmp_path)))] == [0.0, 1.0, 3.0, 4.0]
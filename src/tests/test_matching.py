@@ -0,0 +1,285 @@
+import itertools
+
+import numpy as np
+import pytest
+
+from core.matcher import VehicleDriverMatcher, _HAS_SCIPY
+from core.replay import replay, sweep_thresholds
+from core.streaming import StreamingMatcher
+from data_models.cluster import VehicleCluster
+from data_models.snapshot import VehicleSnapshot
+from data_models.snapshot_store import SnapshotStore
+from index.factory import create_index
+from utils.backends import available
+
+DIM = 16
+
+
+def _unit(v):
+    return (v / np.linalg.norm(v, axis=-1, keepdims=True)).astype(np.float32)
+
+
+def _people(rng, n):
+    """Driver and vehicle embeddings of n people."""
+    return _unit(rng.normal(size=(n, DIM))), _unit(rng.normal(size=(n, DIM)))
+
+
+def _clusters(seed, n_entry=12, n_exit=10):
+    """
+    Entry clusters of n_entry people; exits are noisy views of some of them, plus strangers,
+    people in someone else's vehicle, and clusters missing an embedding.
+    """
+    rng = np.random.default_rng(seed)
+    drivers, vehicles = _people(rng, n_entry + n_exit)
+    entries = [VehicleCluster(f"entry_{i}", True, driver_embedding=drivers[i], vehicle_embedding=vehicles[i])
+               for i in range(n_entry)]
+    exits = []
+    for i in range(n_exit):
+        kind = rng.choice(["same", "same", "swapped", "stranger", "missing"])
+        person = int(rng.integers(n_entry))
+        if kind == "stranger":
+            person = n_entry + i
+        vehicle = int(rng.integers(n_entry)) if kind == "swapped" else person
+        noise = rng.uniform(0.2, 0.8)
+        driver = _unit(drivers[person] + noise * rng.normal(size=DIM) / np.sqrt(DIM))
+        exits.append(VehicleCluster(f"exit_{i}", False, driver_embedding=None if kind == "missing" else driver,
+                                    vehicle_embedding=_unit(vehicles[vehicle] + 0.3 * rng.normal(size=DIM) / np.sqrt(DIM))))
+    entries[int(rng.integers(n_entry))].driver_embedding = None
+    return entries, exits
+
+
+def _summary(results):
+    return [(r["exit_cluster"].cluster_id, r["entry_cluster"].cluster_id if r["entry_cluster"] is not None else None,
+             r["reason"]) for r in results]
+
+
+def _assert_same(results, expected):
+    assert _summary(results) == _summary(expected)
+    for r, e in zip(results, expected):
+        for key in ("driver_score", "vehicle_score", "overall_score"):
+            assert r[key] == pytest.approx(e[key], abs=1e-5)
+
+
+@pytest.mark.parametrize("seed", range(10))
+def test_matrix_mode_equals_loop_mode(seed):
+    entries, exits = _clusters(seed)
+    loop = VehicleDriverMatcher(mode="loop").match(entries, exits)
+    _assert_same(VehicleDriverMatcher(mode="matrix").match(entries, exits), loop)
+
+
+@pytest.mark.parametrize("seed", range(10))
+@pytest.mark.parametrize("assignment", ["independent", "greedy", "hungarian"])
+@pytest.mark.parametrize("backend, params", [("flat", {}), ("ivf", {"nlist": 4, "nprobe": 4, "min_train": 8})])
+def test_exact_index_mode_equals_matrix_mode(seed, assignment, backend, params):
+    if assignment == "hungarian" and not _HAS_SCIPY:
+        pytest.skip("scipy not installed")
+    entries, exits = _clusters(seed)
+    matrix = VehicleDriverMatcher(mode="matrix", assignment=assignment).match(entries, exits)
+    # every entry is a candidate, and IVF probes every list, so the search is exact
+    indexed = VehicleDriverMatcher(mode="index", assignment=assignment, index_backend=backend, index_params=params,
+                                   index_top_k=len(entries)).match(entries, exits)
+    _assert_same(indexed, matrix)
+
+
+def test_index_mode_with_default_top_k_equals_loop_mode():
+    entries, exits = _clusters(0)
+    loop = VehicleDriverMatcher(mode="loop").match(entries, exits)
+    _assert_same(VehicleDriverMatcher(mode="index").match(entries, exits), loop)
+
+
+def test_faiss_backend_requires_faiss():
+    if available("faiss"):
+        assert len(create_index("faiss_flat", dim=DIM)) == 0
+        return
+    with pytest.raises(ImportError, match="faiss"):
+        create_index("faiss_flat", dim=DIM)
+
+
+def test_empty_inputs():
+    entries, exits = _clusters(0)
+    for mode in ("loop", "matrix", "index"):
+        matcher = VehicleDriverMatcher(mode=mode)
+        assert matcher.match(entries, []) == []
+        assert [r["reason"] for r in matcher.match([], exits)] == ["no_entry_driver_found"] * len(exits)
+
+
+# one-to-one assignment solvers against brute force
+def _candidate_pairs(rng, n_rows, n_cols, density):
+    keep = rng.random((n_rows, n_cols)) < density
+    rows, cols = np.nonzero(keep)
+    return rows, cols, rng.uniform(-0.2, 1.0, size=rows.size)
+
+
+def _matchings(rows, cols):
+    """Every one-to-one set of candidate pairs (as lists of candidate positions)."""
+    by_row = {}
+    for k, i in enumerate(rows):
+        by_row.setdefault(int(i), []).append(k)
+    row_ids = sorted(by_row)
+
+    def extend(r, used_cols):
+        if r == len(row_ids):
+            yield []
+            return
+        yield from extend(r + 1, used_cols)
+        for k in by_row[row_ids[r]]:
+            if cols[k] not in used_cols:
+                for rest in extend(r + 1, used_cols | {int(cols[k])}):
+                    yield [k] + rest
+    return list(extend(0, frozenset()))
+
+
+@pytest.mark.skipif(not _HAS_SCIPY, reason="scipy not installed")
+@pytest.mark.parametrize("seed", range(40))
+def test_hungarian_matches_brute_force(seed):
+    rng = np.random.default_rng(seed)
+    rows, cols, combined = _candidate_pairs(rng, int(rng.integers(1, 6)), int(rng.integers(1, 6)), rng.uniform(0.2, 0.9))
+    if not rows.size:
+        return
+    pos = {(int(i), int(j)): k for k, (i, j) in enumerate(zip(rows, cols))}
+    solved = VehicleDriverMatcher._solve_hungarian(rows, cols, combined)
+
+    # the solver maximizes the number of assigned pairs first, then their total score
+    best = max(_matchings(rows, cols), key=lambda m: (len(m), combined[m].sum()))
+    assert len({i for i, _ in solved}) == len({j for _, j in solved}) == len(solved)
+    assert len(solved) == len(best)
+    assert sum(combined[pos[p]] for p in solved) == pytest.approx(combined[best].sum())
+
+
+@pytest.mark.parametrize("seed", range(40))
+def test_greedy_matches_brute_force(seed):
+    rng = np.random.default_rng(seed)
+    rows, cols, combined = _candidate_pairs(rng, int(rng.integers(1, 6)), int(rng.integers(1, 6)), rng.uniform(0.2, 0.9))
+    solved = set(VehicleDriverMatcher._solve_greedy(rows, cols, combined))
+
+    # greedy takes the best remaining pair until none is left: the unique matching in which every
+    # other candidate pair conflicts with a chosen pair that scores at least as much
+    def greedy_stable(matching):
+        chosen = {(int(rows[k]), int(cols[k])): combined[k] for k in matching}
+        for k, (i, j) in enumerate(zip(rows, cols)):
+            if (i, j) in chosen:
+                continue
+            blockers = [s for (a, b), s in chosen.items() if a == i or b == j]
+            if not blockers or max(blockers) < combined[k]:
+                return False
+        return True
+
+    stable = [m for m in _matchings(rows, cols) if greedy_stable(m)]
+    assert len(stable) == 1
+    assert solved == {(int(rows[k]), int(cols[k])) for k in stable[0]}
+
+
+# threshold sweep against replay
+def _snapshots(seed, n_people=10, per_vehicle=3):
+    """Entry and exit snapshots: a few noisy snapshots per vehicle, some drivers swapped or missing at exit."""
+    rng = np.random.default_rng(seed)
+    drivers, vehicles = _people(rng, n_people + 3)
+
+    def snap(person, vehicle, is_entry, i, driver_missing=False):
+        return VehicleSnapshot(
+            track_id=i, frame_path=f"{i}.jpg", bbox=(0, 0, 1, 1), vehicle_crop=None, driver_crops=[],
+            vehicle_embedding=_unit(vehicles[vehicle] + 0.5 * rng.normal(size=DIM) / np.sqrt(DIM)),
+            driver_embedding=None if driver_missing else _unit(drivers[person] + 0.6 * rng.normal(size=DIM) / np.sqrt(DIM)),
+            timestamp=float(i), is_entry=is_entry, quality=float(rng.uniform(0.1, 1.0)))
+
+    entry = [snap(p, p, True, i) for i, p in enumerate(np.repeat(np.arange(n_people), per_vehicle))]
+    exit_ = []
+    for p in rng.permutation(n_people + 3)[:n_people]:
+        driver = int(rng.integers(n_people)) if rng.random() < 0.2 else p
+        missing = rng.random() < 0.1
+        exit_.extend(snap(driver, p, False, len(exit_), missing) for _ in range(per_vehicle))
+    rng.shuffle(exit_)
+    return entry, exit_
+
+
+VEHICLE_THRESHOLDS = (0.55, 0.65, 0.75, 0.85)
+DRIVER_THRESHOLDS = (0.3, 0.5, 0.6, 0.75)
+OVERALL_THRESHOLDS = (0.3, 0.5, 0.65)
+
+
+@pytest.mark.parametrize("quality_weighted", [False, True])
+@pytest.mark.parametrize("assignment", ["independent", "greedy", "hungarian"])
+def test_sweep_equals_replay(quality_weighted, assignment):
+    if assignment == "hungarian" and not _HAS_SCIPY:
+        pytest.skip("scipy not installed")
+    entry, exit_ = _snapshots(0)
+    rows = sweep_thresholds(entry, exit_, VEHICLE_THRESHOLDS, DRIVER_THRESHOLDS, OVERALL_THRESHOLDS,
+                            quality_weighted=quality_weighted, assignment=assignment)
+    grid = list(itertools.product(VEHICLE_THRESHOLDS, DRIVER_THRESHOLDS, OVERALL_THRESHOLDS))
+    assert len(rows) == len(grid) == 48
+
+    outcomes = set()
+    for row, (v, d, o) in zip(rows, grid):
+        result = replay(entry, exit_, vehicle_threshold=v, driver_threshold=d, overall_threshold=o,
+                        quality_weighted=quality_weighted, mode="matrix", assignment=assignment)
+        reasons = [r["reason"] for r in result["match_results"]]
+        expected = {
+            "vehicle_threshold": v,
+            "driver_threshold": d,
+            "overall_threshold": o,
+            "entry_clusters": len(result["entry_clusters"]),
+            "exit_clusters": len(result["exit_clusters"]),
+            "matches_found": reasons.count("match"),
+            "mismatches_detected": reasons.count("driver_mismatch"),
+            "no_match_found": reasons.count("no_entry_driver_found")
+        }
+        assert row == expected
+        outcomes.add((row["matches_found"], row["mismatches_detected"], row["no_match_found"]))
+    # the grid actually exercises different outcomes
+    assert len(outcomes) > 3
+
+
+# streaming matcher: video-time eviction
+def _stream_snapshot(store, people, person, t, is_entry):
+    drivers, vehicles = people
+    return store.create(track_id=int(t * 10), frame_path=f"{t}.jpg", bbox=(0, 0, 1, 1), vehicle_crop=None,
+                        driver_crops=[], vehicle_embedding=vehicles[person], driver_embedding=drivers[person],
+                        timestamp=t, is_entry=is_entry)
+
+
+def test_streaming_evicts_by_video_time():
+    store = SnapshotStore(dim=DIM)
+    people = _people(np.random.default_rng(0), 3)
+    stream = StreamingMatcher(VehicleDriverMatcher(mode="index"), entry_ttl=20.0, exit_idle_timeout=5.0)
+
+    def feed(t, person, is_entry):
+        snap = _stream_snapshot(store, people, person, t, is_entry)
+        if is_entry:
+            stream.add_entry(snap)
+        else:
+            stream.add_exit(snap)
+        assert stream.poll(t) == []
+
+    def poll(t):
+        results = stream.poll(t)
+        store.discard([s for c in stream.take_evicted() for s in c.snapshots])
+        return results
+
+    for t, person in [(0.0, 0), (1.0, 0), (2.0, 1), (3.0, 2), (12.0, 1)]:
+        feed(t, person, True)
+    for t in (10.0, 11.0):
+        feed(t, 0, False)
+    assert len(stream.entries) == 3
+
+    # the exit cluster is finalized (and matched) once idle for 5 s after its last snapshot
+    assert poll(15.9) == []
+    [result] = poll(16.0)
+    assert result["reason"] == "match"
+    assert [s.timestamp for s in result["entry_cluster"].snapshots] == [0.0, 1.0]
+    assert [s.timestamp for s in result["exit_cluster"].snapshots] == [10.0, 11.0]
+    assert stream.stats['entries_evicted_matched'] == 1
+
+    # person 2's entry expires 20 s after it was last updated; person 1's was updated at t=12
+    assert poll(22.9) == [] and stream.stats['entries_evicted_ttl'] == 0
+    assert poll(23.0) == [] and stream.stats['entries_evicted_ttl'] == 1
+    assert [[s.timestamp for s in c.snapshots] for c in stream.entries.values()] == [[2.0, 12.0]]
+
+    feed(24.0, 1, False)
+    feed(25.0, 2, False)
+    results = poll(30.0)
+    assert [r["reason"] for r in results] == ["match", "no_entry_driver_found"]
+    assert results[0]["entry_cluster"].snapshots[-1].timestamp == 12.0
+    assert stream.entries == {} and len(stream) == 0
+    assert stream.stats == {'entry_clusters': 3, 'exit_clusters': 3, 'entries_evicted_matched': 2, 'entries_evicted_ttl': 1}
+    # every cluster was dropped and released its compact store rows
+    assert len(store.driver_embeddings) == len(store.vehicle_embeddings) == 0
@@ -0,0 +1,144 @@
+import gc
+import threading
+import time
+import weakref
+
+import pytest
+
+from utils.model_registry import ModelRegistry
+
+
+class Model:
+    pass
+
+
+def test_handles_share_one_instance_and_unload_with_the_last_release():
+    registry = ModelRegistry()
+    loads = []
+    a = registry.acquire("fake", None, lambda: loads.append(1) or Model())
+    b = registry.acquire("fake", None, lambda: loads.append(1) or Model())
+
+    assert a.model is b.model
+    assert loads == [1]
+    assert registry.loaded() == [{'backend': 'fake', 'path': None, 'options': {}, 'refs': 2}]
+
+    model = weakref.ref(a.model)
+    a.release()
+    a.release()  # releasing twice counts once
+    assert registry.loaded()[0]['refs'] == 1
+    with pytest.raises(RuntimeError):
+        a.model
+    b.release()
+    gc.collect()
+
+    assert registry.loaded() == []
+    assert model() is None
+    assert registry.stats == {'loads': 1, 'hits': 1, 'unloads': 1}
+
+
+def test_options_are_part_of_the_key():
+    registry = ModelRegistry()
+    a = registry.acquire("fake", None, Model, size=1)
+    b = registry.acquire("fake", None, Model, size=2)
+    assert a.model is not b.model
+    assert len(registry.loaded()) == 2
+
+
+def test_concurrent_acquire_loads_once():
+    registry = ModelRegistry()
+    loads = []
+
+    def loader():
+        loads.append(1)
+        time.sleep(0.05)
+        return Model()
+
+    handles = []
+    threads = [threading.Thread(target=lambda: handles.append(registry.acquire("fake", None, loader))) for _ in range(8)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+
+    assert loads == [1]
+    assert len({id(h.model) for h in handles}) == 1
+    assert registry.loaded()[0]['refs'] == 8
+    for h in handles:
+        h.release()
+    assert registry.loaded() == []
+
+
+def test_different_models_load_concurrently():
+    registry = ModelRegistry()
+    # each loader only returns once both are loading at the same time
+    both_loading = threading.Barrier(2, timeout=5)
+
+    def loader():
+        both_loading.wait()
+        return Model()
+
+    errors = []
+
+    def acquire(name):
+        try:
+            registry.acquire(name, None, loader)
+        except Exception as e:
+            errors.append(e)
+
+    threads = [threading.Thread(target=acquire, args=(name,)) for name in ("a", "b")]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    assert errors == []
+    assert len(registry.loaded()) == 2
+
+
+def test_failed_load_leaves_nothing_registered():
+    registry = ModelRegistry()
+
+    def fail():
+        raise OSError("missing weights")
+
+    with pytest.raises(OSError):
+        registry.acquire("fake", None, fail)
+    assert registry.loaded() == []
+    assert registry.acquire("fake", None, Model).model is not None
+
+
+def test_unload_frees_the_model_while_handles_are_out():
+    registry = ModelRegistry()
+    handle = registry.acquire("fake", None, Model)
+    model = weakref.ref(handle.model)
+
+    assert registry.unload("fake")
+    gc.collect()
+    assert model() is None
+    with pytest.raises(RuntimeError):
+        handle.model
+    # the stale handle's release does not touch a model loaded again under the same key
+    again = registry.acquire("fake", None, Model)
+    handle.release()
+    assert again.model is not None
+    assert registry.loaded()[0]['refs'] == 1
+
+
+def test_acquire_does_not_hand_out_a_model_unloaded_while_loading():
+    registry = ModelRegistry()
+    orphans = []
+
+    def loader():
+        model = Model()
+        if not orphans:
+            # clear() runs while this first load is in flight
+            orphans.append(weakref.ref(model))
+            registry.clear()
+        return model
+
+    handle = registry.acquire("fake", None, loader)
+    gc.collect()
+
+    assert orphans[0]() is None
+    assert handle.model is not None
+    assert registry.loaded() == [{'backend': 'fake', 'path': None, 'options': {}, 'refs': 1}]
+    assert registry.stats['loads'] == 1
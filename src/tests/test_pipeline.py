@@ -0,0 +1,194 @@
+import os
+import sys
+import time
+import threading
+import importlib.util
+import warnings
+
+import numpy as np
+import pytest
+
+sv = pytest.importorskip("supervision")
+pytest.importorskip("cv2")
+
+warnings.filterwarnings("ignore", category=FutureWarning)
+
+SRC_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def _load_frame_sources():
+    # src/io is named like the stdlib io module, which is always imported first, so
+    # "from io.frame_loader import ..." cannot find it; register the two modules by path
+    for name in ("frame_loader", "video_loader"):
+        if f"io.{name}" not in sys.modules:
+            spec = importlib.util.spec_from_file_location(f"io.{name}", os.path.join(SRC_DIR, "io", f"{name}.py"))
+            module = importlib.util.module_from_spec(spec)
+            spec.loader.exec_module(module)
+            sys.modules[f"io.{name}"] = module
+
+
+_load_frame_sources()
+from core.pipeline import VehicleDriverPipeline  # noqa: E402
+
+N_FRAMES = 70
+# (first frame, last frame, x offset) of each car; cars leave early enough for their tracks to be removed
+CARS = [(0, 14, 20), (5, 30, 240), (20, 45, 460), (33, 69, 20)]
+
+
+def _frame(i):
+    frame = np.zeros((360, 640, 3), dtype=np.uint8)
+    frame[0, 0, 0] = i
+    return frame
+
+
+class StubVehicleDetector:
+
+    def detect(self, frame):
+        i = int(frame[0, 0, 0])
+        boxes = [(x + i, 100, x + i + 120, 200) for first, last, x in CARS if first <= i <= last]
+        if not boxes:
+            return sv.Detections.empty()
+        return sv.Detections(xyxy=np.array(boxes, dtype=float), confidence=np.full(len(boxes), 0.9),
+                             class_id=np.full(len(boxes), 2))
+
+
+class StubFaceDetector:
+    """A face on most frames, with a frame-dependent quality; slow, so tracking runs ahead when pipelined."""
+
+    def __init__(self, delay: float = 0.0):
+        self.delay = delay
+
+    def detect_driver_faces(self, frame, bbox, camera=None):
+        time.sleep(self.delay)
+        i = int(frame[0, 0, 0])
+        if (i + bbox[0] // 7) % 4 == 0:
+            return []
+        rng = np.random.default_rng(1000 * i + bbox[0])
+        face = rng.integers(0, 255, (40, 40, 3), dtype=np.uint8)
+        face[:, : 5 + (i * 7 + bbox[0]) % 30] //= 4
+        return [face]
+
+
+class StubEmbedder:
+
+    def embed_batch(self, crops):
+        return [np.full(4, float(np.mean(c if isinstance(c, np.ndarray) else c[0])), dtype=np.float32) for c in crops]
+
+
+def _snapshots(tmp_path, execution, face_delay=0.0, **kwargs):
+    pipeline = VehicleDriverPipeline("", "", output_path=str(tmp_path), execution=execution, video_fps=10,
+                                     stage_queue_size=64, verbose=False, **kwargs)
+    pipeline.vehicle_detector = StubVehicleDetector()
+    pipeline.face_detector = StubFaceDetector(face_delay)
+    pipeline.vehicle_embedder = StubEmbedder()
+    pipeline.driver_embedder = StubEmbedder()
+    pipeline._make_loader = lambda path: ((f"frame_{i:04d}.jpg", _frame(i)) for i in range(N_FRAMES))
+    snapshots = pipeline._process_frames("frames", True)
+    return sorted((s.track_id, s.frame_path, round(float(s.quality), 6)) for s in snapshots)
+
+
+@pytest.mark.parametrize("selection, top_k, budget", [("first", 1, 30), ("best", 1, 30), ("best", 2, 6), ("best", 3, 100)])
+def test_pipelined_matches_sequential(tmp_path, selection, top_k, budget):
+    options = dict(snapshot_selection=selection, snapshot_top_k=top_k, snapshot_frame_budget=budget, embed_batch_size=3)
+    sequential = _snapshots(tmp_path, "sequential", **options)
+    pipelined = _snapshots(tmp_path, "pipelined", face_delay=0.002, **options)
+
+    assert sequential
+    assert {tid for tid, _, _ in sequential} == {1, 2, 3, 4}
+    assert pipelined == sequential
+
+
+class FailingDriverEmbedder(StubEmbedder):
+    """Fails every batch holding the first candidate it was given."""
+
+    def __init__(self):
+        self.bad = None
+
+    def embed_batch(self, crops):
+        if self.bad is None:
+            self.bad = crops[0]
+        if any(c is self.bad for c in crops):
+            raise RuntimeError("bad crop")
+        return super().embed_batch(crops)
+
+
+def test_failed_embedding_is_retried_on_a_later_frame(tmp_path):
+    # the first batch (tracks 1 and 2) is embedded on frame 6, while track 1 is still open
+    pipeline = VehicleDriverPipeline("", "", output_path=str(tmp_path), video_fps=10, embed_batch_size=2, verbose=False)
+    pipeline.vehicle_detector = StubVehicleDetector()
+    pipeline.face_detector = StubFaceDetector()
+    pipeline.vehicle_embedder = StubEmbedder()
+    pipeline.driver_embedder = FailingDriverEmbedder()
+    pipeline._make_loader = lambda path: ((f"frame_{i:04d}.jpg", _frame(i)) for i in range(N_FRAMES))
+    snapshots = pipeline._process_frames("frames", True)
+
+    # the other candidates of the failed batch are kept, and the failed track snapshots again later
+    assert sorted(s.track_id for s in snapshots) == [1, 2, 3, 4]
+    retried = next(s for s in snapshots if s.track_id == 1)
+    assert "frame_0006.jpg" < retried.frame_path <= "frame_0014.jpg"
+
+
+def _stub_pipeline(tmp_path, **kwargs):
+    pipeline = VehicleDriverPipeline("", "", output_path=str(tmp_path), video_fps=10, verbose=False, **kwargs)
+    pipeline.vehicle_detector = StubVehicleDetector()
+    pipeline.face_detector = StubFaceDetector()
+    pipeline.vehicle_embedder = StubEmbedder()
+    pipeline.driver_embedder = StubEmbedder()
+    pipeline._make_loader = lambda path: ((f"frame_{i:04d}.jpg", _frame(i)) for i in range(N_FRAMES))
+    return pipeline
+
+
+@pytest.mark.parametrize("execution", ["sequential", "pipelined"])
+def test_concurrent_pipelines_keep_their_own_metrics(tmp_path, execution):
+    from utils.logging import METRICS
+
+    pipelines = [_stub_pipeline(tmp_path, execution=execution, stage_queue_size=64) for _ in range(2)]
+    before = METRICS.histogram_summary("stage_seconds", stage="detect")['count']
+    threads = [threading.Thread(target=p._process_frames, args=("frames", True)) for p in pipelines]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+
+    for p in pipelines:
+        assert p.metrics.histogram_summary("stage_seconds", stage="detect")['count'] == N_FRAMES
+        assert p.metrics.histogram_summary("stage_seconds", stage="track")['count'] == N_FRAMES
+    # runs merge into the process-wide registry only at their end
+    assert METRICS.histogram_summary("stage_seconds", stage="detect")['count'] == before
+    pipelines[0]._finish_metrics(1.0)
+    assert METRICS.histogram_summary("stage_seconds", stage="detect")['count'] == before + N_FRAMES
+
+
+def _stub_pipeline_from_config(**config):
+    # builds the pipeline of a parallel worker (spawned, so this must be a module-level function)
+    pipeline = VehicleDriverPipeline(**config)
+    pipeline.vehicle_detector = StubVehicleDetector()
+    pipeline.face_detector = StubFaceDetector()
+    pipeline.vehicle_embedder = StubEmbedder()
+    pipeline.driver_embedder = StubEmbedder()
+    pipeline._make_loader = lambda path: ((f"frame_{i:04d}.jpg", _frame(i)) for i in range(N_FRAMES))
+    return pipeline
+
+
+def _packed_view(snapshots):
+    return [(s.track_id, s.frame_path, tuple(s.bbox), round(float(s.quality), 5), s.is_entry,
+             s.vehicle_embedding.tolist(), s.driver_embedding.tolist()) for s in snapshots]
+
+
+def test_parallel_streams_match_sequential(tmp_path):
+    from core.parallel import process_streams_parallel
+    from utils.logging import MetricsRegistry
+
+    sequential = _stub_pipeline(tmp_path)
+    expected = [_packed_view(sequential._process_frames("frames", is_entry)) for is_entry in (True, False)]
+
+    metrics = MetricsRegistry()
+    entry, exit_, counts = process_streams_parallel(sequential.config, "entry", "exit", metrics=metrics, max_workers=2,
+                                                    make_pipeline=_stub_pipeline_from_config)
+
+    assert expected[0]
+    assert [_packed_view(entry), _packed_view(exit_)] == expected
+    assert counts == {'entry_frames_processed': N_FRAMES, 'exit_frames_processed': N_FRAMES}
+    # both workers' timings reached the parent
+    assert metrics.histogram_summary("stage_seconds", stage="detect")['count'] == 2 * N_FRAMES
+    assert metrics.histogram_summary("stage_seconds", stage="track")['count'] == 2 * N_FRAMES
@@ -0,0 +1,55 @@
+import numpy as np
+import pytest
+
+pytest.importorskip("cv2")
+
+from data_models.snapshot_store import EmbeddingStore, SnapshotStore
+
+
+def _create(store, rng, track_id):
+    return store.create(track_id=track_id, frame_path=f"{track_id}.jpg", bbox=(0, 0, 1, 1), vehicle_crop=None,
+                        driver_crops=[], vehicle_embedding=rng.normal(size=8).astype(np.float32),
+                        driver_embedding=rng.normal(size=8).astype(np.float32), timestamp=float(track_id), is_entry=True)
+
+
+def test_released_rows_are_reused():
+    store = EmbeddingStore(dim=4, capacity=2)
+    rows = [store.add(np.full(4, i, dtype=np.float32)) for i in range(3)]
+    store.release(rows[1])
+    store.release(-1)
+
+    assert len(store) == 2
+    assert not store.get(rows[1]).any()
+    assert store.add(np.full(4, 7, dtype=np.float32)) == rows[1]
+    assert len(store) == 3
+    assert store.get(rows[1])[0] == 7
+    assert store.get(rows[2])[0] == 2
+
+
+def test_memory_stays_flat_under_churn():
+    rng = np.random.default_rng(0)
+    store = SnapshotStore(dim=8)
+    live = [_create(store, rng, i) for i in range(50)]
+    nbytes = store.vehicle_embeddings.nbytes + store.driver_embeddings.nbytes
+
+    for i in range(50, 5000):
+        # keep 50 snapshots alive, discarding the oldest as a new one arrives
+        store.discard([live.pop(0)])
+        live.append(_create(store, rng, i))
+
+    assert store.vehicle_embeddings.nbytes + store.driver_embeddings.nbytes == nbytes
+    assert len(store.vehicle_embeddings) == len(store.driver_embeddings) == 50
+
+
+def test_discarded_snapshot_does_not_see_reused_rows():
+    rng = np.random.default_rng(0)
+    store = SnapshotStore(dim=8)
+    old = _create(store, rng, 1)
+    kept = old.driver_embedding.copy()
+    store.discard([old])
+    store.discard([old])  # discarding twice frees the rows once
+    new = _create(store, rng, 2)
+
+    assert old.vehicle_embedding is None and old.driver_embedding is None
+    assert not np.array_equal(new.driver_embedding, kept)
+    assert len(store.driver_embeddings) == 1
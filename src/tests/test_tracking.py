@@ -0,0 +1,108 @@
+import warnings
+
+import numpy as np
+import pytest
+
+sv = pytest.importorskip("supervision")
+
+from tracking.bytetrack_manager import ByteTrackManager
+from tracking.track_state import TRACK_BORN, TRACK_LOST, TRACK_REMOVED, TRACK_UPDATED
+
+warnings.filterwarnings("ignore", category=FutureWarning)
+
+FRAME_RATE = 10
+
+
+def _detections(*boxes):
+    if not boxes:
+        return sv.Detections.empty()
+    return sv.Detections(xyxy=np.array(boxes, dtype=float), confidence=np.full(len(boxes), 0.9),
+                         class_id=np.full(len(boxes), 2))
+
+
+CAR = (100, 100, 200, 200)
+
+
+def _manager(**kwargs):
+    manager = ByteTrackManager(frame_rate=FRAME_RATE, **kwargs)
+    events = []
+    manager.add_listener(lambda e: events.append((e.kind, e.track_id, e.frame_index)))
+    return manager, events
+
+
+def _lifecycle(events):
+    return [e for e in events if e[0] != TRACK_UPDATED]
+
+
+def test_lifecycle_events_in_order():
+    manager, events = _manager()
+    for _ in range(5):
+        manager.update_with_detections(_detections(CAR))
+    for _ in range(20):
+        manager.update_with_detections(_detections())
+
+    assert events[0] == (TRACK_BORN, 1, 1)
+    assert [e for e in events if e[0] == TRACK_UPDATED] == [(TRACK_UPDATED, 1, i) for i in range(2, 6)]
+    kinds = [e[0] for e in _lifecycle(events)]
+    assert kinds == [TRACK_BORN, TRACK_LOST, TRACK_REMOVED]
+    assert _lifecycle(events)[1] == (TRACK_LOST, 1, 6)
+    assert 1 not in manager.tracks
+    assert manager.stats == {'tracks_born': 1, 'tracks_lost': 1, 'tracks_removed': 1}
+
+
+@pytest.mark.parametrize("gap", range(1, 16))
+def test_no_second_birth_when_bytetrack_rematches(gap):
+    """A track is never removed while ByteTrack can still match its id again."""
+    manager, events = _manager()
+    for _ in range(5):
+        manager.update_with_detections(_detections(CAR))
+    manager.mark_completed(1)
+    for _ in range(gap):
+        manager.update_with_detections(_detections())
+    tracked = manager.update_with_detections(_detections(CAR))
+    rematched = 1 in set(int(t) for t in tracked.tracker_id)
+
+    born = [e for e in events if e[0] == TRACK_BORN and e[1] == 1]
+    assert len(born) == 1
+    if rematched:
+        assert not any(e[0] == TRACK_REMOVED for e in events)
+        assert manager.is_completed(1)
+    else:
+        assert sum(e[0] == TRACK_REMOVED for e in events) == 1
+
+
+def test_rematch_after_eleven_frame_gap_keeps_state():
+    # ByteTrack (frame_rate=10) still re-matches the id after 11 frames without a detection
+    manager, events = _manager()
+    for _ in range(5):
+        manager.update_with_detections(_detections(CAR))
+    manager.mark_completed(1)
+    for _ in range(11):
+        manager.update_with_detections(_detections())
+    manager.update_with_detections(_detections(CAR))
+
+    assert _lifecycle(events) == [(TRACK_BORN, 1, 1), (TRACK_LOST, 1, 6)]
+    assert manager.is_completed(1)
+
+
+def test_lost_after_below_bytetrack_buffer_is_rejected():
+    with pytest.raises(ValueError):
+        ByteTrackManager(frame_rate=FRAME_RATE, lost_after=FRAME_RATE - 1)
+
+
+def test_longer_lost_after_delays_removal():
+    manager, events = _manager(lost_after=2 * FRAME_RATE)
+    manager.update_with_detections(_detections(CAR))
+    for _ in range(2 * FRAME_RATE):
+        manager.update_with_detections(_detections())
+    assert not any(e[0] == TRACK_REMOVED for e in events)
+    manager.update_with_detections(_detections())
+    assert _lifecycle(events)[-1] == (TRACK_REMOVED, 1, 2 * FRAME_RATE + 2)
+
+
+def test_finish_removes_open_tracks():
+    manager, events = _manager()
+    manager.update_with_detections(_detections(CAR, (400, 300, 520, 400)))
+    manager.finish()
+    assert sorted(e[1] for e in events if e[0] == TRACK_REMOVED) == [1, 2]
+    assert manager.tracks == {}
@@ -1,50 +1,194 @@
 # src/tracking/bytetrack_manager.py
 import logging
-from typing import Dict, List
-import supervision as sv
-from supervision import ByteTrack
-from .track_state import VehicleTrackState
+import threading
+from typing import Any, Callable, Dict, List, Optional, TYPE_CHECKING
+from utils.backends import require
+from .track_state import VehicleTrackState, TrackEvent, TRACK_BORN, TRACK_UPDATED, TRACK_LOST, TRACK_REMOVED
+
+if TYPE_CHECKING:
+    import supervision as sv
 
 logger = logging.getLogger(__name__)
 
 class ByteTrackManager:
     """
     Thin wrapper around supervision ByteTrack to maintain per-track state.
+
+    Every update emits lifecycle events (see track_state) to the registered listeners.
+    A track not matched in a frame is lost. It is removed, and its VehicleTrackState
+    evicted, only once ByteTrack itself has dropped it (so ByteTrack can never re-match an
+    evicted id) and it has been lost for more than lost_after frames. lost_after defaults
+    to ByteTrack's max_time_lost and cannot be lower. The removed event is the end-of-track
+    signal.
+
+    Also holds per-track best-K snapshot candidates (see VehicleTrackState.offer). Offers
+    and hand-over take the frame index the candidate belongs to and the states removed
+    in that frame (take_removed() / finish()) explicitly, so face search may lag behind
+    tracking (pipelined execution) without changing which candidates are handed over.
+
+    All methods take one lock; listeners are called outside it.
     """
 
-    def __init__(self, frame_rate:int = 10):
-        self.tracker = ByteTrack(frame_rate=frame_rate)
+    def __init__(self, frame_rate:int = 10, lost_after: int = None):
+        self.tracker = require("supervision").ByteTrack(frame_rate=frame_rate)
         self.tracks: Dict[int, VehicleTrackState] = {}
+        self._lock = threading.RLock()
+        max_time_lost = int(getattr(self.tracker, "max_time_lost", frame_rate))
+        if lost_after is not None and lost_after < max_time_lost:
+            raise ValueError(f"lost_after={lost_after} is below ByteTrack's max_time_lost={max_time_lost}; "
+                             "ByteTrack could re-match a track after it was removed")
+        self.lost_after = max_time_lost if lost_after is None else lost_after
+        self.frame_index = 0
+        self.listeners: List[Callable[[TrackEvent], None]] = []
+        # states removed since the last take_removed(), and states with buffered candidates
+        self._removed: List[VehicleTrackState] = []
+        self._buffering: Dict[int, VehicleTrackState] = {}
+        self.stats = {
+            'tracks_born': 0,
+            'tracks_lost': 0,
+            'tracks_removed': 0
+        }
 
     def reset(self):
-        self.tracker.reset()
-        self.tracks.clear()
+        with self._lock:
+            self.tracker.reset()
+            self.tracks.clear()
+            self._removed.clear()
+            self._buffering.clear()
+            self.frame_index = 0
+
+    def add_listener(self, listener: Callable[[TrackEvent], None]):
+        """listener is called with every TrackEvent, in order."""
+        self.listeners.append(listener)
 
-    def update_with_detections(self, detections: sv.Detections) -> sv.Detections:
+    def _emit(self, events: List[TrackEvent]):
+        for event in events:
+            if event.kind != TRACK_UPDATED:
+                self.stats[f'tracks_{event.kind}'] += 1
+            for listener in self.listeners:
+                try:
+                    listener(event)
+                except Exception as e:
+                    logger.exception("Track event listener failed: %s", e)
+
+    def update_with_detections(self, detections: "sv.Detections") -> "sv.Detections":
         """
         Pass detections to ByteTrack. Returns the tracked detections object
         which contains xyxy, confidence, and tracker_id arrays.
         """
-        try:
-            tracked = self.tracker.update_with_detections(detections)
+        with self._lock:
+            self.frame_index += 1
+            events = []
+            try:
+                tracked = self.tracker.update_with_detections(detections)
+            except Exception as e:
+                logger.exception("ByteTrack update failed: %s", e)
+                tracked = require("supervision").Detections.empty()
+
             # update local track states
-            for i, tid in enumerate(tracked.tracker_id):
+            seen = set()
+            for i, tid in enumerate(tracked.tracker_id if tracked.tracker_id is not None else []):
                 tid = int(tid)
+                seen.add(tid)
                 xyxy = tracked.xyxy[i]
                 bbox = (int(xyxy[0]), int(xyxy[1]), int(xyxy[2]), int(xyxy[3]))
-                if tid not in self.tracks:
-                    self.tracks[tid] = VehicleTrackState(track_id=tid)
-                st = self.tracks[tid]
+                st = self.tracks.get(tid)
+                if st is None:
+                    st = self.tracks[tid] = VehicleTrackState(track_id=tid, born=self.frame_index)
+                    events.append(TrackEvent(TRACK_BORN, tid, self.frame_index, st))
+                else:
+                    events.append(TrackEvent(TRACK_UPDATED, tid, self.frame_index, st))
                 st.frames_seen += 1
                 st.bbox = bbox
-            return tracked
-        except Exception as e:
-            logger.exception("ByteTrack update failed: %s", e)
-            return sv.Detections.empty()
+                st.status = "active"
+                st.last_seen = self.frame_index
+
+            events.extend(self._age_tracks(seen))
+        self._emit(events)
+        return tracked
+
+    def _bytetrack_ids(self):
+        """Ids ByteTrack may still match: its tracked and lost tracks."""
+        ids = set()
+        for t in list(self.tracker.tracked_tracks) + list(self.tracker.lost_tracks):
+            tid = getattr(t, "external_track_id", -1)
+            if tid is not None and tid >= 0:
+                ids.add(int(tid))
+        return ids
+
+    def _age_tracks(self, seen) -> List[TrackEvent]:
+        events = []
+        alive = None
+        for tid in [t for t in self.tracks if t not in seen]:
+            st = self.tracks[tid]
+            if st.status == "active":
+                st.status = "lost"
+                events.append(TrackEvent(TRACK_LOST, tid, self.frame_index, st))
+            if self.frame_index - st.last_seen > self.lost_after:
+                # ByteTrack keeps a removed track in its lost list for one more update
+                alive = self._bytetrack_ids() if alive is None else alive
+                if tid not in alive:
+                    events.append(self._remove(tid))
+        return events
+
+    def _remove(self, track_id: int) -> TrackEvent:
+        st = self.tracks.pop(track_id)
+        self._removed.append(st)
+        return TrackEvent(TRACK_REMOVED, track_id, self.frame_index, st)
+
+    def take_removed(self) -> List[VehicleTrackState]:
+        """States of the tracks removed since the last call; call after every update."""
+        with self._lock:
+            removed, self._removed = self._removed, []
+            return removed
+
+    def finish(self) -> List[VehicleTrackState]:
+        """
+        End all open tracks (end of the frame source), emitting their removed events.
+        Returns the states removed since the last take_removed(), these included.
+        """
+        with self._lock:
+            events = [self._remove(tid) for tid in list(self.tracks)]
+            removed = self.take_removed()
+        self._emit(events)
+        return removed
+
+    def state(self, track_id: int) -> Optional[VehicleTrackState]:
+        """The open track's state; hand this object on instead of looking the id up again later."""
+        with self._lock:
+            return self.tracks.get(track_id)
 
     def is_completed(self, track_id: int) -> bool:
-        return self.tracks.get(track_id, VehicleTrackState(track_id)).snapshot_taken
+        with self._lock:
+            return self.tracks.get(track_id, VehicleTrackState(track_id)).snapshot_taken
 
     def mark_completed(self, track_id: int):
-        if track_id in self.tracks:
-            self.tracks[track_id].snapshot_taken = True
\ No newline at end of file
+        with self._lock:
+            if track_id in self.tracks:
+                self.tracks[track_id].snapshot_taken = True
+
+    def offer_candidate(self, state: VehicleTrackState, candidate: Dict[str, Any], score: float, k: int, frame_index: int):
+        """Offer a snapshot candidate seen in tracker frame frame_index to the track's best-K buffer."""
+        with self._lock:
+            state.offer(candidate, score, k, frame_index)
+            self._buffering[state.track_id] = state
+
+    def pop_ready_candidates(self, frame_budget: int, frame_index: int, finished: List[VehicleTrackState] = (),
+                             flush: bool = False) -> List[Dict[str, Any]]:
+        """
+        Take the buffered candidates of the finished (removed) tracks, then those of tracks
+        that have buffered for frame_budget frames as of frame_index (all of them when flush
+        is set), in track id order; those tracks are marked completed.
+        """
+        with self._lock:
+            ready = []
+            for st in finished:
+                if self._buffering.pop(st.track_id, None) is not None:
+                    ready.extend(st.take_candidates())
+            for tid in sorted(self._buffering):
+                st = self._buffering[tid]
+                if flush or frame_index - st.first_candidate_frame >= frame_budget:
+                    del self._buffering[tid]
+                    ready.extend(st.take_candidates())
+                    st.snapshot_taken = True
+            return ready
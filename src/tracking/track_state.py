@@ -1,6 +1,14 @@
 # src/tracking/track_state.py
-from dataclasses import dataclass
-from typing import Tuple
+import heapq
+from dataclasses import dataclass, field
+from typing import Any, Dict, List, Tuple
+
+# track lifecycle: born -> updated* -> lost (not in the current frame) -> removed (lost for too long);
+# a lost track that is matched again goes back to updated
+TRACK_BORN = "born"
+TRACK_UPDATED = "updated"
+TRACK_LOST = "lost"
+TRACK_REMOVED = "removed"
 
 @dataclass
 class VehicleTrackState:
@@ -8,9 +16,46 @@ class VehicleTrackState:
     bbox: Tuple[int, int, int, int] = None
     frames_seen: int = 0
     snapshot_taken: bool = False
+    # "active" while matched in the current frame, "lost" otherwise
+    status: str = "active"
+    # tracker frame indices of the first and last update
+    born: int = -1
+    last_seen: int = -1
+    # best-K snapshot candidates as a min-heap of (score, seq, candidate); seq counts offers,
+    # so ties break by offer order whatever the tracker has done since
+    candidates: List[Tuple[float, int, Dict[str, Any]]] = field(default_factory=list, repr=False)
+    offers: int = 0
+    # tracker frame index of the first buffered candidate
+    first_candidate_frame: int = -1
 
     def crop(self, frame):
         if self.bbox is None:
             return None
         x1, y1, x2, y2 = self.bbox
-        return frame[y1:y2, x1:x2]
\ No newline at end of file
+        return frame[y1:y2, x1:x2]
+
+    def offer(self, candidate: Dict[str, Any], score: float, k: int, frame_index: int):
+        """Keep candidate if it is among the k best seen so far for this track."""
+        if not self.candidates:
+            self.first_candidate_frame = frame_index
+        self.offers += 1
+        item = (score, self.offers, candidate)
+        if len(self.candidates) < k:
+            heapq.heappush(self.candidates, item)
+        elif score > self.candidates[0][0]:
+            heapq.heapreplace(self.candidates, item)
+
+    def take_candidates(self) -> List[Dict[str, Any]]:
+        """Buffered candidates, best first, with their score as "quality"; clears the buffer."""
+        best = sorted(self.candidates, key=lambda item: (-item[0], item[1]))
+        self.candidates = []
+        self.first_candidate_frame = -1
+        return [dict(c, quality=score) for score, _, c in best]
+
+
+@dataclass(frozen=True)
+class TrackEvent:
+    kind: str
+    track_id: int
+    frame_index: int
+    state: VehicleTrackState = field(repr=False, compare=False)
@@ -0,0 +1,73 @@
+# src/utils/backends.py
+"""
+Lazy discovery and import of optional backends.
+
+available() only looks the package up (importlib.util.find_spec), so module-level
+backend probes no longer import torch / ultralytics / tensorflow. optional() and
+require() import on first use and record how long each import took (IMPORT_SECONDS,
+reported by `python -m utils.startup_benchmark`).
+"""
+import time
+import logging
+import importlib
+import importlib.util
+import threading
+from typing import Dict, Optional
+from types import ModuleType
+
+logger = logging.getLogger(__name__)
+
+# optional backends by what they provide
+BACKENDS = {
+    "torch": "ReID model, TorchScript runtime",
+    "torchvision": "ReID backbones",
+    "timm": "ReID backbones",
+    "onnxruntime": "ONNX ReID runtime",
+    "ultralytics": "YOLO vehicle / face detection",
+    "supervision": "detections, ByteTrack",
+    "keras_facenet": "FaceNet driver embeddings",
+    "face_recognition": "dlib face detection / embeddings",
+    "scipy": "Hungarian assignment",
+    "faiss": "FAISS embedding index",
+}
+
+IMPORT_SECONDS: Dict[str, float] = {}
+
+_lock = threading.Lock()
+_found: Dict[str, bool] = {}
+_modules: Dict[str, Optional[ModuleType]] = {}
+
+
+def available(name: str) -> bool:
+    """True if the module can be found, without importing it."""
+    if name not in _found:
+        try:
+            _found[name] = importlib.util.find_spec(name) is not None
+        except (ImportError, ValueError):
+            _found[name] = False
+    return _found[name]
+
+
+def optional(name: str) -> Optional[ModuleType]:
+    """Import a backend on first use; None if it is missing or fails to import."""
+    with _lock:
+        if name not in _modules:
+            module = None
+            if available(name):
+                t0 = time.perf_counter()
+                try:
+                    module = importlib.import_module(name)
+                # face_recognition calls quit() when its model package is missing
+                except (Exception, SystemExit) as e:
+                    logger.warning("Backend %s is installed but failed to import: %s", name, e)
+                IMPORT_SECONDS[name] = time.perf_counter() - t0
+            _modules[name] = module
+        return _modules[name]
+
+
+def require(name: str) -> ModuleType:
+    """Like optional(), but raises ImportError when the backend is unusable."""
+    module = optional(name)
+    if module is None:
+        raise ImportError(f"Backend '{name}' is not available ({BACKENDS.get(name, 'optional dependency')})")
+    return module
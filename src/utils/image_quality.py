@@ -0,0 +1,24 @@
+import cv2
+import numpy as np
+
+# a face this large (sqrt of area, pixels) or this sharp (variance of Laplacian) scores 1.0
+FACE_SIZE_REF = 112.0
+SHARPNESS_REF = 300.0
+
+
+def face_quality_score(face_crop):
+    """Cheap quality score in [0, 1] from face size, Laplacian sharpness and brightness."""
+    if face_crop is None or face_crop.size == 0:
+        return 0.0
+    h, w = face_crop.shape[:2]
+    gray = cv2.cvtColor(face_crop, cv2.COLOR_BGR2GRAY) if face_crop.ndim == 3 else face_crop
+    size = min(1.0, np.sqrt(h * w) / FACE_SIZE_REF)
+    sharpness = min(1.0, cv2.Laplacian(gray, cv2.CV_64F).var() / SHARPNESS_REF)
+    # best at mid-gray, 0 at black or white
+    brightness = 1.0 - abs(float(np.mean(gray)) - 128.0) / 128.0
+    return float(0.4 * size + 0.4 * sharpness + 0.2 * brightness)
+
+
+def snapshot_quality_score(face_crops):
+    """Score of a snapshot candidate: its best face."""
+    return max((face_quality_score(f) for f in face_crops or []), default=0.0)
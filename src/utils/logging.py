@@ -0,0 +1,241 @@
+# src/utils/logging.py
+"""
+Lightweight metrics: counters, gauges and timing histograms with labels.
+
+    with METRICS.timer("stage_seconds", stage="detect"):
+        ...
+
+    @timed("backend_seconds", component="face_detector", backend="haar")
+    def _haar_boxes(...): ...
+
+Timings go to the active registry: the one installed with use_metrics() in the current
+context (each pipeline runs with its own MetricsRegistry), else METRICS, the process-wide
+registry (like the root logger). A pipeline resets its registry at the start of a run,
+logs a summary, can export it as JSON or Prometheus text, and merges it into METRICS.
+"""
+import json
+import contextvars
+import time
+import random
+import threading
+import functools
+from contextlib import contextmanager
+from typing import Any, Dict, Tuple
+import numpy as np
+
+Labels = Tuple[Tuple[str, str], ...]
+
+PERCENTILES = (50, 95, 99)
+
+
+class Histogram:
+    """
+    Count / sum / min / max of all observations plus a uniform reservoir sample of at
+    most max_samples values, from which the percentiles are computed.
+    """
+
+    def __init__(self, max_samples: int = 10000, seed: int = 0):
+        self.max_samples = max_samples
+        self.count = 0
+        self.sum = 0.0
+        self.min = float("inf")
+        self.max = float("-inf")
+        self._samples = []
+        self._rng = random.Random(seed)
+
+    def observe(self, value: float):
+        self.count += 1
+        self.sum += value
+        self.min = min(self.min, value)
+        self.max = max(self.max, value)
+        if len(self._samples) < self.max_samples:
+            self._samples.append(value)
+        else:
+            k = self._rng.randrange(self.count)
+            if k < self.max_samples:
+                self._samples[k] = value
+
+    def merge(self, other: "Histogram"):
+        """Add other's observations; the merged sample is drawn from both samples."""
+        self.count += other.count
+        self.sum += other.sum
+        self.min = min(self.min, other.min)
+        self.max = max(self.max, other.max)
+        samples = self._samples + other._samples
+        if len(samples) > self.max_samples:
+            samples = self._rng.sample(samples, self.max_samples)
+        self._samples = samples
+
+    def summary(self) -> Dict[str, float]:
+        out = {'count': self.count, 'sum': self.sum, 'mean': self.sum / self.count if self.count else 0.0,
+               'min': self.min if self.count else 0.0, 'max': self.max if self.count else 0.0}
+        values = np.percentile(self._samples, PERCENTILES) if self._samples else [0.0] * len(PERCENTILES)
+        for p, v in zip(PERCENTILES, values):
+            out[f'p{p}'] = float(v)
+        return out
+
+
+class MetricsRegistry:
+    """Thread-safe named metrics, each keyed by its sorted label set."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.reset()
+
+    def __getstate__(self):
+        # picklable (e.g. sent back from worker processes); the lock is not
+        with self._lock:
+            state = dict(self.__dict__)
+        del state['_lock']
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._lock = threading.Lock()
+
+    def reset(self):
+        with self._lock:
+            self.counters: Dict[str, Dict[Labels, float]] = {}
+            self.gauges: Dict[str, Dict[Labels, float]] = {}
+            self.histograms: Dict[str, Dict[Labels, Histogram]] = {}
+
+    @staticmethod
+    def _labels(labels: Dict[str, Any]) -> Labels:
+        return tuple(sorted((k, str(v)) for k, v in labels.items()))
+
+    def inc(self, name: str, value: float = 1, **labels):
+        key = self._labels(labels)
+        with self._lock:
+            series = self.counters.setdefault(name, {})
+            series[key] = series.get(key, 0) + value
+
+    def set(self, name: str, value: float, **labels):
+        with self._lock:
+            self.gauges.setdefault(name, {})[self._labels(labels)] = value
+
+    def observe(self, name: str, value: float, **labels):
+        key = self._labels(labels)
+        with self._lock:
+            series = self.histograms.setdefault(name, {})
+            if key not in series:
+                series[key] = Histogram()
+            series[key].observe(value)
+
+    @contextmanager
+    def timer(self, name: str, **labels):
+        """Observe the wall time of the with-block (seconds), also when it raises."""
+        t0 = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(name, time.perf_counter() - t0, **labels)
+
+    def timed(self, name: str, **labels):
+        """Decorator form of timer()."""
+        def decorator(fn):
+            @functools.wraps(fn)
+            def wrapper(*args, **kwargs):
+                with self.timer(name, **labels):
+                    return fn(*args, **kwargs)
+            return wrapper
+        return decorator
+
+    def merge(self, other: "MetricsRegistry"):
+        """Add other's counters and histograms to this registry; other's gauges overwrite ours."""
+        with other._lock:
+            counters = {name: dict(values) for name, values in other.counters.items()}
+            gauges = {name: dict(values) for name, values in other.gauges.items()}
+            histograms = {name: dict(values) for name, values in other.histograms.items()}
+        with self._lock:
+            for name, values in counters.items():
+                series = self.counters.setdefault(name, {})
+                for key, v in values.items():
+                    series[key] = series.get(key, 0) + v
+            for name, values in gauges.items():
+                self.gauges.setdefault(name, {}).update(values)
+            for name, values in histograms.items():
+                series = self.histograms.setdefault(name, {})
+                for key, h in values.items():
+                    series.setdefault(key, Histogram()).merge(h)
+
+    def histogram_summary(self, name: str, **labels) -> Dict[str, float]:
+        with self._lock:
+            h = self.histograms.get(name, {}).get(self._labels(labels))
+            return h.summary() if h is not None else Histogram().summary()
+
+    def to_dict(self) -> Dict[str, Any]:
+        def series(metrics, fn):
+            return {name: [{'labels': dict(k), **fn(v)} for k, v in values.items()] for name, values in metrics.items()}
+        with self._lock:
+            return {
+                'counters': series(self.counters, lambda v: {'value': v}),
+                'gauges': series(self.gauges, lambda v: {'value': v}),
+                'histograms': series(self.histograms, lambda h: h.summary())
+            }
+
+    def to_json(self) -> str:
+        return json.dumps(self.to_dict(), indent=2)
+
+    def to_prometheus(self) -> str:
+        """Prometheus text exposition format; histograms are exported as summaries."""
+        def fmt(labels: Labels, extra: Labels = ()) -> str:
+            items = labels + extra
+            if not items:
+                return ""
+            return "{" + ",".join(f'{k}="{v}"' for k, v in items) + "}"
+
+        lines = []
+        with self._lock:
+            for name, values in self.counters.items():
+                lines.append(f"# TYPE {name} counter")
+                lines.extend(f"{name}{fmt(k)} {v}" for k, v in values.items())
+            for name, values in self.gauges.items():
+                lines.append(f"# TYPE {name} gauge")
+                lines.extend(f"{name}{fmt(k)} {v}" for k, v in values.items())
+            for name, values in self.histograms.items():
+                lines.append(f"# TYPE {name} summary")
+                for k, h in values.items():
+                    s = h.summary()
+                    for p in PERCENTILES:
+                        lines.append(f"{name}{fmt(k, (('quantile', str(p / 100)),))} {s[f'p{p}']}")
+                    lines.append(f"{name}_sum{fmt(k)} {s['sum']}")
+                    lines.append(f"{name}_count{fmt(k)} {s['count']}")
+        return "\n".join(lines) + "\n"
+
+    def export(self, path: str):
+        """Write JSON, or Prometheus text when path ends with .prom or .txt."""
+        text = self.to_prometheus() if path.endswith((".prom", ".txt")) else self.to_json()
+        with open(path, "w") as f:
+            f.write(text)
+
+
+METRICS = MetricsRegistry()
+
+_ACTIVE: contextvars.ContextVar = contextvars.ContextVar("active_metrics", default=None)
+
+
+def active_metrics() -> MetricsRegistry:
+    """The registry of the current context (see use_metrics), else METRICS."""
+    registry = _ACTIVE.get()
+    return registry if registry is not None else METRICS
+
+
+@contextmanager
+def use_metrics(registry: MetricsRegistry):
+    """Make registry the active one in this context (threads started with the context inherit it)."""
+    token = _ACTIVE.set(registry)
+    try:
+        yield registry
+    finally:
+        _ACTIVE.reset(token)
+
+
+def timed(name: str, **labels):
+    """Decorator timing calls into the active registry, looked up on every call."""
+    def decorator(fn):
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            with active_metrics().timer(name, **labels):
+                return fn(*args, **kwargs)
+        return wrapper
+    return decorator
@@ -0,0 +1,196 @@
+# src/utils/model_registry.py
+"""
+Process-wide registry of loaded models.
+
+    handle = MODELS.acquire("yolo", "yolov8m.pt", lambda: YOLO("yolov8m.pt"))
+    with handle.lock:
+        results = handle.model(frame)
+    ...
+    handle.release()
+
+Models are keyed by (backend, weights path, options); the path is made absolute and,
+for files, its mtime is part of the key so edited weights load fresh. Every acquire()
+of the same key returns a handle on the same instance, so N pipelines in one process
+hold one copy of each model. A model is unloaded when its last handle is released, or
+explicitly with unload() / clear(). Handles of one model share a lock; hold it around
+calls into backends that are not thread-safe (ultralytics predictors, Keras).
+
+Users read handle.model on every call and never keep the model themselves, so the
+registry holds its only long-lived reference: after unload() the memory is freed once
+calls already running return, and later calls through the handle raise.
+"""
+import os
+import gc
+import hashlib
+import sys
+import logging
+import threading
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+Key = Tuple[str, Optional[str], Tuple[Tuple[str, Any], ...]]
+
+
+def weights_version(path: Optional[str]) -> str:
+    """
+    path plus the mtime and size of the file it names, for model ids used as cache keys:
+    replacing the weights under the same name changes the id. Other paths are returned as is.
+    """
+    if path and os.path.isfile(path):
+        st = os.stat(path)
+        return f"{path}@{st.st_mtime_ns}:{st.st_size}"
+    return str(path)
+
+
+def file_digest(path: Optional[str]) -> str:
+    """Short content hash of a (config) file for model ids; "none" when there is no such file."""
+    if not path or not os.path.isfile(path):
+        return "none"
+    with open(path, "rb") as f:
+        return hashlib.blake2b(f.read(), digest_size=8).hexdigest()
+
+
+class _Entry:
+
+    def __init__(self):
+        self.model = None
+        self.loaded = False
+        self.refs = 0
+        self.lock = threading.RLock()
+
+
+class ModelHandle:
+    """A reference on a shared model; release() it when done (also a context manager)."""
+
+    def __init__(self, registry: "ModelRegistry", key: Key, entry: _Entry):
+        self.registry = registry
+        self.key = key
+        self._entry = entry
+        self.released = False
+
+    @property
+    def model(self) -> Any:
+        if self.released or not self._entry.loaded:
+            raise RuntimeError(f"Model {self.key} was released or unloaded")
+        return self._entry.model
+
+    @property
+    def lock(self) -> threading.RLock:
+        return self._entry.lock
+
+    def release(self):
+        if not self.released:
+            self.released = True
+            self.registry._release(self.key, self._entry)
+
+    def __enter__(self) -> "ModelHandle":
+        return self
+
+    def __exit__(self, *exc):
+        self.release()
+
+
+class ModelRegistry:
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._entries: Dict[Key, _Entry] = {}
+        self.stats = {
+            'loads': 0,
+            'hits': 0,
+            'unloads': 0
+        }
+
+    @staticmethod
+    def _key(backend: str, path: Optional[str], options: Dict[str, Any]) -> Key:
+        opts = dict(options)
+        if path and os.path.exists(path):
+            path = os.path.abspath(path)
+            if os.path.isfile(path):
+                opts['mtime'] = os.path.getmtime(path)
+        return backend, path, tuple(sorted((k, v) for k, v in opts.items()))
+
+    def acquire(self, backend: str, path: Optional[str], loader: Callable[[], Any], **options) -> ModelHandle:
+        """
+        Handle on the model for (backend, path, options), calling loader() if it is not
+        loaded yet. Loads of different models run concurrently; a failed load raises and
+        leaves nothing registered.
+        """
+        key = self._key(backend, path, options)
+        while True:
+            with self._lock:
+                entry = self._entries.setdefault(key, _Entry())
+                entry.refs += 1
+            with entry.lock:
+                if not entry.loaded:
+                    try:
+                        logger.info("Loading %s model: %s", backend, path)
+                        entry.model = loader()
+                    except BaseException:
+                        self._release(key, entry)
+                        raise
+                    entry.loaded = True
+                    stat = 'loads'
+                else:
+                    stat = 'hits'
+            with self._lock:
+                if self._entries.get(key) is entry:
+                    self.stats[stat] += 1
+                    return ModelHandle(self, key, entry)
+            # unload() / clear() dropped the entry while this acquire was loading it: free the
+            # orphaned model instead of handing it out unregistered, and start over
+            self._drop(key, entry)
+
+    def _release(self, key: Key, entry: _Entry):
+        with self._lock:
+            # a force-unloaded model may have been loaded again under the same key since
+            if self._entries.get(key) is not entry:
+                return
+            entry.refs -= 1
+            if entry.refs > 0:
+                return
+            del self._entries[key]
+        self._drop(key, entry)
+
+    def _drop(self, key: Key, entry: _Entry):
+        with entry.lock:
+            was_loaded = entry.loaded
+            entry.model = None
+            entry.loaded = False
+        if was_loaded:
+            with self._lock:
+                self.stats['unloads'] += 1
+            logger.info("Unloaded %s model: %s", key[0], key[1])
+        gc.collect()
+        # return cached GPU memory, only if torch is already in use
+        torch = sys.modules.get("torch")
+        if torch is not None and torch.cuda.is_available():
+            torch.cuda.empty_cache()
+
+    def unload(self, backend: str, path: Optional[str] = None, **options) -> bool:
+        """Unload a model even if handles are still out (they raise on use). True if it was loaded."""
+        key = self._key(backend, path, options)
+        with self._lock:
+            entry = self._entries.pop(key, None)
+        if entry is None:
+            return False
+        self._drop(key, entry)
+        return True
+
+    def clear(self):
+        """Unload every model."""
+        with self._lock:
+            entries = list(self._entries.items())
+            self._entries.clear()
+        for key, entry in entries:
+            self._drop(key, entry)
+
+    def loaded(self) -> List[Dict[str, Any]]:
+        """Backend, path, options and reference count of every loaded model."""
+        with self._lock:
+            return [{'backend': k[0], 'path': k[1], 'options': dict(k[2]), 'refs': e.refs}
+                    for k, e in self._entries.items() if e.loaded]
+
+
+MODELS = ModelRegistry()
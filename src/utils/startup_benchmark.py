@@ -0,0 +1,119 @@
+# src/utils/startup_benchmark.py
+"""
+Startup benchmark: import cost of every optional backend and the cost of building each
+pipeline component (which imports its backends and loads its model). Every measurement
+runs in a fresh interpreter, so nothing is already imported or cached.
+
+Every row has a status: "ok", "not installed" (optional backend missing) or "failed".
+Failures are reported as errors and make the run exit with status 1; component builds
+are skipped when core.pipeline itself cannot be imported.
+
+Run: python -m utils.startup_benchmark --repeat 3 --reid-ckpt models/reid_model/net_19.pth --json startup.json
+"""
+import os
+import sys
+import json
+import argparse
+import logging
+import tempfile
+import subprocess
+from typing import Any, Dict, List
+import numpy as np
+
+from utils.backends import BACKENDS, available
+
+logger = logging.getLogger(__name__)
+
+SRC_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+COMPONENTS = ("tracker", "vehicle_detector", "face_detector", "driver_embedder", "vehicle_embedder")
+
+_TEMPLATE = """{setup}
+import time
+t0 = time.perf_counter()
+{code}
+print(repr(time.perf_counter() - t0))
+"""
+
+
+def measure(code: str, setup: str = "", repeat: int = 1, timeout: float = 600.0) -> Dict[str, Any]:
+    """Median wall time (seconds) of code over repeat fresh interpreters; setup runs untimed."""
+    times = []
+    for _ in range(repeat):
+        try:
+            proc = subprocess.run([sys.executable, "-c", _TEMPLATE.format(setup=setup, code=code)], cwd=SRC_DIR,
+                                  capture_output=True, text=True, timeout=timeout)
+        except subprocess.TimeoutExpired:
+            return {'seconds': None, 'status': 'failed', 'error': f"timed out after {timeout:.0f}s"}
+        if proc.returncode != 0:
+            lines = proc.stderr.strip().splitlines()
+            return {'seconds': None, 'status': 'failed', 'error': lines[-1] if lines else f"exit code {proc.returncode}"}
+        times.append(float(proc.stdout.strip().splitlines()[-1]))
+    return {'seconds': float(np.median(times)), 'status': 'ok', 'error': None}
+
+
+def run_benchmark(pipeline_kwargs: Dict[str, Any] = None, repeat: int = 1, components: bool = True) -> List[Dict[str, Any]]:
+    """One row per backend import, the core.pipeline import and (optionally) each component build."""
+    rows = []
+    for name, role in BACKENDS.items():
+        if not available(name):
+            rows.append({'kind': 'import', 'name': name, 'role': role, 'seconds': None, 'status': 'not installed', 'error': None})
+            continue
+        rows.append({'kind': 'import', 'name': name, 'role': role, **measure(f"import {name}", repeat=repeat)})
+
+    pipeline = {'kind': 'import', 'name': 'core.pipeline', 'role': 'pipeline module',
+                **measure("import core.pipeline", repeat=repeat)}
+    rows.append(pipeline)
+    if pipeline['status'] != 'ok':
+        if "'io' is not a package" in (pipeline['error'] or ""):
+            pipeline['error'] += " (src/io is shadowed by the stdlib io module)"
+        if components:
+            logger.error("core.pipeline cannot be imported; skipping the component builds")
+        return rows
+    if components:
+        kwargs = dict(pipeline_kwargs or {})
+        kwargs.setdefault("output_path", tempfile.mkdtemp(prefix="startup_benchmark_"))
+        imports = "import json\nfrom core.pipeline import VehicleDriverPipeline"
+        build = f"p = VehicleDriverPipeline('', '', **json.loads({json.dumps(kwargs)!r}))"
+        rows.append({'kind': 'build', 'name': 'pipeline', 'role': 'VehicleDriverPipeline()',
+                     **measure(build, setup=imports, repeat=repeat)})
+        for name in COMPONENTS:
+            rows.append({'kind': 'build', 'name': name, 'role': 'first use', **measure(f"p.{name}", setup=f"{imports}\n{build}", repeat=repeat)})
+    return rows
+
+
+def main():
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s [%(levelname)s] %(message)s")
+    parser = argparse.ArgumentParser(description="Measure backend import and model load times")
+    parser.add_argument("--repeat", type=int, default=1, help="Fresh interpreters per measurement (median is reported)")
+    parser.add_argument("--imports-only", action="store_true", help="Skip building the pipeline components")
+    parser.add_argument("--vehicle-model", default=None)
+    parser.add_argument("--face-model", default=None)
+    parser.add_argument("--reid-opts", default=None)
+    parser.add_argument("--reid-ckpt", default=None)
+    parser.add_argument("--reid-artifact", default=None)
+    parser.add_argument("--json", default=None, help="Also write the rows to this file")
+    args = parser.parse_args()
+
+    kwargs = {k: v for k, v in {'vehicle_model_path': args.vehicle_model, 'face_model_path': args.face_model,
+                                'reid_opts': args.reid_opts, 'reid_ckpt': args.reid_ckpt,
+                                'reid_artifact': args.reid_artifact}.items() if v is not None}
+    rows = run_benchmark(kwargs, repeat=max(1, args.repeat), components=not args.imports_only)
+    for r in rows:
+        if r['status'] == 'ok':
+            logger.info("%-6s %-18s %9.1f ms  %s", r['kind'], r['name'], 1000 * r['seconds'], r['role'])
+        elif r['status'] == 'not installed':
+            logger.info("%-6s %-18s %12s  %s  (not installed)", r['kind'], r['name'], "-", r['role'])
+        else:
+            logger.error("%-6s %-18s %12s  %s  (%s)", r['kind'], r['name'], "FAILED", r['role'], r['error'])
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(rows, f, indent=2)
+    failed = [r['name'] for r in rows if r['status'] == 'failed']
+    if failed:
+        logger.error("%d measurement(s) failed: %s", len(failed), ", ".join(failed))
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()